@@ -1,14 +1,20 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
-import plotly.graph_objects as go
-import plotly.express as px
-import pymongo
-import bcrypt
 import os
 import extra_streamlit_components as stx
 import time
+import functools
+import uuid
+
+from momentum.challenges import get_or_create_today_challenges
+from momentum.db import for_workload
+from momentum import auth, cache, catalog, deletion, export, instrument, metrics, resilience, resources, sessions
+from momentum.activity import recent_events, window_start
+from momentum.leaderboard import ALL_TIME, board_xp, rename_user, week_board
+from momentum.startup import lazy_import, mark, write_report
+from momentum.scores import import_scores, read_chunks, save_score
+from momentum.stats import display_streak, get_level
+from momentum.users import create_user, list_users
 
 # ----------------------------
 # Page config
@@ -20,6 +26,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ----------------------------
+# Rerun Instrumentation (tags this run with page/role/session; see momentum/instrument.py)
+# ----------------------------
+instrument.begin_rerun(st.session_state.setdefault("sid", uuid.uuid4().hex[:8]))
+
 # ----------------------------
 # Cookie Manager Init (No Cache)
 # ----------------------------
@@ -146,25 +157,27 @@ st.markdown("""
 # ----------------------------
 # Mongo Connection
 # ----------------------------
-@st.cache_resource
+# The client connects lazily, so this only fails on bad settings; an outage
+# later is absorbed by momentum/resilience.py (saved data + queued writes)
 def get_db():
     try:
         if "mongo" not in st.secrets:
             st.error("❌ 'mongo' section missing in secrets.toml")
             st.stop()
-        uri = st.secrets["mongo"]["uri"]
-        db_name = st.secrets["mongo"]["db_name"]
-        client = pymongo.MongoClient(uri)
-        return client[db_name]
+        return resources.get_db()
     except Exception as e:
         st.error(f"❌ Connection Error: {e}")
         st.stop()
 
+# Cached resources live in momentum/resources.py so server.py's health/warm-up
+# routes share them with this script
 db = get_db()
+resources.init_app(db)
+app_ready = resources.app_ready
+get_leaderboard = resources.get_leaderboard
+
 users_col = db["users"]
 challenges_col = db["challenges"]
-activity_col = db["activity"]
-scores_col = db["scores"]
 
 # ----------------------------
 # Logic Helpers
@@ -172,91 +185,172 @@ scores_col = db["scores"]
 def now_utc(): return datetime.utcnow()
 def today_str(): return datetime.utcnow().strftime("%Y-%m-%d")
 
-def hash_password(plain: str) -> bytes:
-    return bcrypt.hashpw(plain.encode("utf-8"), bcrypt.gensalt())
-
-def check_password(plain: str, hashed: bytes) -> bool:
-    return bcrypt.checkpw(plain.encode("utf-8"), hashed)
-
-def create_user(username, password, name, role="student"):
-    if users_col.find_one({"username": username}):
-        return False, "Username already exists"
-    
-    users_col.insert_one({
-        "username": username,
-        "password_hash": hash_password(password),
-        "name": name,
-        "role": role,
-        "target_score": 7.5,
-        "created_at": now_utc(),
-        "settings": {"learning_time": "Evening", "difficulty": "Medium"}
-    })
-    return True, "User created successfully"
-
-def ensure_dummy_data():
-    demo_users = [
-        ("admin", "leap123", "Super Admin", "admin"),
-        ("demo", "demo123", "Alex Student", "student")
-    ]
-    for u, p, name, role in demo_users:
-        if not users_col.find_one({"username": u}):
-            create_user(u, p, name, role)
-
-def get_or_create_today_challenges(username: str):
-    d = today_str()
-    docs = list(challenges_col.find({"username": username, "date": d}).sort("id", 1))
-    if docs: return docs
-
-    # FIXED XP VALUES: Easy=10, Medium=20, Hard=30
-    seed = [
-        {"id": 1, "type": "Listening", "difficulty": "Easy", "duration": "5 min", "xp": 10},
-        {"id": 2, "type": "Reading", "difficulty": "Medium", "duration": "8 min", "xp": 20},
-        {"id": 3, "type": "Writing", "difficulty": "Hard", "duration": "12 min", "xp": 30},
-    ]
-    new_docs = []
-    for c in seed:
-        doc = {**c, "username": username, "date": d, "completed": False, "created_at": now_utc()}
-        challenges_col.insert_one(doc)
-        new_docs.append(doc)
-    return new_docs
-
 def mark_challenge_completed(username: str, challenge_id: int):
+    # While Mongo is out the completion is queued for replay and shown as done
     d = today_str()
-    res = challenges_col.update_one(
-        {"username": username, "date": d, "id": challenge_id, "completed": False},
-        {"$set": {"completed": True, "completed_at": now_utc()}}
-    )
-    if res.modified_count == 1:
-        activity_col.insert_one({
-            "username": username, "date": d, "event": "challenge_completed",
-            "challenge_id": challenge_id, "ts": now_utc()
-        })
-        st.balloons()
-
-def get_level(xp): return int(1 + (xp / 100))
+    xp = resilience.write(db, "complete_challenge", username=username, date=d, challenge_id=challenge_id,
+                          name=user_profile.get("name", username))
+    if xp == resilience.QUEUED:
+        st.session_state.setdefault("queued_done", set()).add((d, challenge_id))
+        return True
+    resilience.forget(cache.key("today", username, d))
+    return xp is not None
+
+def todays_challenges(username: str):
+    # Picked from the in-memory catalog by the student's difficulty preference
+    difficulty = user_profile.get("settings", {}).get("difficulty", "Medium")
+    d = today_str()
+    todays = resilience.read(cache.key("today", username, d),
+                             lambda: get_or_create_today_challenges(db, username, d, difficulty), default=[])
+    queued = st.session_state.get("queued_done", set())
+    return [{**c, "completed": True} if (d, c["id"]) in queued else c for c in todays]
+
+def stale_note(name: str):
+    # Under anything read while Mongo was unreachable (see resilience.read)
+    since = resilience.stale_since(name)
+    if since is None: return
+    if since: st.caption(f"⚠️ Saved data from {datetime.fromtimestamp(since):%H:%M}; live data is temporarily unavailable")
+    else: st.caption("⚠️ Live data is temporarily unavailable")
+
+# ----------------------------
+# Student Fragments
+# ----------------------------
+# Each piece loads its own data and reruns on its own, so completing a task
+# refreshes only the cards it affects instead of the whole script.
+def timed_fragment(key):
+    def wrap(fn):
+        @st.fragment(key=key)
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            t0 = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: metrics.observe(f"fragment.{key}", time.perf_counter() - t0)
+        return run
+    return wrap
+
+def complete_challenge(username: str, challenge_id: int, refresh=None):
+    # Button callback; `refresh` lists other fragments that show affected data
+    t0 = time.perf_counter()
+    # Balloons are drawn by the fragment; callbacks should not render elements
+    if mark_challenge_completed(username, challenge_id): st.session_state.celebrate = True
+    metrics.observe("interaction.complete_challenge", time.perf_counter() - t0)
+    if refresh: st.rerun(scope=refresh)
+
+@timed_fragment("metric_cards")
+def metric_cards(username: str, profile):
+    stats = resources.user_stats(username)
+    stale_note("stats")
+    total_xp = stats.get("xp", 0)
+    level = get_level(total_xp)
+    streak = display_streak(stats, today_str())
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1: st.markdown(f"""<div class="glass-card"><div class="metric-label">Level</div><div class="metric-value">{level}</div></div>""", unsafe_allow_html=True)
+    with c2: st.markdown(f"""<div class="glass-card"><div class="metric-label">XP</div><div class="metric-value">{total_xp}</div></div>""", unsafe_allow_html=True)
+    with c3: st.markdown(f"""<div class="glass-card"><div class="metric-label">Streak</div><div class="metric-value">{streak} 🔥</div></div>""", unsafe_allow_html=True)
+    with c4: st.markdown(f"""<div class="glass-card"><div class="metric-label">Target</div><div class="metric-value">{profile.get('target_score', 7.5)}</div></div>""", unsafe_allow_html=True)
+
+@timed_fragment("next_up")
+def next_up(username: str):
+    if st.session_state.pop("celebrate", False): st.balloons()
+    st.markdown("### 🎯 Next Up")
+    todays = todays_challenges(username)
+    stale_note("today")
+    next_c = next((c for c in todays if not c["completed"]), None)
+    if next_c:
+        st.markdown(f"""<div class="challenge-box"><span class="status-pill pill-{next_c['difficulty'].lower()}">{next_c['difficulty']}</span><h3 style="margin:10px 0;">{next_c['type']}</h3><p style="color:#666 !important;">⏱️ {next_c['duration']} • ⭐ {next_c['xp']} XP</p></div>""", unsafe_allow_html=True)
+        st.button("Start →", key="start_main", use_container_width=True,
+                  on_click=complete_challenge, args=(username, next_c["id"], ["next_up", "metric_cards"]))
+    else: st.success("All done! 🎉")
+
+@timed_fragment("practice_tasks")
+def practice_tasks(username: str):
+    if st.session_state.pop("celebrate", False): st.balloons()
+    todays = todays_challenges(username)
+    stale_note("today")
+    if st.session_state.get("queued_done") and resilience.pending():
+        st.caption("🕓 Tasks you completed while offline will sync automatically")
+    completed = sum(1 for c in todays if c['completed'])
+    
+    # Display progress bar only if there are tasks
+    if todays:
+        st.progress(completed / len(todays))
+    else:
+        st.info("No tasks scheduled for today yet.")
+    
+    for c in todays:
+        done = c['completed']
+        
+        # FIXED: Correct color mapping for all 3 levels
+        if c['difficulty'] == "Easy":
+            color = "pill-easy"
+        elif c['difficulty'] == "Medium":
+            color = "pill-medium"
+        else:
+            color = "pill-hard"
+        
+        with st.container():
+            c1, c2 = st.columns([4, 1])
+            # Added opacity to fade out completed tasks
+            with c1: 
+                st.markdown(f"""
+                <div class="challenge-box" style="opacity:{0.6 if done else 1}; display:flex; justify-content:space-between; align-items:center;">
+                    <div>
+                        <b>{c['type']}</b>
+                        <p style="margin:0;color:#666 !important; font-size:0.9rem;">{c['duration']} • {c['xp']} XP</p>
+                    </div>
+                    <span class="status-pill {color}">{c['difficulty']}</span>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            with c2:
+                st.write(""); st.write("") # Spacers for alignment
+                if not done:
+                    # Unique key is crucial for buttons inside loops; the click
+                    # reruns just this fragment
+                    st.button("Done", key=f"btn_{c['id']}", on_click=complete_challenge, args=(username, c['id']))
+                else: 
+                    st.markdown("<div style='text-align:center; font-size:1.5rem;'>✅</div>", unsafe_allow_html=True)
 
 # ----------------------------
 # Init
 # ----------------------------
-ensure_dummy_data()
+# Check Cookie for persistence (HMAC-signed token, see momentum/sessions.py)
+session_token = cookie_manager.get(cookie="session_token")
 
-# Check Cookie for persistence
-cookie_user = cookie_manager.get(cookie="logged_in_user")
+def session_current(claims):
+    # Revocation needs Mongo; while it is out a valid signed token is trusted
+    if not claims: return False
+    return resilience.read(cache.key("session", claims["u"], claims.get("sv", 0)),
+                           lambda: sessions.is_current(db, claims), default=True)
 
 if "authenticated" not in st.session_state:
-    if cookie_user:
-        # Verify user still exists in DB
-        u_data = users_col.find_one({"username": cookie_user})
-        if u_data:
-            st.session_state.authenticated = True
-            st.session_state.username = cookie_user
-            st.session_state.role = u_data.get("role", "student")
-        else:
-            st.session_state.authenticated = False
-            st.session_state.username = None
+    claims = sessions.verify(session_token) if session_token else None
+    if claims and session_current(claims):
+        st.session_state.authenticated = True
+        st.session_state.username = claims["u"]
+        st.session_state.role = claims["r"]
+        st.session_state.claims = claims
     else:
         st.session_state.authenticated = False
         st.session_state.username = None
+elif st.session_state.authenticated and not session_current(st.session_state.get("claims")):
+    # Revoked since login (deleted / role changed); served from the version cache
+    st.session_state.authenticated = False
+    st.session_state.username = None
+    st.session_state.pop("profile", None)
+
+def get_profile(username: str):
+    # Session-scoped profile, reloaded only when its profile_version moves on
+    prof = st.session_state.get("profile")
+    current = resilience.read(cache.key("versions", username), lambda: sessions.user_versions(db, username), default=None)
+    if prof is None or (current and prof.get("profile_version", 0) < current["pv"]):
+        prof = resilience.read(cache.key("profile", username),
+                               lambda: users_col.find_one({"username": username}, {"password_hash": 0, "_id": 0}) or {},
+                               default={})
+        # A fallback copy is not kept, so the next rerun tries Mongo again
+        if resilience.stale_since("profile") is None: st.session_state.profile = prof
+    return prof
 
 # ----------------------------
 # Login / Sign Up Screen
@@ -301,17 +395,22 @@ if not st.session_state.authenticated:
                 u = st.text_input("Username")
                 p = st.text_input("Password", type="password")
                 if st.form_submit_button("Sign In ➔", use_container_width=True):
-                    user = users_col.find_one({"username": u.strip()})
-                    if user and check_password(p, user["password_hash"]):
+                    if app_ready(timeout=5) != "ready": user, err = None, "⏳ The app is still starting up, please try again in a moment."
+                    else:
+                        try: user, err = auth.authenticate(db, u.strip(), p, mongo=resilience.call)
+                        except resilience.Unavailable: user, err = None, "Sign-in is temporarily unavailable, please try again in a minute."
+                    if user:
                         st.session_state.authenticated = True
                         st.session_state.username = user["username"]
                         st.session_state.role = user.get("role", "student")
+                        token = sessions.issue(user)
+                        st.session_state.claims = sessions.verify(token)
                         
                         # SET COOKIE (Expires in 7 days)
-                        cookie_manager.set("logged_in_user", user["username"], expires_at=datetime.now() + timedelta(days=7))
+                        cookie_manager.set("session_token", token, expires_at=datetime.now() + timedelta(days=7))
                         
                         st.rerun()
-                    else: st.error("Invalid credentials")
+                    else: st.error(err)
             if st.button("New here? Create Account", use_container_width=True):
                 st.session_state.auth_mode = "Sign Up"; st.rerun()
 
@@ -323,24 +422,34 @@ if not st.session_state.authenticated:
                 if st.form_submit_button("Create Account", use_container_width=True):
                     if len(new_p) < 4: st.error("Password too short")
                     elif not new_u or not new_name: st.error("All fields required")
+                    elif app_ready(timeout=5) != "ready": st.warning("⏳ The app is still starting up, please try again in a moment.")
                     else:
-                        success, msg = create_user(new_u.strip(), new_p, new_name, "student")
+                        success, msg = create_user(db, new_u.strip(), new_p, new_name, "student")
                         if success: st.success("Account created! Please log in."); st.session_state.auth_mode = "Login"; st.rerun()
                         else: st.error(msg)
             if st.button("Back to Login", use_container_width=True):
                 st.session_state.auth_mode = "Login"; st.rerun()
 
         st.markdown('</div>', unsafe_allow_html=True)
+    if mark("first_login_form"): write_report(instrument.CONFIG["dir"])
+    instrument.end_rerun()
     st.stop()
 
 # ----------------------------
 # Sidebar (Logged In)
 # ----------------------------
 st.markdown("""<style>.stApp {background: linear-gradient(to right, #c3cfe2, #f5f7fa);}</style>""", unsafe_allow_html=True)
+# Pages render from cached/fallback reads while the bootstrap is still retrying
+starting = app_ready(timeout=2) != "ready"
 
 user_role = st.session_state.role
 username = st.session_state.username
-user_profile = users_col.find_one({"username": username})
+user_profile = get_profile(username)
+
+if starting:
+    st.info("⏳ We're still setting things up after a restart. Some figures may be missing for a minute.")
+elif resilience.breaker.state != "closed":
+    st.warning("⚠️ We're having trouble reaching the database. Some figures may be out of date; your progress is saved and will sync automatically.")
 
 st.sidebar.markdown(f"""
 <div style="text-align: center; padding: 20px 0;">
@@ -353,8 +462,9 @@ st.sidebar.markdown(f"""
 """, unsafe_allow_html=True)
 
 if st.sidebar.button("Logout", use_container_width=True):
-    cookie_manager.delete("logged_in_user")
+    cookie_manager.delete("session_token")
     st.session_state.authenticated = False
+    st.session_state.pop("profile", None)
     st.rerun()
 st.sidebar.markdown("---")
 
@@ -362,15 +472,19 @@ st.sidebar.markdown("---")
 # ADMIN VIEW
 # ----------------------------
 if user_role == "admin":
-    page = st.sidebar.radio("Admin Menu", ["📊 Global Dashboard", "👥 User Manager", "⚙️ Content Editor"])
+    page = st.sidebar.radio("Admin Menu", ["📊 Global Dashboard", "📈 Cohort Analytics", "👥 User Manager", "📥 Score Import", "📤 Data Export", "⚙️ Content Editor"])
+    instrument.tag(page=page, role=user_role)
     
     if page == "📊 Global Dashboard":
         st.title("📊 Admin Dashboard")
         st.markdown("Overview of platform performance and engagement.")
-        total_students = users_col.count_documents({"role": "student"})
-        total_admins = users_col.count_documents({"role": "admin"})
-        active_today = len(activity_col.distinct("username", {"date": today_str()}))
-        total_actions = activity_col.count_documents({})
+        # Dashboard reads may lag slightly; route them per [mongo.workloads.analytics]
+        adb = for_workload(db, "analytics")
+        with instrument.section("admin.counts"):
+            counts = resources.get_admin_counts(today_str())
+            stale_note("admin_counts")
+            total_students, total_admins = counts["students"], counts["admins"]
+            active_today, total_actions = counts["active_today"], counts["actions"]
         
         c1, c2, c3, c4 = st.columns(4)
         with c1: st.markdown(f"""<div class="admin-card"><div class="admin-metric-label">Total Students</div><div class="admin-metric-val">{total_students}</div></div>""", unsafe_allow_html=True)
@@ -380,21 +494,23 @@ if user_role == "admin":
 
         st.markdown("---")
         col_chart, col_recent = st.columns([2, 1])
-        with col_chart:
+        with col_chart, instrument.section("admin.activity_chart"):
             st.subheader("📈 Platform Activity")
-            pipeline = [{"$group": {"_id": "$date", "count": {"$sum": 1}}}, {"$sort": {"_id": 1}}]
-            data = list(activity_col.aggregate(pipeline))
+            window = st.selectbox("Window", [30, 90, 365], format_func=lambda n: f"Last {n} days", label_visibility="collapsed")
+            data = resources.get_rollup_window(window_start(today_str(), window), today_str())
+            stale_note("rollups")
             if data:
-                df = pd.DataFrame(data)
-                fig = px.bar(df, x="_id", y="count", labels={'_id': 'Date', 'count': 'Actions'})
+                pd, px = lazy_import("pandas"), lazy_import("plotly.express")
+                df = pd.DataFrame([{"date": r["_id"], "count": r.get("total", 0)} for r in data])
+                fig = px.bar(df, x="date", y="count", labels={'date': 'Date', 'count': 'Actions'})
                 fig.update_traces(marker_color='#FF512F')
                 fig.update_layout(height=350, plot_bgcolor='rgba(0,0,0,0)', font=dict(color="#333"))
                 st.plotly_chart(fig, use_container_width=True)
             else: st.info("No activity data.")
 
-        with col_recent:
+        with col_recent, instrument.section("admin.recent_activity"):
             st.subheader("🕒 Recent Logins")
-            recent = list(activity_col.find().sort("ts", -1).limit(5))
+            recent = recent_events(adb, 5)
             if recent:
                 for act in recent:
                     # New Activity Item Style
@@ -406,31 +522,122 @@ if user_role == "admin":
                     """, unsafe_allow_html=True)
             else: st.caption("No recent activity.")
 
+        with st.expander("⚡ Cache hit rates (this process)"):
+            st.json(cache.stats())
+
+    elif page == "📈 Cohort Analytics":
+        st.title("📈 Cohort Analytics")
+        st.markdown("Band-score progress across all students.")
+        cohort = lazy_import("momentum.cohort")
+        pd, px = lazy_import("pandas"), lazy_import("plotly.express")
+        # Columnar snapshot kept in memory; refreshed incrementally once a minute
+        with instrument.section("cohort.refresh"):
+            eng = cohort.engine(for_workload(db, "analytics"))
+        if eng.scores.empty:
+            st.info("No mock scores yet.")
+        else:
+            f1, f2, f3 = st.columns(3)
+            with f1: since = st.date_input("Tests since", value=None)
+            with f2: band = st.selectbox("Skill", cohort.BANDS, index=len(cohort.BANDS) - 1)
+            with f3: min_tests = st.number_input("Min. tests per student", 2, 50, 2)
+            with instrument.section("cohort.query"):
+                latest = eng.latest(since)
+                pct = eng.percentiles(latest)
+                hist = eng.histogram(latest, band)
+                imp = eng.improvement(min_tests)
+                r = eng.xp_gain_correlation(min_tests)
+                at_target = (eng.students["days_to_target"] == 0).mean() if len(eng.students) else 0
+
+            c1, c2, c3, c4 = st.columns(4)
+            with c1: st.markdown(f"""<div class="admin-card"><div class="admin-metric-label">Students Tested</div><div class="admin-metric-val">{len(latest)}</div></div>""", unsafe_allow_html=True)
+            with c2: st.markdown(f"""<div class="admin-card"><div class="admin-metric-label">Median Overall</div><div class="admin-metric-val">{latest["Overall"].median() if len(latest) else "–"}</div></div>""", unsafe_allow_html=True)
+            with c3: st.markdown(f"""<div class="admin-card"><div class="admin-metric-label">At Target</div><div class="admin-metric-val">{at_target:.0%}</div></div>""", unsafe_allow_html=True)
+            with c4: st.markdown(f"""<div class="admin-card"><div class="admin-metric-label">XP ↔ Gain r</div><div class="admin-metric-val">{"–" if r is None else f"{r:.2f}"}</div></div>""", unsafe_allow_html=True)
+
+            st.markdown("---")
+            left, right = st.columns([1, 1])
+            with left:
+                st.subheader("📊 Percentiles")
+                st.caption("Latest test per student in the window")
+                st.dataframe(pct, use_container_width=True)
+            with right:
+                st.subheader(f"📶 {band} Distribution")
+                fig = px.bar(hist, x="band", y="students", labels={"band": "Band", "students": "Students"})
+                fig.update_traces(marker_color='#667eea')
+                fig.update_layout(height=300, plot_bgcolor='rgba(0,0,0,0)', font=dict(color="#333"), margin=dict(l=0, r=0, t=0, b=0))
+                st.plotly_chart(fig, use_container_width=True)
+
+            st.subheader("🚀 Improvement")
+            st.caption(f"{len(imp)} students with at least {min_tests} tests; trend is the least-squares band change per 30 days")
+            left, right = st.columns([1, 1])
+            with left:
+                fig = px.histogram(imp, x="slope_per_30d", nbins=30, labels={"slope_per_30d": "Bands / 30 days"})
+                fig.update_traces(marker_color='#FF512F')
+                fig.update_layout(height=300, plot_bgcolor='rgba(0,0,0,0)', font=dict(color="#333"), margin=dict(l=0, r=0, t=0, b=0))
+                st.plotly_chart(fig, use_container_width=True)
+            with right:
+                fig = px.scatter(imp, x="xp", y="gain", opacity=0.4, labels={"xp": "XP", "gain": "Band gain (first → last test)"})
+                fig.update_layout(height=300, plot_bgcolor='rgba(0,0,0,0)', font=dict(color="#333"), margin=dict(l=0, r=0, t=0, b=0))
+                st.plotly_chart(fig, use_container_width=True)
+
+            st.subheader("🎯 Time to Target")
+            eta = imp["days_to_target"]
+            on_track = eta[eta > 0]
+            median = f" (median {on_track.median():.0f} days)" if len(on_track) else ""
+            st.caption(f"{int((eta == 0).sum())} reached their target · {len(on_track)} on track{median} · {int(eta.isna().sum())} flat or declining")
+            st.dataframe(imp.sort_values("days_to_target").head(50)[["tests", "first", "last", "target", "slope_per_30d", "days_to_target", "xp"]],
+                         use_container_width=True)
+
     elif page == "👥 User Manager":
         st.title("👥 User Management")
         tab1, tab2 = st.tabs(["📋 All Users", "➕ Create User"])
         with tab1:
-            all_users = list(users_col.find({}, {"password_hash": 0, "_id": 0}))
-            if all_users:
-                df = pd.DataFrame(all_users)
-                search = st.text_input("🔍 Search User", placeholder="Type username...")
-                if search: df = df[df['username'].str.contains(search, case=False)]
+            search = st.text_input("🔍 Search User", placeholder="Username starts with...")
+            # Stack of keyset cursors, one per page visited; reset when the search changes
+            if st.session_state.get("um_search") != search:
+                st.session_state.um_search = search
+                st.session_state.um_cursors = [None]
+            cursors = st.session_state.um_cursors
+            page_users, next_after = list_users(db, search, cursors[-1], limit=25)
+
+            if page_users:
+                df = lazy_import("pandas").DataFrame(page_users)
                 st.dataframe(df, column_config={"username": "Username", "name": "Name", "role": "Role"}, use_container_width=True, hide_index=True)
-                
+            else: st.info("No users found.")
+
+            p1, p2, p3 = st.columns([1, 2, 1])
+            with p1:
+                if st.button("← Prev", disabled=len(cursors) == 1, use_container_width=True):
+                    cursors.pop(); st.rerun()
+            with p2: st.caption(f"Page {len(cursors)}")
+            with p3:
+                if st.button("Next →", disabled=next_after is None, use_container_width=True):
+                    cursors.append(next_after); st.rerun()
+
+            if page_users:
                 st.markdown("### 🛠 User Actions")
                 c1, c2, c3 = st.columns([2, 1, 1])
-                with c1: u_select = st.selectbox("Select User", df['username'].tolist())
+                with c1: u_select = st.selectbox("Select User", [u["username"] for u in page_users])
                 with c2: act_type = st.selectbox("Action", ["Delete User", "Promote to Admin", "Demote to Student"])
                 with c3:
                     st.write(""); st.write("")
                     if st.button("Apply", type="primary"):
                         if u_select == username: st.error("Cannot modify self.")
                         else:
-                            if "Delete" in act_type: users_col.delete_one({"username": u_select}); st.success("Deleted!")
-                            elif "Admin" in act_type: users_col.update_one({"username": u_select}, {"$set": {"role": "admin"}}); st.success("Promoted!")
-                            elif "Student" in act_type: users_col.update_one({"username": u_select}, {"$set": {"role": "student"}}); st.success("Demoted!")
+                            if "Delete" in act_type: deletion.delete_user(db, u_select, requested_by=username); sessions.invalidate(u_select); st.success("Deleted! Their data is being removed in the background.")
+                            elif "Admin" in act_type: users_col.update_one({"username": u_select}, {"$set": {"role": "admin"}}); sessions.revoke(db, u_select); st.success("Promoted!")
+                            elif "Student" in act_type: users_col.update_one({"username": u_select}, {"$set": {"role": "student"}}); sessions.revoke(db, u_select); st.success("Demoted!")
+                            cache.invalidate_prefix("admin_counts")
                             st.rerun()
 
+            jobs = deletion.recent_jobs(db)
+            if jobs:
+                with st.expander("🗑 Recent deletions"):
+                    st.dataframe(lazy_import("pandas").DataFrame([{
+                        "Username": j["_id"], "Status": j["status"], "Step": j.get("step") or "",
+                        "Removed": sum(j.get("removed", {}).values()), "By": j.get("requested_by") or "",
+                        "Requested": j["requested_at"]} for j in jobs]), use_container_width=True, hide_index=True)
+
         with tab2:
             st.subheader("Create New Account")
             with st.form("create_user_admin"):
@@ -438,28 +645,87 @@ if user_role == "admin":
                 with c1: n_u = st.text_input("Username"); n_r = st.selectbox("Role", ["student", "admin"])
                 with c2: n_p = st.text_input("Password", type="password"); n_n = st.text_input("Name")
                 if st.form_submit_button("Create"):
-                    success, msg = create_user(n_u, n_p, n_n, n_r)
-                    if success: st.success(msg)
+                    success, msg = create_user(db, n_u, n_p, n_n, n_r)
+                    if success: cache.invalidate_prefix("admin_counts"); st.success(msg)
                     else: st.error(msg)
 
+    elif page == "📥 Score Import":
+        st.title("📥 Bulk Mock Score Import")
+        st.markdown("Upload a CSV or Excel file with columns **username, date, listening, reading, writing, speaking**. "
+                    "Overall bands are calculated for you; a score for the same student and date replaces the old one.")
+        with st.form("score_import"):
+            upload = st.file_uploader("Scores file", type=["csv", "xlsx", "xls"])
+            ordered = st.checkbox("Stop a batch at its first write error (ordered writes)")
+            if st.form_submit_button("Import", type="primary") and upload:
+                try:
+                    with st.spinner("Importing..."), instrument.section("admin.score_import"):
+                        report = import_scores(db, read_chunks(upload, upload.name), ordered=ordered, source=upload.name)
+                except (ValueError, ImportError) as e:
+                    st.error(f"Could not read file: {e}")
+                else:
+                    for u in report["usernames"]: cache.invalidate(cache.key("scores", u))
+                    st.success(f"{report['rows']} rows: {report['upserted']} new, {report['updated']} updated, {len(report['rejected'])} rejected.")
+                    st.session_state.import_rejected = report["rejected"]
+        rejected = st.session_state.get("import_rejected")
+        if rejected:
+            pd = lazy_import("pandas")
+            df = pd.DataFrame(rejected)
+            st.subheader("Rejected rows")
+            st.dataframe(df, use_container_width=True, hide_index=True)
+            st.download_button("Download rejected rows", df.to_csv(index=False), "rejected_scores.csv", "text/csv")
+
+    elif page == "📤 Data Export":
+        st.title("📤 Data Export")
+        st.markdown("Streams the data from the database in batches, so even the full activity history exports without "
+                    "loading it into memory. Leave the filters empty to export everything.")
+        with st.form("export"):
+            c1, c2, c3 = st.columns(3)
+            with c1: dataset = st.selectbox("Data", list(export.DATASETS)); fmt = st.radio("Format", export.FORMATS, horizontal=True)
+            with c2: start = st.date_input("From", value=None); end = st.date_input("To", value=None)
+            with c3: only = st.text_area("Usernames (one per line)", height=120)
+            submitted = st.form_submit_button("Export", type="primary")
+        if submitted:
+            start_s, end_s = [d.strftime("%Y-%m-%d") if d else None for d in (start, end)]
+            names = [u.strip() for u in only.splitlines() if u.strip()]
+            total = export.count(db, dataset, start_s, end_s, names)
+            bar = st.progress(0.0, text=f"0 / {total:,} rows")
+            def progress(n): bar.progress(min(n / total, 1.0) if total else 1.0, text=f"{n:,} / {total:,} rows")
+            with instrument.section("admin.export"):
+                export_id, path, rows = export.export_to_file(db, dataset, fmt, start_s, end_s, names, progress=progress)
+            st.session_state.last_export = {"id": export_id, "name": os.path.basename(path), "rows": rows,
+                                            "mb": os.path.getsize(path) / 2**20}
+        last = st.session_state.get("last_export")
+        if last and export.path_for(last["id"]):
+            st.success(f"{last['rows']:,} rows exported to {last['name']} ({last['mb']:.1f} MB).")
+            st.link_button("⬇️ Download", f"/api/exports/{last['id']}", type="primary")
+            st.caption(f"Served by server.py and kept for {export.CONFIG['keep_hours']} hours.")
+
     elif page == "⚙️ Content Editor":
         st.title("⚙️ Content Manager")
         with st.expander("➕ Add New Daily Challenge", expanded=True):
             with st.form("new_challenge"):
                 c1, c2 = st.columns(2)
                 with c1: 
-                    c_type = st.selectbox("Skill", ["Listening", "Reading", "Writing", "Speaking"])
-                    c_diff = st.selectbox("Diff", ["Easy", "Medium", "Hard"])
+                    c_type = st.selectbox("Skill", catalog.SKILLS)
+                    c_diff = st.selectbox("Diff", catalog.DIFFICULTIES)
                 with c2: 
                     c_dur = st.text_input("Duration (e.g. 10 min)")
                     # Auto-assign XP based on difficulty, disabled user input for consistency
-                    xp_map = {"Easy": 10, "Medium": 20, "Hard": 30}
-                    c_xp = st.number_input("XP (Fixed)", value=xp_map[c_diff], disabled=True)
+                    c_xp = st.number_input("XP (Fixed)", value=catalog.XP[c_diff], disabled=True)
                 
                 if st.form_submit_button("Publish"):
-                    # Logic to add to DB (Simplified for now)
-                    # In real app: insert into challenges_col
-                    st.success(f"Published {c_diff} challenge worth {xp_map[c_diff]} XP!")
+                    item = catalog.add_item(db, c_type, c_diff, c_dur.strip() or None)
+                    st.success(f"Published {c_diff} challenge worth {item['xp']} XP! Students get it from their next daily set.")
+
+        # Retired templates stay in old daily sets but are no longer scheduled
+        st.subheader(f"📚 Catalog (version {catalog.catalog_version(db)})")
+        for item in catalog.list_items(db):
+            c1, c2 = st.columns([4, 1])
+            with c1: st.markdown(f"**#{item['id']} {item['type']}** · {item['difficulty']} · {item['duration']} · {item['xp']} XP" + ("" if item.get("active", True) else " · _retired_"))
+            with c2:
+                if item.get("active", True):
+                    if st.button("Retire", key=f"retire_{item['id']}"): catalog.set_active(db, item["id"], False); st.rerun()
+                elif st.button("Restore", key=f"restore_{item['id']}"): catalog.set_active(db, item["id"], True); st.rerun()
 
 # ----------------------------
 # STUDENT VIEW
@@ -477,93 +743,63 @@ else:
     """, unsafe_allow_html=True)
     
     page = st.sidebar.radio("Menu", ["📊 My Dashboard", "🎮 Practice Zone", "🏆 Leaderboard", "⚙️ Settings"])
+    instrument.tag(page=page, role=user_role)
     
     if page == "📊 My Dashboard":
         st.markdown(f"## 👋 Hi, {user_profile.get('name', 'Alex')}")
-        total_xp = sum(c.get('xp', 0) for c in challenges_col.find({"username": username, "completed": True}))
-        level = get_level(total_xp)
-        streak = len(activity_col.distinct("date", {"username": username}))
-        
-        c1, c2, c3, c4 = st.columns(4)
-        with c1: st.markdown(f"""<div class="glass-card"><div class="metric-label">Level</div><div class="metric-value">{level}</div></div>""", unsafe_allow_html=True)
-        with c2: st.markdown(f"""<div class="glass-card"><div class="metric-label">XP</div><div class="metric-value">{total_xp}</div></div>""", unsafe_allow_html=True)
-        with c3: st.markdown(f"""<div class="glass-card"><div class="metric-label">Streak</div><div class="metric-value">{streak} 🔥</div></div>""", unsafe_allow_html=True)
-        with c4: st.markdown(f"""<div class="glass-card"><div class="metric-label">Target</div><div class="metric-value">{user_profile.get('target_score', 7.5)}</div></div>""", unsafe_allow_html=True)
+        metric_cards(username, user_profile)
 
         left, right = st.columns([2, 1])
-        with left:
+        with left, instrument.section("dashboard.score_history"):
             st.markdown("### 📅 Score History")
-            scores = list(scores_col.find({"username": username}))
+            scores = resources.score_history(username)
+            stale_note("scores")
             if scores:
+                pd, px = lazy_import("pandas"), lazy_import("plotly.express")
                 df = pd.DataFrame(scores).sort_values("date")
                 fig = px.area(df, x="date", y=["Listening", "Reading", "Writing", "Speaking"], color_discrete_sequence=px.colors.qualitative.Pastel)
                 fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=300, font=dict(color="#333"), margin=dict(l=0, r=0, t=0, b=0))
                 st.plotly_chart(fig, use_container_width=True)
             else: st.info("No scores yet.")
         with right:
-            st.markdown("### 🎯 Next Up")
-            todays = get_or_create_today_challenges(username)
-            next_c = next((c for c in todays if not c["completed"]), None)
-            if next_c:
-                st.markdown(f"""<div class="challenge-box"><span class="status-pill pill-{next_c['difficulty'].lower()}">{next_c['difficulty']}</span><h3 style="margin:10px 0;">{next_c['type']}</h3><p style="color:#666 !important;">⏱️ {next_c['duration']} • ⭐ {next_c['xp']} XP</p></div>""", unsafe_allow_html=True)
-                if st.button("Start →", key="start_main", use_container_width=True):
-                    mark_challenge_completed(username, next_c["id"]); st.rerun()
-            else: st.success("All done! 🎉")
+            next_up(username)
 
     elif page == "🎮 Practice Zone":
         st.title("Today's Tasks")
-        todays = get_or_create_today_challenges(username)
-        completed = sum(1 for c in todays if c['completed'])
-        
-        # Display progress bar only if there are tasks
-        if todays:
-            st.progress(completed / len(todays))
-        else:
-            st.info("No tasks scheduled for today yet.")
-        
-        for c in todays:
-            done = c['completed']
-            
-            # FIXED: Correct color mapping for all 3 levels
-            if c['difficulty'] == "Easy":
-                color = "pill-easy"
-            elif c['difficulty'] == "Medium":
-                color = "pill-medium"
-            else:
-                color = "pill-hard"
-            
-            with st.container():
-                c1, c2 = st.columns([4, 1])
-                # Added opacity to fade out completed tasks
-                with c1: 
-                    st.markdown(f"""
-                    <div class="challenge-box" style="opacity:{0.6 if done else 1}; display:flex; justify-content:space-between; align-items:center;">
-                        <div>
-                            <b>{c['type']}</b>
-                            <p style="margin:0;color:#666 !important; font-size:0.9rem;">{c['duration']} • {c['xp']} XP</p>
-                        </div>
-                        <span class="status-pill {color}">{c['difficulty']}</span>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with c2:
-                    st.write(""); st.write("") # Spacers for alignment
-                    if not done:
-                        # Unique key is crucial for buttons inside loops
-                        if st.button("Done", key=f"btn_{c['id']}"): 
-                            mark_challenge_completed(username, c['id'])
-                            st.rerun()
-                    else: 
-                        st.markdown("<div style='text-align:center; font-size:1.5rem;'>✅</div>", unsafe_allow_html=True)
+        practice_tasks(username)
 
     elif page == "🏆 Leaderboard":
         st.title("🏆 Leaderboard")
-        pipeline = [{"$match": {"completed": True}}, {"$group": {"_id": "$username", "total_xp": {"$sum": "$xp"}}}, {"$sort": {"total_xp": -1}}, {"$limit": 5}]
-        leaders = list(challenges_col.aggregate(pipeline))
-        for i, l in enumerate(leaders):
-            u_name = users_col.find_one({"username": l['_id']}).get('name', l['_id'])
-            medal = ["🥇","🥈","🥉"][i] if i<3 else f"{i+1}."
-            st.markdown(f"""<div class="glass-card" style="display:flex;align-items:center;padding:15px;"><div style="font-size:24px;margin-right:20px;">{medal}</div><div style="flex-grow:1;"><h3 style="margin:0;">{u_name}</h3><p style="margin:0;color:#666 !important;">Level {get_level(l['total_xp'])}</p></div><div class="metric-value" style="font-size:24px;">{l['total_xp']} XP</div></div>""", unsafe_allow_html=True)
+        scope = st.radio("Board", ["All Time", "This Week"], horizontal=True, label_visibility="collapsed")
+        if scope == "All Time":
+            board = get_leaderboard(ALL_TIME)
+            my_xp = resources.user_stats(username).get("xp", 0)
+        else:
+            this_week = week_board(today_str())
+            board = get_leaderboard(this_week)
+            my_xp = resilience.read(cache.key("board_xp", this_week, username), lambda: board_xp(db, this_week, username), default=0)
+        stale_note("leaderboard")
+
+        def leader_card(rank, row, highlight=False):
+            medal = ["🥇","🥈","🥉"][rank-1] if rank<=3 else f"{rank}."
+            border = "border:2px solid #667eea;" if highlight else ""
+            st.markdown(f"""<div class="glass-card" style="display:flex;align-items:center;padding:15px;{border}"><div style="font-size:24px;margin-right:20px;">{medal}</div><div style="flex-grow:1;"><h3 style="margin:0;">{row.get('name', row['username'])}</h3><p style="margin:0;color:#666 !important;">Level {get_level(row['xp'])}</p></div><div class="metric-value" style="font-size:24px;">{row['xp']} XP</div></div>""", unsafe_allow_html=True)
+
+        page_size = 10
+        pages = max(1, -(-len(board) // page_size))
+        lb_page = st.number_input("Page", 1, pages, 1) - 1 if pages > 1 else 0
+        if len(board):
+            for rank, row in board.page(lb_page, page_size):
+                leader_card(rank, row, row["username"] == username)
+        else: st.info("No XP earned yet.")
+
+        st.markdown("### 📍 Your Position")
+        if my_xp > 0:
+            above, below = board.around(username, my_xp)
+            for rank, row in above: leader_card(rank, row)
+            leader_card(board.rank_for(username, my_xp), {"username": username, "name": user_profile.get("name", username), "xp": my_xp}, True)
+            for rank, row in below: leader_card(rank, row)
+        else: st.caption("Complete a challenge to get on the board!")
 
     elif page == "⚙️ Settings":
         # New Styled Header for Settings
@@ -580,9 +816,13 @@ else:
             c1, c2 = st.columns(2)
             with c1: new_n = st.text_input("Full Name", user_profile.get('name'))
             with c2: new_t = st.slider("Target Band Score", 5.0, 9.0, float(user_profile.get('target_score', 7.5)))
+            cur_d = user_profile.get("settings", {}).get("difficulty", "Medium")
+            new_d = st.select_slider("Daily Task Difficulty", catalog.DIFFICULTIES, value=cur_d, help="Applies from your next daily set")
             
             if st.form_submit_button("Update Profile", type="primary"):
-                users_col.update_one({"username": username}, {"$set": {"name": new_n, "target_score": new_t}})
+                users_col.update_one({"username": username}, {"$set": {"name": new_n, "target_score": new_t, "settings.difficulty": new_d}, "$inc": {"profile_version": 1}})
+                if new_n != user_profile.get('name'): rename_user(db, username, new_n); cache.invalidate_prefix("leaderboard")
+                sessions.invalidate(username); st.session_state.pop("profile", None)
                 st.success("Profile updated successfully!")
                 st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
@@ -590,14 +830,6 @@ else:
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
         st.subheader("📝 Add Mock Test Score")
         
-        # Helper function for IELTS rounding logic
-        def calculate_overall(l, r, w, s):
-            avg = (l + r + w + s) / 4
-            decimal = avg - int(avg)
-            if decimal < 0.25: return int(avg)
-            elif decimal < 0.75: return int(avg) + 0.5
-            else: return int(avg) + 1.0
-
         with st.form("add_s"):
             d_date = st.date_input("Test Date")
             
@@ -608,13 +840,10 @@ else:
             with c4: s_score = st.number_input("Speaking", 0.0, 9.0, 6.0, step=0.5)
             
             if st.form_submit_button("Save Score", type="primary"):
-                final_overall = calculate_overall(l_score, r_score, w_score, s_score)
-                scores_col.insert_one({
-                    "username": username,
-                    "date": d_date.strftime("%Y-%m-%d"),
-                    "Listening": l_score, "Reading": r_score, "Writing": w_score, "Speaking": s_score,
-                    "Overall": final_overall
-                })
+                final_overall = save_score(db, username, d_date.strftime("%Y-%m-%d"), [l_score, r_score, w_score, s_score])
+                cache.invalidate(cache.key("scores", username))
                 st.success(f"Score Saved! Your Calculated Band: {final_overall}")
                 st.balloons()
-        st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+        st.markdown('</div>', unsafe_allow_html=True)
+
+instrument.end_rerun()
@@ -0,0 +1 @@
+# Benchmarks for IELTS Momentum: `python -m bench run` / `python -m bench compare`
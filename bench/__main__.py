@@ -0,0 +1,199 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from bench import dataset, load
+from bench.harness import Harness, share_runtime, use_mongomock
+from momentum.db import connect
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare(args):
+    # Connect (mongomock unless --mongo-uri), seed if needed; -> app secrets
+    logging.basicConfig(level=logging.WARNING)
+    mongo = {"uri": args.mongo_uri or "mongodb://bench", "db_name": args.db_name}
+    if args.max_pool_size:
+        mongo["max_pool_size"] = args.max_pool_size
+    if args.mongo_uri:
+        db = connect(mongo)
+        if args.reseed:
+            db.client.drop_database(args.db_name)
+        seeded = db["users"].find_one({"username": dataset.ADMIN}) is not None
+    else:
+        use_mongomock()
+        db = connect(mongo)
+        seeded = False
+    if not seeded:
+        print(f"Seeding {args.users} users / {args.events} events ...")
+        dataset.seed(db, users=args.users, events=args.events, days=args.days, scores=args.scores, rng_seed=args.seed)
+    return {
+        "mongo": mongo,
+        "app": {"seed_demo_users": False, "log_level": "WARNING"},
+        "auth": {"session_secret": "bench"},
+        "metrics": {"enabled": False},
+    }
+
+
+def meta(args, t0):
+    import streamlit
+    return {
+        "commit": git_commit(), "at": datetime.utcnow().isoformat(timespec="seconds"),
+        "backend": "mongod" if args.mongo_uri else "mongomock",
+        "dataset": {"users": args.users, "events": args.events, "days": args.days, "scores": args.scores, "seed": args.seed},
+        "python": platform.python_version(), "streamlit": streamlit.__version__,
+        "cpus": os.cpu_count(), "elapsed_s": round(time.perf_counter() - t0, 1),
+    }
+
+
+def save(result, out, prefix=""):
+    out = out or os.path.join(RESULTS_DIR, f"{prefix}{result['meta']['commit'] or 'nocommit'}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return out
+
+
+def cmd_run(args):
+    secrets = prepare(args)
+    h = Harness(secrets, timeout=args.timeout, trace_memory=args.trace_memory)
+    rng = random.Random(args.seed)
+    t0 = time.perf_counter()
+    for i in range(args.sessions):
+        user = f"bench{rng.randrange(args.users)}"
+        print(f"student session {i + 1}/{args.sessions} ({user})")
+        h.student(user, dataset.PASSWORD, args.reruns)
+    for i in range(args.admin_sessions):
+        print(f"admin session {i + 1}/{args.admin_sessions}")
+        h.admin(dataset.ADMIN, dataset.PASSWORD, args.reruns)
+
+    result = {
+        "meta": {**meta(args, t0), "sessions": args.sessions, "admin_sessions": args.admin_sessions, "reruns": args.reruns},
+        **h.results(),
+    }
+    out = save(result, args.out)
+    print_table(result)
+    print(f"Saved {out}")
+    return 1 if result["errors"] else 0
+
+
+def cmd_load(args):
+    secrets = prepare(args)
+    share_runtime()
+    h = Harness(secrets, timeout=args.timeout)
+    t0 = time.perf_counter()
+    # Imports, st.cache_resource and the read caches are warm before the first level
+    print("warming up ...")
+    h.student("bench0", dataset.PASSWORD, reruns=1)
+    h.admin(dataset.ADMIN, dataset.PASSWORD, reruns=1)
+    ramp = load.ramp(h, args.levels, args.duration, args.users, admin_share=args.admin_share,
+                     think=args.think, slo_ms=args.slo_ms, seed=args.seed, keep_going=args.keep_going)
+    result = {
+        "meta": {**meta(args, t0), "duration_s": args.duration, "think_s": args.think, "admin_share": args.admin_share,
+                 "max_pool_size": args.max_pool_size},
+        **ramp,
+    }
+    out = save(result, args.out, prefix="load-")
+    print(f"{'sessions':>8}{'reruns/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'pool p95':>10}{'cpu':>7}{'errors':>8}")
+    for lv in result["levels"]:
+        print(f"{lv['sessions']:>8}{lv['throughput_rps']:>10}{lv['p50_ms']:>10}{lv['p95_ms']:>10}{lv['p99_ms']:>10}"
+              f"{lv['pool_wait_ms_p95']:>10}{lv['cpu_cores']:>7}{lv['error_rate']:>8.1%}")
+    print(f"Capacity: {result['capacity_sessions']} concurrent sessions with p99 <= {args.slo_ms} ms")
+    print(f"Saved {out}")
+    return 0
+
+
+def print_table(result):
+    print(f"{'step':<26}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mongo/run':>11}")
+    for name, p in result["pages"].items():
+        print(f"{name:<26}{p['runs']:>6}{p['p50_ms']:>10}{p['p95_ms']:>10}{p['p99_ms']:>10}{p['mongo_calls_per_rerun']:>11}")
+    print(f"peak RSS: {result['peak_rss_mb']} MB")
+    for e in result["errors"]:
+        print(f"ERROR in {e['step']}: {e['error']}")
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"{base['meta']['commit']} -> {head['meta']['commit']}")
+    print(f"{'step':<26}{'p50 ms':>20}{'p95 ms':>20}{'mongo/run':>16}")
+    for name in sorted(set(base["pages"]) | set(head["pages"])):
+        a, b = base["pages"].get(name), head["pages"].get(name)
+        if not a or not b:
+            print(f"{name:<26}{'(only in ' + ('head' if b else 'base') + ')':>20}")
+            continue
+
+        def delta(key):
+            change = (b[key] - a[key]) / a[key] * 100 if a[key] else 0.0
+            return f"{a[key]:.0f}->{b[key]:.0f} ({change:+.0f}%)"
+        print(f"{name:<26}{delta('p50_ms'):>20}{delta('p95_ms'):>20}"
+              f"{str(a['mongo_calls_per_rerun']) + '->' + str(b['mongo_calls_per_rerun']):>16}")
+    print(f"peak RSS: {base['peak_rss_mb']} -> {head['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Page latency benchmarks through AppTest")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def dataset_args(p):
+        p.add_argument("--mongo-uri", help="Local mongod to use instead of in-memory mongomock")
+        p.add_argument("--db-name", default="momentum_bench")
+        p.add_argument("--reseed", action="store_true", help="Drop and reseed the --mongo-uri database")
+        p.add_argument("--max-pool-size", type=int, help="[mongo] max_pool_size for the app's client")
+        p.add_argument("--users", type=int, default=2000)
+        p.add_argument("--events", type=int, default=50000)
+        p.add_argument("--days", type=int, default=30, help="Days of activity history")
+        p.add_argument("--scores", type=int, default=3, help="Mock scores per student")
+        p.add_argument("--seed", type=int, default=1)
+        p.add_argument("--timeout", type=float, default=120, help="Per-rerun AppTest timeout (s)")
+
+    p = sub.add_parser("run", help="Seed a dataset, drive every page and save JSON results")
+    dataset_args(p)
+    p.add_argument("--sessions", type=int, default=5, help="Student sessions (random students)")
+    p.add_argument("--admin-sessions", type=int, default=1)
+    p.add_argument("--reruns", type=int, default=3, help="Reruns per page per session")
+    p.add_argument("--trace-memory", action="store_true", help="Per-step peak Python allocation (slower)")
+    p.add_argument("--out", help="Result file (default bench/results/<commit>-<ts>.json)")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("load", help="Ramp up concurrent sessions in one process and find the capacity")
+    dataset_args(p)
+    p.add_argument("--levels", type=lambda v: [int(n) for n in v.split(",")], default=[1, 2, 4, 8, 16, 32],
+                   help="Comma-separated concurrent session counts (default 1,2,4,8,16,32)")
+    p.add_argument("--duration", type=float, default=60, help="Seconds per level")
+    p.add_argument("--think", type=float, default=1.0, help="Mean think time between actions (s)")
+    p.add_argument("--admin-share", type=float, default=0.05, help="Fraction of sessions that are admins")
+    p.add_argument("--slo-ms", type=float, default=2000, help="p99 rerun latency a level must stay within")
+    p.add_argument("--keep-going", action="store_true", help="Run every level even after the SLO breaks")
+    p.add_argument("--out", help="Result file (default bench/results/load-<commit>-<ts>.json)")
+    p.set_defaults(func=cmd_load)
+
+    p = sub.add_parser("compare", help="Compare two result files")
+    p.add_argument("base")
+    p.add_argument("head")
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
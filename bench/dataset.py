@@ -0,0 +1,96 @@
+import random
+import time
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from momentum.activity import write_events
+from momentum.auth import hash_password
+from momentum.bootstrap import bootstrap
+from momentum.catalog import current
+from momentum.challenges import daily_set, schedule
+from momentum.leaderboard import rebuild_leaderboard
+from momentum.scores import SKILLS, overall_bands
+from momentum.stats import rebuild_user_stats
+
+# ----------------------------
+# Synthetic dataset
+# ----------------------------
+# Students are bench0..benchN-1 and the admin is bench_admin, all with
+# PASSWORD. One bcrypt hash is shared by every account, so seeding stays fast
+# while logins still pay the real bcrypt cost. Activity is skewed (a few
+# students produce most events), like the real app.
+
+PASSWORD = "bench123"
+ADMIN = "bench_admin"
+BATCH = 5000
+
+
+def _chunks(items, n=BATCH):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+
+def seed(db, users=2000, events=50000, days=30, challenge_days=7, scores=3, rng_seed=1, log=print):
+    rng = random.Random(rng_seed)
+    t0 = time.perf_counter()
+    bootstrap(db)
+    today = datetime.utcnow().date()
+    dates = [(today - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)]
+    names = [f"bench{i}" for i in range(users)]
+
+    pw = hash_password(PASSWORD)
+    now = datetime.utcnow()
+    docs = [{"username": u, "username_lc": u, "password_hash": pw, "name": f"Student {i}", "role": "student",
+             "target_score": rng.choice([6.5, 7.0, 7.5, 8.0]), "created_at": now - timedelta(days=rng.randrange(days * 2)),
+             "settings": {"learning_time": "Evening", "difficulty": rng.choice(["Easy", "Medium", "Hard"])}}
+            for i, u in enumerate(names)]
+    docs.append({"username": ADMIN, "username_lc": ADMIN, "password_hash": pw, "name": "Bench Admin", "role": "admin",
+                 "target_score": 7.5, "created_at": now, "settings": {"learning_time": "Evening", "difficulty": "Medium"}})
+    for chunk in _chunks(docs):
+        db["users"].insert_many(chunk, ordered=False)
+    log(f"users: {len(docs)}")
+
+    # Pareto-ish weights: the first students are the most active
+    cum = list(accumulate(1 / (i + 1) ** 0.8 for i in range(users)))
+    for start in range(0, events, BATCH):
+        n = min(BATCH, events - start)
+        batch = []
+        for u, d in zip(rng.choices(names, cum_weights=cum, k=n), rng.choices(dates, k=n)):
+            batch.append({"_id": ObjectId(), "username": u, "date": d,
+                          "event": rng.choice(["login", "challenge_completed", "challenge_completed"]),
+                          "ts": datetime.strptime(d, "%Y-%m-%d") + timedelta(seconds=rng.randrange(86400))})
+        write_events(db, batch)
+    log(f"activity events: {events}")
+
+    cat = current(db)
+    docs = []
+    for d in dates[:challenge_days]:
+        for u in names:
+            for c in daily_set(u, d, schedule(cat, u, d)):
+                c["completed"] = rng.random() < 0.5
+                docs.append(c)
+    for chunk in _chunks(docs):
+        db["challenges"].insert_many(chunk, ordered=False)
+    log(f"challenges: {len(docs)}")
+
+    docs = []
+    for u in names:
+        level = rng.uniform(4.5, 7.0)
+        for k in range(scores):
+            bands = [min(9.0, max(0.0, round((level + 0.25 * k + rng.gauss(0, 0.5)) * 2) / 2)) for _ in SKILLS]
+            docs.append({"username": u, "date": (today - timedelta(days=30 * (scores - k))).strftime("%Y-%m-%d"),
+                         **dict(zip(SKILLS, bands)), "updated_at": now})
+    if docs:
+        overall = overall_bands([[d[s] for s in SKILLS] for d in docs])
+        for d, o in zip(docs, overall):
+            d["Overall"] = float(o)
+    for chunk in _chunks(docs):
+        db["scores"].insert_many(chunk, ordered=False)
+    log(f"scores: {len(docs)}")
+
+    rebuild_user_stats(db)
+    rebuild_leaderboard(db)
+    log(f"seeded in {time.perf_counter() - t0:.1f}s")
+    return names
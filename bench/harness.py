@@ -0,0 +1,200 @@
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+from momentum import instrument
+from momentum.metrics import percentile
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+STUDENT_PAGES = ["📊 My Dashboard", "🎮 Practice Zone", "🏆 Leaderboard", "⚙️ Settings"]
+ADMIN_PAGES = ["📊 Global Dashboard", "📈 Cohort Analytics", "👥 User Manager", "📥 Score Import", "⚙️ Content Editor"]
+
+# Collection methods that cost one round trip (mongomock never fires the
+# pymongo command listeners that count them against a real server)
+MONGO_METHODS = ["find", "find_one", "find_one_and_update", "aggregate", "count_documents",
+                 "estimated_document_count", "distinct", "insert_one", "insert_many", "update_one",
+                 "update_many", "replace_one", "delete_one", "delete_many", "bulk_write"]
+
+
+def use_mongomock():
+    # Every connect() returns the same in-memory client
+    import mongomock
+    import momentum.db as mdb
+    client = mongomock.MongoClient()
+    mdb.pymongo.MongoClient = lambda *a, **k: client
+
+    def counted(fn):
+        def run(*args, **kwargs):
+            r = instrument.current()
+            if r is not None:
+                r.mongo_calls += 1
+            return fn(*args, **kwargs)
+        return run
+
+    for name in MONGO_METHODS:
+        setattr(mongomock.collection.Collection, name, counted(getattr(mongomock.collection.Collection, name)))
+    return client
+
+
+def share_runtime():
+    # AppTest swaps a mock Runtime in for the length of each run and clears it
+    # afterwards, which breaks every other session still running. For
+    # concurrent sessions, keep the last one visible to the whole process.
+    from streamlit.runtime import Runtime
+    last = {}
+
+    def instance(cls):
+        rt = cls._instance or last.get("rt")
+        if rt is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        last["rt"] = rt
+        return rt
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "rt" in last)
+
+
+class Harness:
+    # Drives app.py through AppTest and records, per named step: wall time of
+    # each at.run(), Mongo round trips and pool wait of that session during
+    # it, and (with trace_memory) the peak Python allocation. Safe to share
+    # between threads driving separate sessions.
+
+    def __init__(self, secrets, timeout=120, trace_memory=False):
+        self.secrets, self.timeout, self.trace_memory = secrets, timeout, trace_memory
+        self.samples = defaultdict(list)
+        self.calls = defaultdict(list)
+        self.pool_wait = defaultdict(list)
+        self.peak = defaultdict(float)
+        self.errors = []
+        # Running Mongo calls / pool wait per app session id, fed by every
+        # finished rerun; concurrent sessions each read their own totals
+        self._totals = defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+        self._components = None
+        end_rerun = instrument.end_rerun
+
+        def counting_end_rerun(*args, **kwargs):
+            r = instrument.current()
+            if r is not None:
+                with self._lock:
+                    t = self._totals[r.session]
+                    t[0] += r.mongo_calls
+                    t[1] += r.pool_wait_ms
+            return end_rerun(*args, **kwargs)
+        instrument.end_rerun = counting_end_rerun
+        if trace_memory:
+            tracemalloc.start()
+        # Process-wide secrets (set per AppTest, they are swapped in and out
+        # around every run, which races between concurrent sessions)
+        import streamlit as st
+        from streamlit.runtime.secrets import Secrets
+        st.secrets = Secrets()
+        st.secrets._secrets = secrets
+        # AppTest builds a fresh ScriptCache per run, recompiling app.py every
+        # rerun; a server compiles once per process
+        import streamlit.testing.v1.local_script_runner as runner
+        shared = runner.ScriptCache()
+        runner.ScriptCache = lambda: shared
+
+    def app(self):
+        from streamlit.testing.v1 import AppTest
+        at = AppTest.from_file(APP, default_timeout=self.timeout)
+        # Component discovery also runs once per AppTest rather than per process
+        if hasattr(at, "_bidi_component_manager"):
+            if self._components is None:
+                from streamlit.components.v2.component_manager import BidiComponentManager
+                self._components = BidiComponentManager()
+                self._components.discover_and_register_components(start_file_watching=False)
+            at._bidi_component_manager = self._components
+        return at
+
+    def error(self, step, message):
+        with self._lock:
+            self.errors.append({"step": step, "error": str(message)[:500]})
+
+    def _session_totals(self, at):
+        sid = at.session_state["sid"] if "sid" in at.session_state else None
+        with self._lock:
+            return tuple(self._totals[sid]) if sid in self._totals else (0, 0.0)
+
+    def measure(self, name, at):
+        before = self._session_totals(at)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        at.run()
+        dt = time.perf_counter() - t0
+        after = self._session_totals(at)
+        if at.exception:
+            self.error(name, at.exception[0].message)
+        with self._lock:
+            self.samples[name].append(dt)
+            self.calls[name].append(after[0] - before[0])
+            self.pool_wait[name].append(after[1] - before[1])
+            if self.trace_memory:
+                self.peak[name] = max(self.peak[name], tracemalloc.get_traced_memory()[1] / 2**20)
+        return at
+
+    def login(self, username, password):
+        at = self.measure("login_form", self.app())
+        at.text_input[0].input(username)
+        at.text_input[1].input(password)
+        at.button[0].click()
+        at = self.measure("login", at)
+        if not at.exception and not at.sidebar.radio:
+            # Still on the login form (wrong password, locked out, bcrypt pool busy)
+            shown = [e.value for e in at.error] or ["no sidebar after login"]
+            self.error("login", shown[0])
+        return at
+
+    def visit(self, at, pages, reruns):
+        for page in pages:
+            at.sidebar.radio[0].set_value(page)
+            self.measure(page, at)
+            for _ in range(reruns - 1):
+                self.measure(page, at)
+
+    def student(self, username, password, reruns=3):
+        at = self.login(username, password)
+        self.visit(at, STUDENT_PAGES, reruns)
+        at.sidebar.radio[0].set_value("🎮 Practice Zone")
+        at.run()
+        done = next((b for b in at.button if (b.key or "").startswith("btn_")), None)
+        if done is not None:
+            done.click()
+            self.measure("complete_challenge", at)
+
+    def admin(self, username, password, reruns=3):
+        at = self.login(username, password)
+        self.visit(at, ADMIN_PAGES, reruns)
+
+    def reset(self):
+        with self._lock:
+            for d in (self.samples, self.calls, self.pool_wait, self.peak):
+                d.clear()
+            self.errors = []
+
+    def results(self):
+        pages = {}
+        for name, values in self.samples.items():
+            ms = [v * 1000 for v in values]
+            pages[name] = {
+                "runs": len(ms),
+                "mean_ms": round(sum(ms) / len(ms), 2),
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+                "mongo_calls_per_rerun": round(sum(self.calls[name]) / len(ms), 2),
+                "pool_wait_ms_per_rerun": round(sum(self.pool_wait[name]) / len(ms), 3),
+            }
+            if self.trace_memory:
+                pages[name]["peak_alloc_mb"] = round(self.peak[name], 2)
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"pages": pages, "peak_rss_mb": round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1),
+                "errors": self.errors}
@@ -0,0 +1,132 @@
+import os
+import random
+import resource
+import threading
+import time
+
+from bench import dataset
+from momentum.metrics import percentile
+
+# ----------------------------
+# Concurrent-session simulator
+# ----------------------------
+# N virtual users share one app process (the same module state, Mongo client,
+# caches and bcrypt pool a Streamlit server would give them). Each logs in,
+# then loops over weighted actions with a think time in between until the
+# level's duration is up. Levels ramp N up; each level reports throughput,
+# latency percentiles, Mongo pool wait and process CPU. The capacity is the
+# largest N that kept p99 within the SLO and errors under 1%.
+
+STUDENT_MIX = {"dashboard": 3, "leaderboard": 3, "complete": 3, "login": 1}
+ADMIN_MIX = {"admin_dashboard": 3, "cohort": 1, "login": 1}
+
+PAGES = {
+    "dashboard": "📊 My Dashboard",
+    "leaderboard": "🏆 Leaderboard",
+    "admin_dashboard": "📊 Global Dashboard",
+    "cohort": "📈 Cohort Analytics",
+}
+MAX_ERROR_RATE = 0.01
+
+
+def _cpu_seconds():
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime
+
+
+def _complete(h, at, rng):
+    at.sidebar.radio[0].set_value("🎮 Practice Zone")
+    h.measure("practice_zone", at)
+    open_ = [b for b in at.button if (b.key or "").startswith("btn_")]
+    if open_:
+        rng.choice(open_).click()
+        h.measure("complete_challenge", at)
+
+
+def virtual_user(h, stop_at, users, admin, think, rng):
+    name = dataset.ADMIN if admin else f"bench{rng.randrange(users)}"
+    mix = ADMIN_MIX if admin else STUDENT_MIX
+    actions, weights = list(mix), list(mix.values())
+    at = h.login(name, dataset.PASSWORD)
+    while time.time() < stop_at:
+        if think:
+            time.sleep(min(rng.expovariate(1 / think), max(0.0, stop_at - time.time())))
+            if time.time() >= stop_at:
+                break
+        action = rng.choices(actions, weights)[0]
+        if action == "login" or not at.sidebar.radio:
+            # A fresh browser session (and the login form again if the last one failed)
+            at = h.login(name, dataset.PASSWORD)
+        elif action == "complete":
+            _complete(h, at, rng)
+        else:
+            at.sidebar.radio[0].set_value(PAGES[action])
+            h.measure(action, at)
+
+
+def _guarded(h, *args):
+    try:
+        virtual_user(h, *args)
+    except Exception as e:  # a broken session must not hang the level
+        h.error("virtual_user", f"{type(e).__name__}: {e}")
+
+
+def run_level(h, sessions, duration, users, admin_share, think, seed):
+    h.reset()
+    rng = random.Random(seed)
+    stop_at = time.time() + duration
+    n_admins = round(sessions * admin_share)
+    threads = [threading.Thread(target=_guarded, name=f"vu{i}",
+                                args=(h, stop_at, users, i < n_admins, think, random.Random(rng.random())))
+               for i in range(sessions)]
+    cpu0, t0 = _cpu_seconds(), time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    cpu = _cpu_seconds() - cpu0
+
+    res = h.results()
+    ms = [v * 1000 for values in h.samples.values() for v in values]
+    waits = [w for values in h.pool_wait.values() for w in values]
+    reruns = len(ms)
+    return {
+        "sessions": sessions,
+        "admins": n_admins,
+        "wall_s": round(wall, 2),
+        "reruns": reruns,
+        "throughput_rps": round(reruns / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(ms, 50) or 0, 1),
+        "p95_ms": round(percentile(ms, 95) or 0, 1),
+        "p99_ms": round(percentile(ms, 99) or 0, 1),
+        "pool_wait_ms_p95": round(percentile(waits, 95) or 0, 2),
+        "pool_wait_ms_max": round(max(waits, default=0), 2),
+        # Process CPU over wall time: ~1 core means the GIL is saturated
+        "cpu_cores": round(cpu / wall, 2) if wall else 0.0,
+        "cpu_pct_of_host": round(cpu / wall / (os.cpu_count() or 1) * 100, 1) if wall else 0.0,
+        "error_rate": round(len(res["errors"]) / reruns, 4) if reruns else 0.0,
+        "errors": res["errors"][:20],
+        "steps": res["pages"],
+    }
+
+
+def within_slo(level, slo_ms):
+    return level["p99_ms"] <= slo_ms and level["error_rate"] <= MAX_ERROR_RATE and level["reruns"] > 0
+
+
+def ramp(h, levels, duration, users, admin_share=0.05, think=1.0, slo_ms=2000, seed=1, keep_going=False, log=print):
+    results, capacity = [], 0
+    for n in levels:
+        log(f"{n} concurrent sessions for {duration}s ...")
+        level = run_level(h, n, duration, users, admin_share, think, seed + n)
+        level["within_slo"] = within_slo(level, slo_ms)
+        results.append(level)
+        log(f"  {level['throughput_rps']} reruns/s  p50 {level['p50_ms']} ms  p99 {level['p99_ms']} ms  "
+            f"pool wait p95 {level['pool_wait_ms_p95']} ms  CPU {level['cpu_cores']} cores  "
+            f"errors {level['error_rate']:.1%}")
+        if level["within_slo"]:
+            capacity = n
+        elif not keep_going:
+            break
+    return {"levels": results, "capacity_sessions": capacity, "slo_p99_ms": slo_ms}
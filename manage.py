@@ -0,0 +1,245 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from momentum import activity, deletion, export, resilience
+from momentum.activity import archive_activity, migrate_to_buckets, rebuild_rollups
+from momentum.bootstrap import bootstrap, setup_logging
+from momentum.challenges import complete_challenge, pregenerate
+from momentum.db import connect
+from momentum.indexes import ensure_indexes, index_report
+from momentum.leaderboard import WEEKS_KEPT, prune_weeks, rebuild_leaderboard
+from momentum.scores import import_scores, read_chunks
+from momentum.startup import import_times
+from momentum.stats import rebuild_user_stats
+
+# What app.py imports before the login form renders, plus the lazily loaded libraries
+LOGIN_IMPORTS = ["streamlit", "extra_streamlit_components", "pymongo", "bcrypt", "momentum.bootstrap"]
+LAZY_IMPORTS = ["pandas", "plotly.express"]
+
+
+def get_db():
+    # st.secrets reads .streamlit/secrets.toml even outside `streamlit run`
+    activity.configure(**st.secrets.get("activity", {}))
+    deletion.configure(**st.secrets.get("deletion", {}))
+    export.configure(**st.secrets.get("export", {}))
+    resilience.configure(**st.secrets.get("resilience", {}))
+    return connect(st.secrets["mongo"])
+
+
+def cmd_bootstrap(args):
+    setup_logging()
+    result = bootstrap(get_db(), seed_demo=args.seed_demo)
+    print(json.dumps(result, indent=2, default=str))
+
+
+def cmd_indexes(args):
+    db = get_db()
+    if args.create:
+        failed = ensure_indexes(db)
+        for col, name, err in failed:
+            print(f"FAILED {col}.{name}: {err}")
+    print(json.dumps(index_report(db), indent=2))
+
+
+def cmd_rebuild_stats(args):
+    n = rebuild_user_stats(get_db(), args.user)
+    print(f"Rebuilt user_stats for {n} user(s)")
+
+
+def cmd_rebuild_leaderboard(args):
+    n = rebuild_leaderboard(get_db())
+    print(f"Rebuilt {n} leaderboard entries")
+
+
+def cmd_prune_boards(args):
+    n = prune_weeks(get_db(), args.weeks)
+    print(f"Removed {n} entries from weekly boards older than {args.weeks} weeks")
+
+
+def cmd_pregenerate(args):
+    date = args.date or (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
+    users, created = pregenerate(get_db(), date, args.active_days, args.chunk_size)
+    print(f"{date}: {created} challenges created for {users} active users")
+
+
+def cmd_rebuild_rollups(args):
+    n = rebuild_rollups(get_db(), args.since)
+    print(f"Rebuilt activity rollups for {n} day(s)")
+
+
+def cmd_archive_activity(args):
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    res = archive_activity(get_db(), today, args.days)
+    if res is None:
+        print("Retention is off ([activity] retention_days = 0); nothing archived")
+    else:
+        print(f"Deleted {res[1]} raw activity document(s) dated before {res[0]}")
+
+
+def cmd_migrate_activity(args):
+    n = migrate_to_buckets(get_db(), args.batch_size)
+    print(f"Moved {n} event(s) into activity_buckets")
+
+
+def cmd_delete_user(args):
+    db = get_db()
+    if args.batch_size:
+        deletion.configure(batch_size=args.batch_size)
+    if db["users"].delete_one({"username": args.username}).deleted_count:
+        print(f"Deleted account {args.username}")
+    deletion.request(db, args.username, requested_by="manage.py")
+    for username, status in deletion.run_pending(db).items():
+        print(f"{username}: {status}")
+
+
+def cmd_purge_orphans(args):
+    db = get_db()
+    if args.batch_size:
+        deletion.configure(batch_size=args.batch_size)
+    orphans, results = deletion.purge_orphans(db, dry_run=args.dry_run)
+    for username, counts in sorted(orphans.items()):
+        print(f"{username}: " + ", ".join(f"{n} {col}" for col, n in counts.items()) +
+              (f" -> {results.get(username, 'skipped (deletion in progress)')}" if not args.dry_run else ""))
+    print(f"{len(orphans)} orphaned username(s)" + (" (dry run, nothing deleted)" if args.dry_run else ""))
+
+
+def cmd_export(args):
+    db = get_db()
+    out = args.out or export.file_name(args.dataset, args.format, args.start, args.end)
+    total = export.count(db, args.dataset, args.start, args.end, args.user)
+    t0 = time.perf_counter()
+
+    def progress(rows):
+        print(f"\r{rows:,} / {total:,} rows ({time.perf_counter() - t0:.0f}s)", end="", file=sys.stderr, flush=True)
+    with open(out, "wb") as f:
+        rows = export.export(db, args.dataset, f, args.format, args.start, args.end, args.user,
+                             batch_size=args.batch_size, progress=progress)
+    print(file=sys.stderr)
+    print(f"Wrote {rows} row(s) to {out}")
+
+
+def cmd_replay_writes(args):
+    db = get_db()
+    resilience.register("complete_challenge", complete_challenge)
+    applied = resilience.replay(db)
+    left = resilience.pending()
+    print(f"Replayed {applied} queued write(s)" + (f"; {left} still queued (Mongo unavailable)" if left else ""))
+
+
+def cmd_import_scores(args):
+    report = import_scores(get_db(), read_chunks(args.file, args.file, args.chunk_size),
+                           ordered=args.ordered, source=os.path.basename(args.file))
+    print(f"{report['rows']} rows: {report['upserted']} new, {report['updated']} updated, {len(report['rejected'])} rejected")
+    if report["rejected"]:
+        with open(args.report, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=["row", "username", "reason"])
+            w.writeheader()
+            w.writerows(report["rejected"])
+        print(f"Rejected rows written to {args.report}")
+
+
+def cmd_startup_report(args):
+    wanted, slowest = import_times(LOGIN_IMPORTS + LAZY_IMPORTS)
+    print("Import time (cumulative ms, fresh interpreter):")
+    for name in LOGIN_IMPORTS + LAZY_IMPORTS:
+        tag = "lazy" if name in LAZY_IMPORTS else "login"
+        print(f"  {name:<30} {wanted.get(name, 0):>8.1f}  [{tag}]")
+    print(f"  login path total: {sum(wanted.get(m, 0) for m in LOGIN_IMPORTS):.1f} ms")
+    print("Slowest modules:")
+    for name, ms in slowest:
+        print(f"  {name:<50} {ms:>8.1f}")
+    path = os.path.join(args.metrics_dir, "startup.json")
+    if os.path.exists(path):
+        print(f"Last app startup ({path}):")
+        with open(path) as f:
+            print(f.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IELTS Momentum maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("bootstrap", help="Create indexes and apply pending migrations")
+    p.add_argument("--seed-demo", action="store_true", help="Also create the demo accounts")
+    p.set_defaults(func=cmd_bootstrap)
+
+    p = sub.add_parser("indexes", help="Report missing/unused indexes")
+    p.add_argument("--create", action="store_true", help="Create declared indexes first")
+    p.set_defaults(func=cmd_indexes)
+
+    p = sub.add_parser("rebuild-stats", help="Backfill/repair user_stats from challenges and daily activity markers")
+    p.add_argument("--user", help="Only rebuild this username")
+    p.set_defaults(func=cmd_rebuild_stats)
+
+    p = sub.add_parser("rebuild-leaderboard", help="Rebuild all-time and weekly boards from challenges")
+    p.set_defaults(func=cmd_rebuild_leaderboard)
+
+    p = sub.add_parser("prune-boards", help="Delete weekly leaderboards older than --weeks (the all-time board is kept)")
+    p.add_argument("--weeks", type=int, default=WEEKS_KEPT)
+    p.set_defaults(func=cmd_prune_boards)
+
+    p = sub.add_parser("pregenerate", help="Create a day's challenges for all active students (default: tomorrow UTC)")
+    p.add_argument("--date", help="YYYY-MM-DD")
+    p.add_argument("--active-days", type=int, default=14, help="Include students active in the last N days")
+    p.add_argument("--chunk-size", type=int, default=1000, help="Upserts per bulk_write")
+    p.set_defaults(func=cmd_pregenerate)
+
+    p = sub.add_parser("rebuild-rollups", help="Rebuild daily activity rollups from raw events")
+    p.add_argument("--since", help="Only rebuild dates >= YYYY-MM-DD")
+    p.set_defaults(func=cmd_rebuild_rollups)
+
+    p = sub.add_parser("archive-activity", help="Delete raw activity older than the retention window (rollups are kept)")
+    p.add_argument("--days", type=int, help="Keep the last N days (default: [activity] retention_days)")
+    p.set_defaults(func=cmd_archive_activity)
+
+    p = sub.add_parser("migrate-activity", help="Move per-event activity documents into per-user-per-day buckets")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=cmd_migrate_activity)
+
+    p = sub.add_parser("import-scores", help="Bulk import mock test scores from CSV/Excel (upsert on username + date)")
+    p.add_argument("file", help="CSV or .xlsx with username, date, listening, reading, writing, speaking")
+    p.add_argument("--ordered", action="store_true", help="Stop each batch at its first write error")
+    p.add_argument("--chunk-size", type=int, default=1000, help="Rows per parse/validate/bulk_write batch")
+    p.add_argument("--report", default="rejected_scores.csv", help="Where to write rejected rows")
+    p.set_defaults(func=cmd_import_scores)
+
+    p = sub.add_parser("delete-user", help="Delete an account and all of its data (resumes an unfinished deletion)")
+    p.add_argument("username")
+    p.add_argument("--batch-size", type=int, help="Documents per delete batch (default: [deletion] batch_size)")
+    p.set_defaults(func=cmd_delete_user)
+
+    p = sub.add_parser("purge-orphans", help="Delete data whose account no longer exists")
+    p.add_argument("--dry-run", action="store_true", help="Only list orphaned usernames and document counts")
+    p.add_argument("--batch-size", type=int, help="Documents per delete batch (default: [deletion] batch_size)")
+    p.set_defaults(func=cmd_purge_orphans)
+
+    p = sub.add_parser("export", help="Stream activity, scores or challenges to CSV/Parquet in batches")
+    p.add_argument("dataset", choices=list(export.DATASETS))
+    p.add_argument("--format", choices=export.FORMATS, default="csv")
+    p.add_argument("--start", help="First date, YYYY-MM-DD")
+    p.add_argument("--end", help="Last date, YYYY-MM-DD")
+    p.add_argument("--user", action="append", help="Only this username (repeatable)")
+    p.add_argument("--batch-size", type=int, help="Documents per cursor batch / write (default: [export] batch_size)")
+    p.add_argument("--out", help="Output file (default <dataset>_<start>_<end>.<format>)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("replay-writes", help="Apply writes the app queued while Mongo was unreachable")
+    p.set_defaults(func=cmd_replay_writes)
+
+    p = sub.add_parser("startup-report", help="Per-import timings and the app's last cold-start milestones")
+    p.add_argument("--metrics-dir", default=".metrics")
+    p.set_defaults(func=cmd_startup_report)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
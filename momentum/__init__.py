@@ -0,0 +1 @@
+# Shared backend pieces for IELTS Momentum (used by app.py and manage.py)
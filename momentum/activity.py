@@ -0,0 +1,290 @@
+import hashlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# ----------------------------
+# Activity events + daily rollups
+# ----------------------------
+# Raw events go to `activity` (one document per event) or, with
+# storage = "buckets", to `activity_buckets` (one document per user per day:
+#   {_id: "YYYY-MM-DD:username", date, username, n, last_ts, events: [...]}).
+# Each write also bumps a per-user-per-day marker in `daily_active_users`
+#   {_id: "YYYY-MM-DD:username", date, username, total, events: {<event>: n},
+#    applied: [{_id, event}]}
+# and `daily_activity_rollup`
+#   {_id: "YYYY-MM-DD", total, active_users, events: {<event>: n}, seen: {<key>: n}}
+# so active users are counted exactly once per day. Rollups and markers are
+# kept forever; raw events older than retention_days are deleted by
+# archive_activity(), which leaves the per-day analytics intact.
+#
+# Both are safe to apply twice, so a retried batch (see writebehind.py) simply
+# applies all its events again: a marker counts an event only if its _id is not
+# in `applied` yet, and a rollup records in seen[user_key(username)] the marker
+# total it has added up to, so it only adds the rest (and counts the user as
+# active when it first sees them).
+
+BATCH_SIZE = 1000
+DUPLICATE_KEY = 11000
+
+CONFIG = {"storage": "events", "retention_days": 0}
+
+
+def configure(**settings):
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+
+
+# Set by start_writer(); when present, events are queued and written in batches
+_writer = None
+
+
+def log_event(db, username: str, date: str, event: str, **fields):
+    doc = {"_id": ObjectId(), "username": username, "date": date, "event": event, **fields,
+           "ts": datetime.utcnow()}
+    if _writer is not None:
+        _writer.submit(doc)
+    else:
+        write_events(db, [doc])
+
+
+def start_writer(db, **settings):
+    global _writer
+    from .writebehind import EventWriter
+    if _writer is None:
+        _writer = EventWriter(lambda docs: write_events(db, docs), **settings)
+    return _writer
+
+
+def write_events(db, docs):
+    # Store a batch of events and apply their rollup increments. Events carry
+    # their own _id, so a replayed batch skips the ones already stored; the
+    # rollups skip the ones they already hold.
+    inserted = (_store_buckets if CONFIG["storage"] == "buckets" else _store_events)(db, docs)
+    update_rollups(db, docs)
+    return len(inserted)
+
+
+def user_key(username: str):
+    # Usernames are free text; field names must not contain "." or start with "$"
+    return hashlib.sha1(username.encode()).hexdigest()[:16]
+
+
+def _store_events(db, docs):
+    try:
+        db["activity"].insert_many(docs, ordered=False)
+        return docs
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+        if any(err["code"] != DUPLICATE_KEY for err in errors):
+            raise
+        skipped = {err["index"] for err in errors}
+        return [d for i, d in enumerate(docs) if i not in skipped]
+
+
+def _bucket_ops(docs):
+    # The filter misses when the event is already in its bucket; the upsert
+    # then collides with the existing _id (E11000) instead of adding it twice.
+    return [UpdateOne(
+        {"_id": f"{d['date']}:{d['username']}", "events._id": {"$ne": d["_id"]}},
+        {"$push": {"events": {k: v for k, v in d.items() if k not in ("username", "date")}},
+         "$inc": {"n": 1}, "$max": {"last_ts": d["ts"]},
+         "$setOnInsert": {"date": d["date"], "username": d["username"]}},
+        upsert=True,
+    ) for d in docs]
+
+
+def _apply_once(col, make_ops, docs):
+    # -> ids of the docs whose update was already applied. Retry once: the
+    # first E11000 can also mean another writer created the document between
+    # our filter and our insert.
+    pending = list(docs)
+    for _ in range(2):
+        try:
+            col.bulk_write(make_ops(pending), ordered=False)
+            return set()
+        except BulkWriteError as e:
+            errors = e.details["writeErrors"]
+            if any(err["code"] != DUPLICATE_KEY for err in errors):
+                raise
+            pending = [pending[err["index"]] for err in errors]
+    return {d["_id"] for d in pending}
+
+
+def _store_buckets(db, docs):
+    stored_before = _apply_once(db["activity_buckets"], _bucket_ops, docs)
+    return [d for d in docs if d["_id"] not in stored_before]
+
+
+def _marker_ops(docs):
+    # Same trick as _bucket_ops, keyed on `applied`
+    return [UpdateOne(
+        {"_id": f"{d['date']}:{d['username']}", "applied._id": {"$ne": d["_id"]}},
+        {"$inc": {"total": 1, f"events.{d['event']}": 1},
+         "$push": {"applied": {"_id": d["_id"], "event": d["event"]}},
+         "$setOnInsert": {"date": d["date"], "username": d["username"]}},
+        upsert=True,
+    ) for d in docs]
+
+
+def update_rollups(db, docs):
+    _apply_once(db["daily_active_users"], _marker_ops, docs)
+    _sync_rollups(db, sorted({(d["date"], d["username"]) for d in docs}))
+
+
+def _sync_rollups(db, pairs, attempts: int = 5):
+    # Adds what each (date, username) marker holds beyond the rollup's seen
+    # count. The update is conditional on that count, so a concurrent writer
+    # that got there first makes it miss (E11000 on the upsert) and the pair
+    # is read again.
+    for _ in range(attempts):
+        markers = {m["_id"]: m for m in db["daily_active_users"].find(
+            {"_id": {"$in": [f"{d}:{u}" for d, u in pairs]}}, {"total": 1, "applied": 1})}
+        seen = {r["_id"]: r.get("seen", {}) for r in db["daily_activity_rollup"].find(
+            {"_id": {"$in": sorted({d for d, _ in pairs})}}, {f"seen.{user_key(u)}": 1 for _, u in pairs})}
+        ops, todo = [], []
+        for d, u in pairs:
+            m = markers.get(f"{d}:{u}")
+            if m is None:
+                continue  # purged since
+            applied, total, key = m.get("applied", []), m.get("total", 0), user_key(u)
+            base = seen.get(d, {}).get(key)
+            # Markers from before `applied` existed were added up when written
+            first = base is None and total == len(applied)
+            cond = {"$exists": False} if base is None else base
+            base = total - len(applied) if base is None else base
+            if total <= base:
+                continue
+            inc = Counter({"total": total - base})
+            inc.update(f"events.{a['event']}" for a in applied[len(applied) - (total - base):])
+            if first:
+                inc["active_users"] = 1
+            ops.append(UpdateOne({"_id": d, f"seen.{key}": cond},
+                                 {"$inc": dict(inc), "$set": {f"seen.{key}": total}}, upsert=True))
+            todo.append((d, u))
+        if not ops:
+            return
+        try:
+            db["daily_activity_rollup"].bulk_write(ops, ordered=False)
+            return
+        except BulkWriteError as e:
+            errors = e.details["writeErrors"]
+            if any(err["code"] != DUPLICATE_KEY for err in errors):
+                raise
+            pairs = [todo[err["index"]] for err in errors]
+    raise RuntimeError(f"daily_activity_rollup kept changing; {len(pairs)} user-day(s) left to add up")
+
+
+def get_rollups(db, start: str, end: str):
+    return list(db["daily_activity_rollup"].find({"_id": {"$gte": start, "$lte": end}}).sort("_id", 1))
+
+
+def day_rollup(db, date: str):
+    return db["daily_activity_rollup"].find_one({"_id": date}) or {"_id": date, "total": 0, "active_users": 0, "events": {}}
+
+
+def total_events(db):
+    res = list(db["daily_activity_rollup"].aggregate([{"$group": {"_id": None, "n": {"$sum": "$total"}}}]))
+    return res[0]["n"] if res else 0
+
+
+def window_start(end: str, days: int):
+    return (datetime.strptime(end, "%Y-%m-%d") - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+def recent_events(db, limit: int = 5):
+    # Newest events across both stores
+    events = list(db["activity"].find().sort("ts", -1).limit(limit))
+    for b in db["activity_buckets"].find().sort("last_ts", -1).limit(limit):
+        events.extend({**e, "username": b["username"], "date": b["date"]} for e in b["events"])
+    return sorted(events, key=lambda e: e["ts"], reverse=True)[:limit]
+
+
+def event_counts(db, match):
+    # {(date, username): Counter(event -> n)} over raw events in both stores.
+    # Events move between stores (migrate_to_buckets), so they are summed.
+    group = {"$group": {"_id": {"d": "$date", "u": "$username", "e": "$event"}, "n": {"$sum": 1}}}
+    counts = {}
+    for col, pipeline in (
+        ("activity", [{"$match": match}, group]),
+        ("activity_buckets", [{"$match": match}, {"$unwind": "$events"},
+                              {"$project": {"date": 1, "username": 1, "event": "$events.event"}}, group]),
+    ):
+        for r in db[col].aggregate(pipeline, allowDiskUse=True):
+            counts.setdefault((r["_id"]["d"], r["_id"]["u"]), Counter())[r["_id"]["e"]] += r["n"]
+    return counts
+
+
+def archived_before(db):
+    doc = db["meta"].find_one({"_id": "activity"})
+    return doc.get("archived_before") if doc else None
+
+
+def rebuild_rollups(db, since: str = None):
+    # Recompute rollups (and active-user markers) from raw activity, optionally
+    # only for dates >= since. Archived days have no raw events left, so they
+    # are never rebuilt.
+    since = max(filter(None, [since, archived_before(db)]), default=None)
+    match = {"date": {"$gte": since}} if since else {}
+    counts = event_counts(db, match)
+
+    rollups = {}
+    for (d, u), events in counts.items():
+        day = rollups.setdefault(d, {"total": 0, "active_users": 0, "events": {}, "seen": {}})
+        day["active_users"] += 1
+        day["total"] += sum(events.values())
+        day["seen"][user_key(u)] = sum(events.values())
+        for e, n in events.items():
+            day["events"][e] = day["events"].get(e, 0) + n
+
+    db["daily_active_users"].delete_many(match)
+    ops = [UpdateOne({"_id": f"{d}:{u}"}, {"$set": {"date": d, "username": u, "total": sum(ev.values()), "events": dict(ev)}}, upsert=True)
+           for (d, u), ev in counts.items()]
+    for i in range(0, len(ops), BATCH_SIZE):
+        db["daily_active_users"].bulk_write(ops[i:i + BATCH_SIZE], ordered=False)
+
+    db["daily_activity_rollup"].delete_many({"_id": {"$gte": since}} if since else {})
+    ops = [UpdateOne({"_id": d}, {"$set": v}, upsert=True) for d, v in rollups.items()]
+    for i in range(0, len(ops), BATCH_SIZE):
+        db["daily_activity_rollup"].bulk_write(ops[i:i + BATCH_SIZE], ordered=False)
+    return len(rollups)
+
+
+# ----------------------------
+# Retention + storage migration
+# ----------------------------
+def archive_activity(db, today: str, days: int = None):
+    # Deletes raw events older than `days` (default retention_days; 0 keeps
+    # everything). Daily rollups and per-user markers already hold their
+    # counts; markers written before they carried counts are filled in first.
+    days = CONFIG["retention_days"] if days is None else days
+    if not days:
+        return None
+    cutoff = window_start(today, days)
+    match = {"date": {"$lt": cutoff}}
+    ops = [UpdateOne({"_id": f"{d}:{u}", "total": {"$exists": False}},
+                     {"$set": {"total": sum(ev.values()), "events": dict(ev)}})
+           for (d, u), ev in event_counts(db, match).items()]
+    for i in range(0, len(ops), BATCH_SIZE):
+        db["daily_active_users"].bulk_write(ops[i:i + BATCH_SIZE], ordered=False)
+    # Recorded first: a rebuild must not recompute these days from partial raw data
+    db["meta"].update_one({"_id": "activity"}, {"$max": {"archived_before": cutoff}}, upsert=True)
+    removed = db["activity"].delete_many(match).deleted_count
+    removed += db["activity_buckets"].delete_many(match).deleted_count
+    return cutoff, removed
+
+
+def migrate_to_buckets(db, batch_size: int = BATCH_SIZE):
+    # Moves per-event documents into day buckets. Rollups are untouched (the
+    # events were already counted). Each batch is deleted only after it is
+    # stored, so an interrupted run can simply be started again.
+    moved = 0
+    while True:
+        batch = list(db["activity"].find().sort("_id", 1).limit(batch_size))
+        if not batch:
+            return moved
+        _store_buckets(db, batch)
+        db["activity"].delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+        moved += len(batch)
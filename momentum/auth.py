@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as HashTimeout
+
+import bcrypt
+from pymongo.errors import PyMongoError
+
+from .instrument import section
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Settings ([auth] in secrets.toml)
+# ----------------------------
+CONFIG = {
+    "bcrypt_rounds": 12,     # work factor for new / upgraded hashes
+    "hash_workers": 2,       # bcrypt threads per process (bcrypt releases the GIL)
+    "max_pending": 16,       # queued + running hash jobs before logins are refused
+    "hash_timeout": 10,      # seconds to wait for a hash job
+    "max_failures": 5,       # failed logins per username ...
+    "failure_window": 300,   # ... within this many seconds locks the username
+    "lockout_seconds": 300,
+}
+
+
+class AuthBusy(Exception):
+    pass
+
+
+class _Pool:
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(timeout=1):
+            raise AuthBusy("Too many logins in progress")
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # The slot is held until the job finishes, not until we stop waiting
+        future.add_done_callback(lambda f: self.slots.release())
+        try:
+            return future.result(timeout=CONFIG["hash_timeout"])
+        except HashTimeout:
+            raise AuthBusy("Password check timed out")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_dummy_hash = None
+
+
+def configure(**settings):
+    global _pool, _dummy_hash
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+    with _pool_lock:
+        if _pool is not None:
+            _pool.executor.shutdown(wait=False)
+        _pool = None
+    _dummy_hash = None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _Pool(CONFIG["hash_workers"], CONFIG["max_pending"])
+        return _pool
+
+
+def hash_password(plain: str) -> bytes:
+    rounds = CONFIG["bcrypt_rounds"]
+    with section("bcrypt.hash"):
+        return _get_pool().run(lambda: bcrypt.hashpw(plain.encode("utf-8"), bcrypt.gensalt(rounds)))
+
+
+def check_password(plain: str, hashed: bytes) -> bool:
+    with section("bcrypt.check"):
+        return _get_pool().run(lambda: bcrypt.checkpw(plain.encode("utf-8"), hashed))
+
+
+def dummy_hash() -> bytes:
+    # Checked for unknown usernames so they take as long as a wrong password
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password("not-a-password")
+    return _dummy_hash
+
+
+def hash_rounds(hashed: bytes) -> int:
+    # $2b$12$<salt+hash>
+    return int(hashed.split(b"$")[2])
+
+
+def needs_rehash(hashed: bytes) -> bool:
+    return hash_rounds(hashed) < CONFIG["bcrypt_rounds"]
+
+
+# ----------------------------
+# Per-username throttling
+# ----------------------------
+_failures = defaultdict(deque)
+_locked_until = {}
+_in_flight = set()
+_throttle_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def locked_for(username: str) -> float:
+    # Seconds left on a lockout (0 if none)
+    with _throttle_lock:
+        return max(0.0, _locked_until.get(username, 0) - time.monotonic())
+
+
+def _sweep(now):
+    # Forget usernames whose failures and lockout have all expired (caller holds the lock)
+    global _last_sweep
+    if now - _last_sweep < CONFIG["failure_window"]:
+        return
+    _last_sweep = now
+    for u in [u for u, q in _failures.items() if not q or now - q[-1] > CONFIG["failure_window"]]:
+        del _failures[u]
+    for u in [u for u, until in _locked_until.items() if until <= now]:
+        del _locked_until[u]
+
+
+def _record_failure(username):
+    now = time.monotonic()
+    with _throttle_lock:
+        _sweep(now)
+        q = _failures[username]
+        q.append(now)
+        while q and now - q[0] > CONFIG["failure_window"]:
+            q.popleft()
+        if len(q) >= CONFIG["max_failures"]:
+            _locked_until[username] = now + CONFIG["lockout_seconds"]
+            q.clear()
+            log.warning("Login locked for %s after repeated failures", username)
+
+
+def _clear_failures(username):
+    with _throttle_lock:
+        _failures.pop(username, None)
+        _locked_until.pop(username, None)
+
+
+def authenticate(db, username: str, password: str, mongo=None):
+    # Returns (user, error). Only one verification per username runs at a time,
+    # and locked usernames are refused before any bcrypt work is queued.
+    # mongo(fn) wraps each database call (e.g. resilience.call), so its time
+    # budget never includes bcrypt.
+    mongo = mongo or (lambda fn: fn())
+    wait = locked_for(username)
+    if wait:
+        return None, f"Too many attempts. Try again in {int(wait // 60) + 1} min."
+    with _throttle_lock:
+        if username in _in_flight:
+            return None, "Login already in progress."
+        _in_flight.add(username)
+    try:
+        user = mongo(lambda: db["users"].find_one({"username": username}))
+        try:
+            ok = check_password(password, user["password_hash"] if user else dummy_hash()) and bool(user)
+        except AuthBusy:
+            return None, "Server busy, please try again in a moment."
+        if not ok:
+            _record_failure(username)
+            return None, "Invalid credentials"
+        _clear_failures(username)
+
+        if needs_rehash(user["password_hash"]):
+            # Upgrade to the current work factor while we have the plain password
+            try:
+                new_hash = hash_password(password)
+                mongo(lambda: db["users"].update_one({"_id": user["_id"], "password_hash": user["password_hash"]},
+                                                     {"$set": {"password_hash": new_hash}}))
+            except (AuthBusy, PyMongoError):
+                # Best effort: the login itself has succeeded
+                pass
+        return user, None
+    finally:
+        with _throttle_lock:
+            _in_flight.discard(username)
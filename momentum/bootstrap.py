@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from .activity import rebuild_rollups
+from .catalog import seed_catalog
+from .challenges import backfill_slots, dedupe_challenges
+from .indexes import ensure_indexes, index_report
+from .leaderboard import rebuild_leaderboard
+from .scores import dedupe_scores
+from .stats import rebuild_user_stats
+from .users import backfill_username_lc, create_user
+
+log = logging.getLogger("momentum")
+
+DEMO_USERS = [
+    ("admin", "leap123", "Super Admin", "admin"),
+    ("demo", "demo123", "Alex Student", "student"),
+]
+
+# ----------------------------
+# Schema migrations
+# ----------------------------
+# Applied in order and recorded in meta {_id: "schema"}. Every step must be
+# idempotent: two processes starting together may both run a pending step.
+MIGRATIONS = [
+    (1, "backfill user_stats", rebuild_user_stats),
+    (2, "backfill leaderboard", rebuild_leaderboard),
+    (3, "remove duplicate daily challenges", dedupe_challenges),
+    (4, "backfill daily activity rollups", rebuild_rollups),
+    (5, "add users.username_lc", backfill_username_lc),
+    (6, "seed challenge catalog", seed_catalog),
+    (7, "one mock score per (username, date)", dedupe_scores),
+    # 1 ran before 4 created the daily_active_users markers its streaks are
+    # built from, so an upgraded database got streak 0 / last_active None
+    (8, "recompute user_stats streaks from daily activity markers", rebuild_user_stats),
+    (9, "one daily challenge per (username, date, slot)", backfill_slots),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def setup_logging(level="INFO"):
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+        log.addHandler(handler)
+    log.setLevel(level)
+
+
+def schema_version(db):
+    doc = db["meta"].find_one({"_id": "schema"})
+    return doc.get("version", 0) if doc else 0
+
+
+def run_migrations(db):
+    current = schema_version(db)
+    applied = []
+    for version, label, step in MIGRATIONS:
+        if version <= current:
+            continue
+        t0 = time.perf_counter()
+        step(db)
+        db["meta"].update_one(
+            {"_id": "schema"},
+            {"$max": {"version": version}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        log.info("Migration %s (%s) applied in %.2fs", version, label, time.perf_counter() - t0)
+        applied.append(version)
+    return applied
+
+
+def seed_demo_users(db):
+    for u, p, name, role in DEMO_USERS:
+        if not db["users"].find_one({"username": u}, {"_id": 1}):
+            create_user(db, u, p, name, role)
+
+
+def bootstrap(db, seed_demo=False):
+    # One-time process setup; the app calls this through st.cache_resource.
+    timings = {}
+    t0 = time.perf_counter()
+
+    t = time.perf_counter()
+    failed = ensure_indexes(db)
+    timings["indexes"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    applied = run_migrations(db)
+    if failed and applied:
+        # A migration may have cleaned up whatever blocked an index (e.g. duplicates)
+        failed = ensure_indexes(db)
+    timings["migrations"] = time.perf_counter() - t
+
+    if seed_demo:
+        t = time.perf_counter()
+        seed_demo_users(db)
+        timings["seed"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    report = index_report(db)
+    timings["index_report"] = time.perf_counter() - t
+
+    timings["total"] = time.perf_counter() - t0
+    log.info("Bootstrap finished in %.2fs (%s)", timings["total"],
+             ", ".join(f"{k}={v:.2f}s" for k, v in timings.items() if k != "total"))
+    return {"timings": timings, "failed_indexes": failed, "migrations": applied, "indexes": report}
+
+
+class BackgroundBootstrap:
+    # bootstrap() off the calling thread, so the first page can render while
+    # indexes/migrations run. A failed attempt (e.g. Mongo unreachable at
+    # start) is retried with exponential backoff until one succeeds; status is
+    # "starting" -> ("retrying" ->) "ready", and wait() never raises.
+
+    def __init__(self, db, seed_demo=False, backoff=(2.0, 60.0)):
+        self.db = db
+        self.seed_demo = seed_demo
+        self.backoff = backoff
+        self.status = "starting"
+        self.result = None
+        self.error = None
+        self.attempts = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bootstrap", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        delay = self.backoff[0]
+        while True:
+            self.attempts += 1
+            try:
+                self.result = bootstrap(self.db, self.seed_demo)
+            except Exception as e:
+                self.error = repr(e)
+                self.status = "retrying"
+                log.warning("Bootstrap attempt %s failed (%s); retrying in %.0fs", self.attempts, e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, self.backoff[1])
+                continue
+            self.error = None
+            self.status = "ready"
+            self._done.set()
+            return
+
+    def wait(self, timeout=None):
+        # -> status after waiting up to timeout seconds for "ready"
+        self._done.wait(timeout)
+        return self.status
+
+
+def bootstrap_async(db, seed_demo=False):
+    return BackgroundBootstrap(db, seed_demo)
@@ -0,0 +1,221 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Read-through cache (TTL + LRU, stale-while-revalidate)
+# ----------------------------
+# get_or_compute(key, compute, ttl, stale) returns a value younger than `ttl`
+# straight from the backend. Between ttl and ttl + stale the old value is
+# still returned while one caller refreshes it on a background thread (a
+# lease keeps other callers, and other processes on the sqlite backend, from
+# refreshing too). Only a miss waits for compute(), and within one process
+# concurrent misses on a key share a single compute.
+#
+# Backends: "memory" (per process) or "sqlite" (a file shared by every
+# Streamlit worker on the host). Keys are "<name>:<arg>:...", so write
+# paths can drop one key or a whole name with invalidate()/invalidate_prefix().
+
+CONFIG = {"backend": "memory", "path": ".cache/momentum.sqlite", "max_entries": 2048, "enabled": True}
+
+
+class MemoryBackend:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+            return hit
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            self._leases.pop(key, None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for k in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[k]
+
+    def lease(self, key, seconds):
+        now = time.time()
+        with self._lock:
+            if self._leases.get(key, 0) > now:
+                return False
+            self._leases[key] = now + seconds
+            return True
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    # One row per key; LRU by accessed_at. WAL lets readers in other processes
+    # proceed while one writes.
+    def __init__(self, path, max_entries):
+        self.path, self.max_entries = path, max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, stored_at REAL, accessed_at REAL)")
+            c.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            c.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, until REAL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        return conn
+
+    def get(self, key):
+        c = self._conn()
+        row = c.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        c.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0]), row[1]
+
+    def set(self, key, value):
+        now = time.time()
+        c = self._conn()
+        c.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                  (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now, now))
+        c.execute("DELETE FROM leases WHERE key = ?", (key,))
+        c.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                  (self.max_entries,))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._conn().execute("DELETE FROM entries WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+
+    def lease(self, key, seconds):
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO leases VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET until = excluded.until WHERE leases.until < ?",
+            (key, now + seconds, now))
+        return cur.rowcount == 1
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_inflight = defaultdict(threading.Lock)
+_inflight_lock = threading.Lock()
+_counts = defaultdict(lambda: {"hit": 0, "stale": 0, "miss": 0})
+_counts_lock = threading.Lock()
+
+
+def configure(**settings):
+    global _backend
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+    with _backend_lock:
+        _backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if CONFIG["backend"] == "sqlite":
+                    _backend = SQLiteBackend(CONFIG["path"], CONFIG["max_entries"])
+                else:
+                    _backend = MemoryBackend(CONFIG["max_entries"])
+    return _backend
+
+
+def key(name, *args):
+    return ":".join([name, *map(str, args)])
+
+
+def _count(k, outcome):
+    with _counts_lock:
+        _counts[k.split(":", 1)[0]][outcome] += 1
+
+
+def _refresh(k, compute):
+    try:
+        backend().set(k, compute())
+    except Exception:
+        log.exception("Background refresh of %s failed; serving the stale value", k)
+
+
+def get_or_compute(k, compute, ttl, stale=0):
+    if not CONFIG["enabled"]:
+        return compute()
+    b = backend()
+    hit = b.get(k)
+    if hit is not None:
+        value, stored_at = hit
+        age = time.time() - stored_at
+        if age < ttl:
+            _count(k, "hit")
+            return value
+        if age < ttl + stale:
+            _count(k, "stale")
+            # Lease outlives a slow refresh so it isn't started twice
+            if b.lease(k, max(ttl, 30)):
+                threading.Thread(target=_refresh, args=(k, compute), daemon=True).start()
+            return value
+    with _inflight_lock:
+        lock = _inflight[k]
+    try:
+        with lock:
+            # Another thread may have filled it while we waited
+            hit = b.get(k)
+            if hit is not None and time.time() - hit[1] < ttl:
+                _count(k, "hit")
+                return hit[0]
+            _count(k, "miss")
+            value = compute()
+            b.set(k, value)
+            return value
+    finally:
+        with _inflight_lock:
+            _inflight.pop(k, None)
+
+
+def invalidate(*keys):
+    if CONFIG["enabled"]:
+        for k in keys:
+            backend().delete(k)
+
+
+def invalidate_prefix(name):
+    if CONFIG["enabled"]:
+        backend().delete_prefix(name + ":")
+
+
+def stats():
+    # Per key name (the part before the first ":") for this process
+    with _counts_lock:
+        snap = {n: dict(c) for n, c in _counts.items()}
+    for c in snap.values():
+        total = c["hit"] + c["stale"] + c["miss"]
+        c["hit_ratio"] = round((c["hit"] + c["stale"]) / total, 3) if total else None
+    return snap
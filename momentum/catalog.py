@@ -0,0 +1,121 @@
+import threading
+import time
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+# ----------------------------
+# Challenge catalog
+# ----------------------------
+# challenge_catalog: one document per task template, edited from the admin
+# Content Editor. meta {_id: "catalog"} holds a version counter that every edit
+# bumps; each process keeps the active templates in memory and only re-reads
+# them when that counter moves, so daily assignment never hits the catalog.
+
+SKILLS = ["Listening", "Reading", "Writing", "Speaking"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+XP = {"Easy": 10, "Medium": 20, "Hard": 30}
+DURATION = {"Easy": "5 min", "Medium": "8 min", "Hard": "12 min"}
+
+# Initial content; ids 1-3 are the original fixed daily set
+SEED = [
+    {"id": 1, "type": "Listening", "difficulty": "Easy"},
+    {"id": 2, "type": "Reading", "difficulty": "Medium"},
+    {"id": 3, "type": "Writing", "difficulty": "Hard"},
+    {"id": 4, "type": "Reading", "difficulty": "Easy"},
+    {"id": 5, "type": "Writing", "difficulty": "Easy"},
+    {"id": 6, "type": "Speaking", "difficulty": "Easy"},
+    {"id": 7, "type": "Listening", "difficulty": "Medium"},
+    {"id": 8, "type": "Writing", "difficulty": "Medium"},
+    {"id": 9, "type": "Speaking", "difficulty": "Medium"},
+    {"id": 10, "type": "Listening", "difficulty": "Hard"},
+    {"id": 11, "type": "Reading", "difficulty": "Hard"},
+    {"id": 12, "type": "Speaking", "difficulty": "Hard"},
+]
+
+CONFIG = {"check_interval": 30}
+
+
+def configure(**settings):
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+    invalidate()
+
+
+class Catalog:
+    # Immutable snapshot of the active templates, indexed by difficulty
+    def __init__(self, version, items):
+        self.version = version
+        self.items = items
+        self.by_difficulty = {d: [c for c in items if c["difficulty"] == d] for d in DIFFICULTIES}
+
+
+_snapshot = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def catalog_version(db):
+    doc = db["meta"].find_one({"_id": "catalog"}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+def current(db):
+    # Served from memory; the version counter is checked at most every check_interval seconds
+    global _snapshot, _checked
+    snap = _snapshot
+    if snap is not None and time.monotonic() - _checked < CONFIG["check_interval"]:
+        return snap
+    with _lock:
+        version = catalog_version(db)
+        if _snapshot is None or _snapshot.version != version:
+            items = list(db["challenge_catalog"].find({"active": True}, {"_id": 0, "active": 0, "created_at": 0, "updated_at": 0}).sort("id", 1))
+            _snapshot = Catalog(version, items)
+        _checked = time.monotonic()
+        return _snapshot
+
+
+def invalidate():
+    global _checked
+    _checked = 0.0
+
+
+def _bump(db):
+    # Called after the write so other processes never cache a half-applied edit
+    db["meta"].update_one({"_id": "catalog"}, {"$inc": {"version": 1}}, upsert=True)
+    invalidate()
+
+
+def list_items(db):
+    return list(db["challenge_catalog"].find({}, {"_id": 0}).sort("id", 1))
+
+
+def add_item(db, skill: str, difficulty: str, duration: str = None):
+    meta = db["meta"].find_one_and_update({"_id": "catalog"}, {"$inc": {"last_id": 1}},
+                                          upsert=True, return_document=ReturnDocument.AFTER)
+    now = datetime.utcnow()
+    item = {"id": meta["last_id"], "type": skill, "difficulty": difficulty,
+            "duration": duration or DURATION[difficulty], "xp": XP[difficulty],
+            "active": True, "created_at": now, "updated_at": now}
+    db["challenge_catalog"].insert_one(item)
+    _bump(db)
+    return item
+
+
+def set_active(db, item_id: int, active: bool):
+    res = db["challenge_catalog"].update_one({"id": item_id}, {"$set": {"active": active, "updated_at": datetime.utcnow()}})
+    if res.modified_count:
+        _bump(db)
+    return res.modified_count > 0
+
+
+def seed_catalog(db):
+    # Migration: fill an empty catalog with SEED and start the id counter after it
+    col = db["challenge_catalog"]
+    if col.estimated_document_count():
+        return 0
+    now = datetime.utcnow()
+    col.insert_many([{**c, "duration": DURATION[c["difficulty"]], "xp": XP[c["difficulty"]],
+                      "active": True, "created_at": now, "updated_at": now} for c in SEED])
+    db["meta"].update_one({"_id": "catalog"}, {"$max": {"last_id": max(c["id"] for c in SEED)}}, upsert=True)
+    _bump(db)
+    return len(SEED)
@@ -0,0 +1,218 @@
+import logging
+import random
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from . import cache, catalog
+from .activity import log_event
+from .leaderboard import record_xp
+from .stats import record_completion
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+DUPLICATE_KEY = 11000
+HISTORY_DAYS = 7
+# Writes that follow a completion, in order (see complete_challenge)
+CREDIT_STEPS = ("stats", "board")
+
+# Difficulty of each daily slot by the student's settings.difficulty
+MIX = {
+    "Easy": ["Easy", "Easy", "Medium"],
+    "Medium": ["Easy", "Medium", "Hard"],
+    "Hard": ["Medium", "Hard", "Hard"],
+}
+
+
+def schedule(cat, username: str, date: str, difficulty: str = "Medium", recent=()):
+    # Picks the day's templates from the in-memory catalog: one per slot in
+    # MIX, preferring skills not yet picked today and templates not seen in
+    # `recent` (catalog ids from the last few days). Seeded by (username, date)
+    # so a retry or a second tab picks the same set.
+    rng = random.Random(f"{username}:{date}")
+    recent, picked, skills = set(recent), [], set()
+    for slot in MIX.get(difficulty, MIX["Medium"]):
+        pool = [c for c in cat.by_difficulty[slot] if c not in picked] or [c for c in cat.items if c not in picked]
+        if not pool:
+            break
+        rng.shuffle(pool)
+        c = min(pool, key=lambda c: (c["type"] in skills, c["id"] in recent))
+        picked.append(c)
+        skills.add(c["type"])
+    return picked
+
+
+def daily_set(username: str, date: str, templates):
+    return [{**c, "username": username, "date": date, "slot": i, "completed": False} for i, c in enumerate(templates)]
+
+
+def history_since(date: str, days: int = HISTORY_DAYS):
+    return (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def recent_ids(col, usernames, date: str):
+    # {username: {catalog ids assigned in the last HISTORY_DAYS}} in one query
+    out = {u: set() for u in usernames}
+    for d in col.find({"username": {"$in": list(usernames)}, "date": {"$gte": history_since(date), "$lt": date}},
+                      {"username": 1, "id": 1, "_id": 0}):
+        out[d["username"]].add(d["id"])
+    return out
+
+
+def upsert_ops(docs):
+    # Keyed on the unique (username, date, slot) index: running the same ops
+    # twice, or from two tabs at once (even if the catalog changed in between
+    # and they picked different templates), can never create a second set.
+    now = datetime.utcnow()
+    return [
+        UpdateOne({"username": d["username"], "date": d["date"], "slot": d["slot"]},
+                  {"$setOnInsert": {**d, "created_at": now}}, upsert=True)
+        for d in docs
+    ]
+
+
+def bulk_upsert(col, ops):
+    try:
+        return col.bulk_write(ops, ordered=False).upserted_count
+    except BulkWriteError as e:
+        # Two concurrent upserts on the same key can both try to insert; the loser
+        # gets E11000, which just means the document already exists.
+        if any(err["code"] != DUPLICATE_KEY for err in e.details["writeErrors"]):
+            raise
+        return e.details.get("nUpserted", 0)
+
+
+def get_or_create_today_challenges(db, username: str, date: str, difficulty: str = "Medium"):
+    col = db["challenges"]
+    docs = list(col.find({"username": username, "date": date}).sort("slot", 1))
+    if docs: return docs
+
+    recent = recent_ids(col, [username], date)[username]
+    new_docs = daily_set(username, date, schedule(catalog.current(db), username, date, difficulty, recent))
+    if not new_docs: return []
+    bulk_upsert(col, upsert_ops(new_docs))
+    # Whichever set was stored first, not necessarily ours
+    return list(col.find({"username": username, "date": date}).sort("slot", 1))
+
+
+def complete_challenge(db, username: str, date: str, challenge_id: int, name: str):
+    # -> XP earned, or None if it was already completed and credited. The flip
+    # lists the follow-up writes in to_credit and each is pulled once done, so
+    # a replay (see resilience.write) finishes whatever an earlier attempt did
+    # not get to. A step cut off between its write and its pull runs again.
+    col = db["challenges"]
+    key = {"username": username, "date": date, "id": challenge_id}
+    done = col.find_one_and_update(
+        {**key, "completed": False},
+        {"$set": {"completed": True, "completed_at": datetime.utcnow(), "to_credit": list(CREDIT_STEPS)}},
+        projection={"xp": 1, "to_credit": 1}, return_document=ReturnDocument.AFTER
+    )
+    if done is None:
+        done = col.find_one({**key, "to_credit.0": {"$exists": True}}, {"xp": 1, "to_credit": 1})
+        if done is None:
+            return None
+    xp = done.get("xp", 0)
+    # Keyed on the challenge's _id, so the event is stored once however often this runs
+    log_event(db, username, date, "challenge_completed", challenge_id=challenge_id, _id=done["_id"])
+    for step in done["to_credit"]:
+        if step == "stats":
+            record_completion(db, username, xp, date)
+        else:
+            record_xp(db, username, xp, date, name)
+        col.update_one({"_id": done["_id"]}, {"$pull": {"to_credit": step}})
+    # Boards refresh on their own TTL; the student's own cards must not lag
+    cache.invalidate(cache.key("stats", username))
+    return xp
+
+
+def active_usernames(db, since: str):
+    # Students who completed something recently, plus recent signups
+    seen = set()
+    for s in db["user_stats"].find({"last_active": {"$gte": since}}, {"_id": 1}):
+        seen.add(s["_id"])
+        yield s["_id"]
+    cutoff = datetime.strptime(since, "%Y-%m-%d")
+    for u in db["users"].find({"role": "student", "created_at": {"$gte": cutoff}}, {"username": 1, "_id": 0}):
+        if u["username"] not in seen:
+            yield u["username"]
+
+
+def pregenerate(db, date: str, active_days: int = 14, chunk_size: int = CHUNK_SIZE):
+    # Nightly job: create `date`'s challenges for every active student up front.
+    # Settings and history are read per chunk of users; the catalog comes from memory.
+    since = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=active_days)).strftime("%Y-%m-%d")
+    col = db["challenges"]
+    cat = catalog.current(db)
+    users = created = 0
+    batch = []
+
+    def flush(names):
+        have = set(col.distinct("username", {"username": {"$in": names}, "date": date}))
+        names = [u for u in names if u not in have]
+        if not names: return 0
+        prefs = {u["username"]: u.get("settings", {}).get("difficulty", "Medium")
+                 for u in db["users"].find({"username": {"$in": names}}, {"username": 1, "settings.difficulty": 1, "_id": 0})}
+        history = recent_ids(col, names, date)
+        ops = []
+        for u in names:
+            ops.extend(upsert_ops(daily_set(u, date, schedule(cat, u, date, prefs.get(u, "Medium"), history[u]))))
+        return bulk_upsert(col, ops) if ops else 0
+
+    per_chunk = max(1, chunk_size // len(MIX["Medium"]))
+    for username in active_usernames(db, since):
+        users += 1
+        batch.append(username)
+        if len(batch) >= per_chunk:
+            created += flush(batch)
+            batch = []
+    if batch:
+        created += flush(batch)
+    log.info("Pre-generated %s challenges for %s users on %s", created, users, date)
+    return users, created
+
+
+def dedupe_challenges(db):
+    # The old find-then-insert path could create the same set twice; keep one
+    # document per (username, date, id), preferring a completed one, so the
+    # unique index can be built.
+    col = db["challenges"]
+    removed = 0
+    for g in col.aggregate([
+        {"$sort": {"completed": -1}},
+        {"$group": {"_id": {"u": "$username", "d": "$date", "i": "$id"}, "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True):
+        removed += col.delete_many({"_id": {"$in": g["ids"][1:]}}).deleted_count
+    if removed:
+        log.info("Removed %s duplicate challenge documents", removed)
+    return removed
+
+
+def backfill_slots(db, chunk_size: int = CHUNK_SIZE):
+    # Numbers the challenges written before the slot field. A day that got two
+    # sets (a catalog change between two first loads) keeps the completed ones,
+    # then the oldest of the rest, one per slot; the others are deleted. The
+    # (username, date, id) index is no longer unique: drop the old one so the
+    # plain one can be built.
+    col = db["challenges"]
+    slots = len(MIX["Medium"])
+    ops, drop = [], []
+    for g in col.aggregate([
+        {"$match": {"slot": {"$exists": False}}},
+        {"$sort": {"completed": -1, "created_at": 1, "_id": 1}},
+        {"$group": {"_id": {"u": "$username", "d": "$date"}, "docs": {"$push": {"_id": "$_id", "c": "$completed"}}}},
+    ], allowDiskUse=True):
+        keep = max(slots, sum(1 for d in g["docs"] if d.get("c")))
+        ops.extend(UpdateOne({"_id": d["_id"]}, {"$set": {"slot": i}}) for i, d in enumerate(g["docs"][:keep]))
+        drop.extend(d["_id"] for d in g["docs"][keep:])
+    for i in range(0, len(ops), chunk_size):
+        col.bulk_write(ops[i:i + chunk_size], ordered=False)
+    removed = sum(col.delete_many({"_id": {"$in": drop[i:i + chunk_size]}}).deleted_count
+                  for i in range(0, len(drop), chunk_size))
+    if "user_date_id_unique" in col.index_information():
+        col.drop_index("user_date_id_unique")
+    if removed:
+        log.info("Removed %s challenges from duplicate daily sets", removed)
+    return len(ops), removed
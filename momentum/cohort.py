@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .scores import SKILLS
+
+# ----------------------------
+# Cohort analytics over mock scores
+# ----------------------------
+# Scores are loaded once into a columnar DataFrame (one row per test) and kept
+# in process memory. Each refresh only fetches scores written since the last
+# one (by updated_at) and merges them on (username, date); a full reload runs
+# every full_reload_seconds to pick up deletions. Per-student aggregates
+# (groupby sums, plus target and XP from users/user_stats) are built on a full
+# load; a refresh only recomputes the students with new scores, so other
+# students' target and XP catch up on the next full load. Page interactions
+# only filter and reduce NumPy arrays.
+
+BANDS = SKILLS + ["Overall"]
+BINS = np.arange(0, 9.75, 0.5)  # one bar per half band, 0-9
+CONFIG = {"refresh_seconds": 60, "full_reload_seconds": 3600, "watermark_lag_seconds": 120}
+
+_FIELDS = {"_id": 0, "username": 1, "date": 1, "updated_at": 1, **{b: 1 for b in BANDS}}
+
+
+def _frame(docs):
+    df = pd.DataFrame(list(docs), columns=["username", "date", "updated_at"] + BANDS)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df[BANDS] = df[BANDS].astype("float32")
+    return df.dropna(subset=["username", "date"])
+
+
+class CohortEngine:
+    def __init__(self):
+        self.scores = _frame([])
+        self.students = pd.DataFrame()
+        self.watermark = None
+        self.loaded_at = self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, db, force=False):
+        now = time.time()
+        if not force and now - self.refreshed_at < CONFIG["refresh_seconds"]:
+            return self
+        with self._lock:
+            if not force and time.time() - self.refreshed_at < CONFIG["refresh_seconds"]:
+                return self
+            started = datetime.utcnow()
+            if force or self.watermark is None or now - self.loaded_at > CONFIG["full_reload_seconds"]:
+                scores = _frame(db["scores"].find({}, _FIELDS))
+                changed = None
+                self.loaded_at = now
+            else:
+                scores = self.scores
+                new = _frame(db["scores"].find({"updated_at": {"$gte": self.watermark}}, _FIELDS))
+                changed = set(new["username"].astype(str))
+                if len(new):
+                    key = lambda df: df["username"].astype(str) + "|" + df["date"].dt.strftime("%Y-%m-%d")
+                    scores = pd.concat([scores[~key(scores).isin(set(key(new)))], new], ignore_index=True)
+            # Scores written while this query ran, or stamped a little before
+            # they were committed, are fetched again next time (merged on key)
+            self.watermark = started - timedelta(seconds=CONFIG["watermark_lag_seconds"])
+            # Built aside and swapped in, so readers never see a half-updated frame
+            scores = scores.assign(username=scores["username"].astype(str).astype("category")) \
+                .sort_values(["username", "date"], ignore_index=True)
+            if changed is None:
+                self.students = self._per_student(db, scores)
+            elif changed:
+                part = self._per_student(db, scores[scores["username"].isin(changed)])
+                self.students = pd.concat([self.students.drop(index=list(changed), errors="ignore"), part]).sort_index()
+            self.scores = scores
+            self.refreshed_at = time.time()
+        return self
+
+    def _per_student(self, db, s):
+        if s.empty:
+            return pd.DataFrame(columns=["tests", "first", "last", "gain", "slope_per_30d", "target", "xp", "days_to_target"])
+        days = (s["date"] - pd.Timestamp("2000-01-01")).dt.days.to_numpy(dtype="float64")
+        y = s["Overall"].to_numpy(dtype="float64")
+        g = pd.DataFrame({"u": s["username"], "x": days, "y": y, "xy": days * y, "xx": days * days}) \
+            .groupby("u", observed=True)
+        sums, n = g[["x", "y", "xy", "xx"]].sum(), g.size()
+        # Least-squares band change per day over each student's tests
+        denom = n * sums["xx"] - sums["x"] ** 2
+        slope = (n * sums["xy"] - sums["x"] * sums["y"]) / denom.where(denom > 0)
+        out = pd.DataFrame({
+            "tests": n,
+            "first": g["y"].first(),
+            "last": g["y"].last(),
+            "slope_per_30d": slope * 30,
+        })
+        # Plain strings, so a partial update can be concatenated with the rest
+        out.index = out.index.astype(str)
+        out["gain"] = out["last"] - out["first"]
+
+        users = {u["username"]: u for u in db["users"].find({"username": {"$in": list(out.index)}}, {"_id": 0, "username": 1, "target_score": 1})}
+        xp = {d["_id"]: d.get("xp", 0) for d in db["user_stats"].find({"_id": {"$in": list(out.index)}}, {"xp": 1})}
+        out["target"] = [users.get(u, {}).get("target_score", 7.5) for u in out.index]
+        out["xp"] = [xp.get(u, 0) for u in out.index]
+
+        # Days from the last test until the trend line reaches the target
+        remaining = out["target"] - out["last"]
+        eta = remaining / (out["slope_per_30d"] / 30)
+        out["days_to_target"] = np.where(remaining <= 0, 0.0, np.where(out["slope_per_30d"] > 0, eta, np.nan))
+        return out
+
+    # --- queries (all in memory) ---
+    def window(self, since=None):
+        s = self.scores
+        return s if since is None else s[s["date"] >= pd.Timestamp(since)]
+
+    def latest(self, since=None):
+        # Each student's most recent test in the window
+        w = self.window(since)
+        return w.drop_duplicates("username", keep="last")
+
+    def percentiles(self, frame, qs=(10, 25, 50, 75, 90)):
+        values = frame[BANDS].to_numpy(dtype="float64")
+        if not len(values):
+            return pd.DataFrame(index=[f"p{q}" for q in qs], columns=BANDS)
+        return pd.DataFrame(np.nanpercentile(values, qs, axis=0), index=[f"p{q}" for q in qs], columns=BANDS)
+
+    def histogram(self, frame, band):
+        counts, edges = np.histogram(frame[band].dropna().to_numpy(), bins=BINS)
+        return pd.DataFrame({"band": edges[:-1], "students": counts})
+
+    def improvement(self, min_tests=2):
+        return self.students[self.students["tests"] >= min_tests]
+
+    def xp_gain_correlation(self, min_tests=2):
+        # Pearson r between total XP and band gain (first to last test)
+        s = self.improvement(min_tests)
+        if len(s) < 3 or s["xp"].std() == 0 or s["gain"].std() == 0:
+            return None
+        return float(np.corrcoef(s["xp"].to_numpy(dtype="float64"), s["gain"].to_numpy(dtype="float64"))[0, 1])
+
+
+_engine = CohortEngine()
+
+
+def engine(db, force=False):
+    return _engine.refresh(db, force)
@@ -0,0 +1,58 @@
+import pymongo
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+# [mongo] keys in secrets.toml -> MongoClient options
+CLIENT_OPTIONS = {
+    "max_pool_size": "maxPoolSize",
+    "min_pool_size": "minPoolSize",
+    "max_idle_time_ms": "maxIdleTimeMS",
+    "wait_queue_timeout_ms": "waitQueueTimeoutMS",
+    "server_selection_timeout_ms": "serverSelectionTimeoutMS",
+    "connect_timeout_ms": "connectTimeoutMS",
+    "socket_timeout_ms": "socketTimeoutMS",
+    "timeout_ms": "timeoutMS",  # overall per-operation budget
+    "compressors": "compressors",
+    "read_preference": "readPreference",
+    "app_name": "appname",
+}
+
+# Reads that can tolerate slightly stale data; student writes and their own
+# reads always go through the default (primary) database.
+DEFAULT_WORKLOADS = {
+    "analytics": {"read_preference": "secondaryPreferred", "read_concern": "local"},
+    "leaderboard": {"read_preference": "secondaryPreferred", "read_concern": "local"},
+}
+
+_workloads = {}
+
+
+def client_options(conf):
+    opts = {CLIENT_OPTIONS[k]: v for k, v in conf.items() if k in CLIENT_OPTIONS}
+    if isinstance(opts.get("compressors"), (list, tuple)):
+        opts["compressors"] = ",".join(opts["compressors"])
+    return opts
+
+
+def connect(conf, event_listeners=None):
+    # conf is the [mongo] section of secrets.toml
+    client = pymongo.MongoClient(conf["uri"], event_listeners=event_listeners or [], **client_options(conf))
+    db = client[conf["db_name"]]
+    _workloads.clear()
+    for name, defaults in DEFAULT_WORKLOADS.items():
+        _workloads[name] = {**defaults, **dict(conf.get("workloads", {}).get(name, {}))}
+    for name, settings in conf.get("workloads", {}).items():
+        _workloads.setdefault(name, dict(settings))
+    return db
+
+
+def for_workload(db, workload: str):
+    # Same database, routed per [mongo.workloads.<name>] (read_preference,
+    # max_staleness_seconds, read_concern). Unknown workloads use the primary.
+    settings = _workloads.get(workload)
+    if not settings:
+        return db
+    mode = read_pref_mode_from_name(settings.get("read_preference", "primary"))
+    pref = make_read_preference(mode, None, settings.get("max_staleness_seconds", -1))
+    return db.client.get_database(db.name, read_preference=pref,
+                                  read_concern=ReadConcern(settings.get("read_concern", "local")))
@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from . import cache
+from .activity import user_key
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Cascading user deletion
+# ----------------------------
+# Deleting a user removes the `users` document right away (login and the
+# admin list stop showing them) and queues a job in `deletion_jobs`:
+#   {_id: username, status: pending|running|done|cancelled, requested_by,
+#    requested_at, updated_at, lease_until, step, removed: {<collection>: n}}
+# A background worker then deletes the user's documents collection by
+# collection in batches of batch_size, renewing its lease after each batch.
+# Every batch is idempotent, so a job whose worker died (lease expired) is
+# simply picked up again by the next worker: on app start, after the next
+# delete, or by `manage.py purge-orphans`. With archive = true each batch is
+# copied to archive_<collection> before it is deleted.
+#
+# Activity markers are subtracted from daily_activity_rollup first; the
+# rollup records the username in purged_users so a resumed batch is not
+# subtracted twice.
+
+CONFIG = {"batch_size": 500, "pause_ms": 50, "lease_seconds": 120, "archive": False}
+
+# (collection, field holding the username), in deletion order
+STEPS = [
+    ("leaderboard", "username"),
+    ("user_stats", "_id"),
+    ("challenges", "username"),
+    ("scores", "username"),
+    ("daily_active_users", "username"),
+    ("activity", "username"),
+    ("activity_buckets", "username"),
+]
+DUPLICATE_KEY = 11000
+
+_thread = None
+_lock = threading.Lock()
+
+
+def configure(**settings):
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+
+
+def request(db, username: str, requested_by: str = None):
+    # Queues (or re-queues) the cleanup for a user whose `users` doc is gone
+    now = datetime.utcnow()
+    try:
+        # A job a live worker holds is left alone
+        db["deletion_jobs"].update_one(
+            {"_id": username, "$or": [{"status": {"$ne": "running"}}, {"lease_until": {"$lte": now}}]},
+            {"$set": {"status": "pending", "requested_by": requested_by, "requested_at": now, "updated_at": now,
+                      "lease_until": now, "step": STEPS[0][0]},
+             "$setOnInsert": {"removed": {}}},
+            upsert=True)
+    except DuplicateKeyError:
+        pass
+
+
+def delete_user(db, username: str, requested_by: str = None):
+    # What the admin click does: remove the account, queue the rest, return
+    removed = db["users"].delete_one({"username": username}).deleted_count
+    request(db, username, requested_by)
+    start_worker(db)
+    return removed
+
+
+def pending(db, username: str):
+    # True while a cleanup for this username has not finished (signup waits)
+    return db["deletion_jobs"].find_one({"_id": username, "status": {"$in": ["pending", "running"]}}, {"_id": 1}) is not None
+
+
+def recent_jobs(db, limit: int = 10):
+    return list(db["deletion_jobs"].find().sort("requested_at", -1).limit(limit))
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+def _claim(db):
+    now = datetime.utcnow()
+    return db["deletion_jobs"].find_one_and_update(
+        {"status": {"$in": ["pending", "running"]}, "lease_until": {"$lte": now}},
+        {"$set": {"status": "running", "lease_until": now + timedelta(seconds=CONFIG["lease_seconds"]), "updated_at": now}},
+        sort=[("requested_at", 1)], return_document=ReturnDocument.AFTER)
+
+
+def _progress(db, username, step, col=None, n=0):
+    now = datetime.utcnow()
+    update = {"$set": {"step": step, "updated_at": now, "lease_until": now + timedelta(seconds=CONFIG["lease_seconds"])}}
+    if n:
+        update["$inc"] = {f"removed.{col}": n}
+    db["deletion_jobs"].update_one({"_id": username}, update)
+
+
+def _archive(db, col, docs):
+    try:
+        db[f"archive_{col}"].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Copied already by a run that died before deleting them
+        if any(err["code"] != DUPLICATE_KEY for err in e.details["writeErrors"]):
+            raise
+
+
+def _subtract_rollups(db, username, markers):
+    ops = []
+    for m in markers:
+        inc = {"active_users": -1}
+        if "total" in m:
+            inc["total"] = -m["total"]
+            inc.update({f"events.{e}": -n for e, n in m.get("events", {}).items()})
+        ops.append(UpdateOne({"_id": m["date"], "purged_users": {"$ne": username}},
+                             {"$inc": inc, "$addToSet": {"purged_users": username},
+                              "$unset": {f"seen.{user_key(username)}": ""}}))
+    if ops:
+        db["daily_activity_rollup"].bulk_write(ops, ordered=False)
+
+
+def run_job(db, job):
+    # -> final status. Resumes at job["step"]; gives up ("cancelled") if an
+    # account with this name exists again, so a new user never loses data.
+    username = job["_id"]
+    steps = [col for col, _ in STEPS]
+    start = steps.index(job["step"]) if job.get("step") in steps else 0
+    for col, field in STEPS[start:]:
+        _progress(db, username, col)
+        while True:
+            if db["users"].find_one({"username": username}, {"_id": 1}):
+                db["deletion_jobs"].update_one({"_id": username}, {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}})
+                log.warning("Deletion of %s cancelled: the username exists again", username)
+                return "cancelled"
+            archive = CONFIG["archive"]
+            full = archive or col == "daily_active_users"
+            batch = list(db[col].find({field: username}, None if full else {"_id": 1}).limit(CONFIG["batch_size"]))
+            if not batch:
+                break
+            if archive:
+                _archive(db, col, batch)
+            if col == "daily_active_users":
+                _subtract_rollups(db, username, batch)
+            n = db[col].delete_many({"_id": {"$in": [d["_id"] for d in batch]}}).deleted_count
+            _progress(db, username, col, col, n)
+            if CONFIG["pause_ms"]:
+                time.sleep(CONFIG["pause_ms"] / 1000)
+    db["deletion_jobs"].update_one({"_id": username}, {"$set": {"status": "done", "step": None, "updated_at": datetime.utcnow()}})
+    for name in ("leaderboard", "admin_counts", "rollups"):
+        cache.invalidate_prefix(name)
+    cache.invalidate(cache.key("stats", username), cache.key("scores", username))
+    log.info("Deleted data of %s", username)
+    return "done"
+
+
+def run_pending(db, limit: int = None):
+    # Runs claimable jobs on the calling thread; -> {username: status}
+    done = {}
+    while limit is None or len(done) < limit:
+        job = _claim(db)
+        if job is None:
+            break
+        try:
+            done[job["_id"]] = run_job(db, job)
+        except Exception:
+            # Lease runs out and the job is retried from its last step
+            log.exception("Deletion of %s failed", job["_id"])
+            done[job["_id"]] = "failed"
+    return done
+
+
+def _work(db):
+    global _thread
+    while True:
+        with _lock:
+            job = _claim(db)
+            if job is None:
+                _thread = None
+                return
+        try:
+            run_job(db, job)
+        except Exception:
+            log.exception("Deletion of %s failed; retried when its lease expires", job["_id"])
+
+
+def start_worker(db):
+    # One background worker per process; a no-op while it is running
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_work, args=(db,), name="user-deletion", daemon=True)
+            _thread.start()
+
+
+# ----------------------------
+# Orphans
+# ----------------------------
+def find_orphans(db):
+    # {username: {collection: documents}} for usernames with data but no account
+    counts = {}
+    for col, field in STEPS:
+        for r in db[col].aggregate([{"$group": {"_id": f"${field}", "n": {"$sum": 1}}}], allowDiskUse=True):
+            if r["_id"] is not None:
+                counts.setdefault(r["_id"], {})[col] = r["n"]
+    names = list(counts)
+    existing = set()
+    for i in range(0, len(names), CONFIG["batch_size"]):
+        existing.update(u["username"] for u in db["users"].find({"username": {"$in": names[i:i + CONFIG["batch_size"]]}},
+                                                                 {"username": 1, "_id": 0}))
+    return {u: c for u, c in counts.items() if u not in existing}
+
+
+def purge_orphans(db, dry_run: bool = False):
+    # Queues a deletion job per orphaned username and runs them here. Jobs
+    # restart from the first step (anything written after a step finished,
+    # e.g. a late activity flush, is caught); ones a live worker holds are skipped.
+    orphans = find_orphans(db)
+    if dry_run or not orphans:
+        return orphans, {}
+    for username in orphans:
+        request(db, username, requested_by="purge-orphans")
+    return orphans, run_pending(db)
@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+# ----------------------------
+# Streaming data export (CSV / Parquet)
+# ----------------------------
+# Documents are read with a cursor in batches of batch_size and each batch is
+# written straight out (CSV rows, or one Parquet row group), so memory stays
+# at one batch whatever the collection size. Date range and usernames are part
+# of the Mongo filter, served by the (username, date) / date indexes.
+#
+# The admin page writes to CONFIG["dir"]/<export id>/<file> and server.py
+# serves that file from disk at /api/exports/<export id> to admin sessions.
+# Old exports are removed after keep_hours.
+
+CONFIG = {"dir": ".exports", "batch_size": 5000, "keep_hours": 24}
+
+# Columns and Parquet types per dataset. Activity events keep any other
+# fields they carry as JSON in `extra`.
+DATASETS = {
+    "activity": [("date", "string"), ("ts", "timestamp"), ("username", "string"), ("event", "string"),
+                 ("challenge_id", "int64"), ("extra", "string")],
+    "scores": [("username", "string"), ("date", "string"), ("Listening", "float64"), ("Reading", "float64"),
+               ("Writing", "float64"), ("Speaking", "float64"), ("Overall", "float64"),
+               ("updated_at", "timestamp"), ("source", "string")],
+    "challenges": [("username", "string"), ("date", "string"), ("id", "int64"), ("type", "string"),
+                   ("difficulty", "string"), ("duration", "string"), ("xp", "int64"), ("completed", "bool"),
+                   ("completed_at", "timestamp")],
+}
+FORMATS = ["csv", "parquet"]
+_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def configure(**settings):
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+
+
+def _match(start=None, end=None, usernames=None):
+    match = {}
+    if start or end:
+        match["date"] = {op: v for op, v in (("$gte", start), ("$lte", end)) if v}
+    if usernames:
+        match["username"] = {"$in": list(usernames)}
+    return match
+
+
+def count(db, dataset: str, start=None, end=None, usernames=None):
+    # Rows the export will write (for progress)
+    match = _match(start, end, usernames)
+    if dataset != "activity":
+        return db[dataset].count_documents(match)
+    n = db["activity"].count_documents(match)
+    res = list(db["activity_buckets"].aggregate([{"$match": match}, {"$group": {"_id": None, "n": {"$sum": "$n"}}}]))
+    return n + (res[0]["n"] if res else 0)
+
+
+def _cursors(db, dataset, match, batch_size):
+    if dataset == "activity":
+        yield db["activity"].find(match, {"_id": 0}, batch_size=batch_size)
+        # One row per event inside each day bucket
+        yield ({**d["events"], "date": d["date"], "username": d["username"]} for d in db["activity_buckets"].aggregate(
+            [{"$match": match}, {"$unwind": "$events"}, {"$project": {"_id": 0, "date": 1, "username": 1, "events": 1}}],
+            batchSize=batch_size, allowDiskUse=True))
+    else:
+        yield db[dataset].find(match, {"_id": 0, **{c: 1 for c, _ in DATASETS[dataset]}}, batch_size=batch_size)
+
+
+def _row(columns, doc, dataset):
+    row = {c: doc.get(c) for c in columns}
+    if dataset == "activity":
+        extra = {k: v for k, v in doc.items() if k not in row and k != "_id"}
+        row["extra"] = json.dumps(extra, default=str) if extra else None
+    return row
+
+
+def iter_batches(db, dataset: str, start=None, end=None, usernames=None, batch_size: int = None):
+    # Lists of at most batch_size row dicts, in cursor order
+    batch_size = batch_size or CONFIG["batch_size"]
+    columns = [c for c, _ in DATASETS[dataset]]
+    for cursor in _cursors(db, dataset, _match(start, end, usernames), batch_size):
+        batch = []
+        for doc in cursor:
+            batch.append(_row(columns, doc, dataset))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _csv_value(v):
+    if v is None:
+        return ""
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def _write_csv(dataset, batches, f, progress):
+    columns = [c for c, _ in DATASETS[dataset]]
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="", write_through=True)
+    w = csv.writer(text)
+    w.writerow(columns)
+    rows = 0
+    for batch in batches:
+        w.writerows([_csv_value(r[c]) for c in columns] for r in batch)
+        rows += len(batch)
+        progress(rows)
+    text.detach()
+    return rows
+
+
+def _write_parquet(dataset, batches, f, progress):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {"string": pa.string(), "int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(),
+             "timestamp": pa.timestamp("ms")}
+    schema = pa.schema([(c, types[t]) for c, t in DATASETS[dataset]])
+    rows = 0
+    with pq.ParquetWriter(f, schema, compression="snappy") as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            rows += len(batch)
+            progress(rows)
+    return rows
+
+
+def export(db, dataset: str, f, fmt: str = "csv", start=None, end=None, usernames=None,
+           batch_size: int = None, progress=None):
+    # Streams the dataset into the binary file object f; -> rows written.
+    # progress(rows_so_far) is called after every batch.
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r} (expected one of {', '.join(DATASETS)})")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r} (expected csv or parquet)")
+    batches = iter_batches(db, dataset, start, end, usernames, batch_size)
+    write = _write_csv if fmt == "csv" else _write_parquet
+    return write(dataset, batches, f, progress or (lambda rows: None))
+
+
+def file_name(dataset: str, fmt: str, start=None, end=None):
+    return f"{dataset}_{start or 'all'}_{end or 'all'}.{fmt}"
+
+
+# ----------------------------
+# Export files (admin page + /api/exports/<id>)
+# ----------------------------
+def export_to_file(db, dataset: str, fmt: str = "csv", start=None, end=None, usernames=None, progress=None):
+    # -> (export id, path, rows)
+    purge_old()
+    export_id = uuid.uuid4().hex
+    folder = os.path.join(CONFIG["dir"], export_id)
+    os.makedirs(folder)
+    path = os.path.join(folder, file_name(dataset, fmt, start, end))
+    try:
+        with open(path, "wb") as f:
+            rows = export(db, dataset, f, fmt, start, end, usernames, progress=progress)
+    except BaseException:
+        shutil.rmtree(folder, ignore_errors=True)
+        raise
+    return export_id, path, rows
+
+
+def path_for(export_id: str):
+    # The exported file for an id, or None (unknown, expired or malformed id)
+    if not _ID.match(export_id or ""):
+        return None
+    folder = os.path.join(CONFIG["dir"], export_id)
+    files = os.listdir(folder) if os.path.isdir(folder) else []
+    return os.path.join(folder, files[0]) if files else None
+
+
+def purge_old(hours: float = None):
+    hours = CONFIG["keep_hours"] if hours is None else hours
+    if not os.path.isdir(CONFIG["dir"]):
+        return 0
+    cutoff = time.time() - hours * 3600
+    removed = 0
+    for name in os.listdir(CONFIG["dir"]):
+        folder = os.path.join(CONFIG["dir"], name)
+        if _ID.match(name) and os.path.getmtime(folder) < cutoff:
+            shutil.rmtree(folder, ignore_errors=True)
+            removed += 1
+    return removed
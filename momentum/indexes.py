@@ -0,0 +1,112 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Declared indexes (one per query shape used by the app)
+# ----------------------------
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("role", ASCENDING), ("created_at", ASCENDING)], name="role_created"),
+        # admin User Manager: case-insensitive prefix search + keyset paging
+        IndexModel([("username_lc", ASCENDING), ("username", ASCENDING)], name="username_lc"),
+    ],
+    "challenges": [
+        IndexModel([("username", ASCENDING), ("date", ASCENDING), ("slot", ASCENDING)], name="user_date_slot_unique", unique=True),
+        IndexModel([("username", ASCENDING), ("date", ASCENDING), ("id", ASCENDING)], name="user_date_id"),
+        IndexModel([("username", ASCENDING), ("completed", ASCENDING)], name="user_completed"),
+    ],
+    "challenge_catalog": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "activity": [
+        # date first: distinct users for a day + the per-day $group
+        IndexModel([("date", ASCENDING), ("username", ASCENDING)], name="date_user"),
+        IndexModel([("username", ASCENDING), ("date", ASCENDING)], name="user_date"),
+        IndexModel([("ts", DESCENDING)], name="ts_desc"),
+    ],
+    "activity_buckets": [
+        IndexModel([("date", ASCENDING)], name="date"),
+        IndexModel([("username", ASCENDING), ("date", ASCENDING)], name="user_date"),
+        IndexModel([("last_ts", DESCENDING)], name="last_ts_desc"),
+    ],
+    "daily_active_users": [
+        IndexModel([("date", ASCENDING)], name="date"),
+        IndexModel([("username", ASCENDING), ("date", ASCENDING)], name="user_date"),
+    ],
+    "user_stats": [
+        IndexModel([("last_active", ASCENDING)], name="last_active"),
+    ],
+    "leaderboard": [
+        IndexModel([("board", ASCENDING), ("username", ASCENDING)], name="board_user_unique", unique=True),
+        IndexModel([("board", ASCENDING), ("xp", DESCENDING), ("username", ASCENDING)], name="board_xp"),
+        # renames and user deletion touch every board of one user
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+    "scores": [
+        # one mock score per student per test date (bulk imports upsert on it)
+        IndexModel([("username", ASCENDING), ("date", ASCENDING)], name="user_date_unique", unique=True),
+        # cohort analytics: incremental refresh
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "deletion_jobs": [
+        # worker claims the oldest unleased pending/running job
+        IndexModel([("status", ASCENDING), ("requested_at", ASCENDING)], name="status_requested"),
+    ],
+}
+
+
+def _key(spec):
+    return tuple((field, int(direction)) for field, direction in spec)
+
+
+def ensure_indexes(db):
+    # create_index is a no-op when the index already exists, so this is safe to rerun.
+    # Each index is created on its own so one failure (e.g. duplicates blocking a
+    # unique index) does not stop the rest.
+    failed = []
+    for col_name, models in INDEXES.items():
+        for model in models:
+            doc = model.document
+            try:
+                db[col_name].create_indexes([model])
+            except OperationFailure as e:
+                log.error("Index %s.%s not created: %s", col_name, doc["name"], e)
+                failed.append((col_name, doc["name"], str(e)))
+    return failed
+
+
+def _index_usage(col):
+    try:
+        return {s["name"]: s["accesses"]["ops"] for s in col.aggregate([{"$indexStats": {}}])}
+    except (OperationFailure, NotImplementedError):
+        # $indexStats needs clusterMonitor on Atlas and is missing in some test doubles
+        return None
+
+
+def index_report(db):
+    report = {}
+    for col_name, models in INDEXES.items():
+        col = db[col_name]
+        existing = col.index_information()
+        existing_keys = {_key(info["key"]): name for name, info in existing.items()}
+        declared_keys = {_key(m.document["key"].items()): m.document["name"] for m in models}
+
+        missing = [name for key, name in declared_keys.items() if key not in existing_keys]
+        extra = [name for key, name in existing_keys.items() if key not in declared_keys and name != "_id_"]
+
+        usage = _index_usage(col)
+        unused = None
+        if usage is not None:
+            unused = sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_")
+
+        report[col_name] = {"missing": missing, "undeclared": extra, "unused": unused}
+        if missing:
+            log.warning("%s: missing indexes %s", col_name, missing)
+        if unused:
+            log.info("%s: indexes with no recorded use since server start %s", col_name, unused)
+    return report
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+from . import cache, metrics
+
+# ----------------------------
+# Per-rerun instrumentation
+# ----------------------------
+# Each script run is tagged with page / role / session (thread-local: every
+# Streamlit session runs on its own script thread). Mongo commands are timed
+# by a pymongo CommandListener and attributed to the current run.
+#   .metrics/perf.log      one JSON line per rerun and per slow command
+#   .metrics/metrics.json  p50/p95/p99 per page, section and Mongo command,
+#                          plus cache hit/miss counts per key name
+
+CONFIG = {"dir": ".metrics", "slow_ms": 100, "flush_seconds": 10, "enabled": True}
+
+log = logging.getLogger("momentum.perf")
+_local = threading.local()
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def configure(**settings):
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+    log.propagate = False
+    for h in list(log.handlers):
+        log.removeHandler(h)
+    if CONFIG["enabled"]:
+        os.makedirs(CONFIG["dir"], exist_ok=True)
+        handler = logging.FileHandler(os.path.join(CONFIG["dir"], "perf.log"))
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+
+
+def _emit(record):
+    if log.handlers:
+        log.info(json.dumps(record, default=str, ensure_ascii=False))
+
+
+# ----------------------------
+# Rerun context
+# ----------------------------
+class Rerun:
+    def __init__(self, session, page="login", role=None):
+        self.session, self.page, self.role = session, page, role
+        self.t0 = time.perf_counter()
+        self.mongo_calls = 0
+        self.mongo_ms = 0.0
+        self.pool_wait_ms = 0.0
+        self.sections = {}
+
+
+def current():
+    return getattr(_local, "rerun", None)
+
+
+def begin_rerun(session):
+    # A run cut short by st.rerun()/st.stop()/an exception never reaches
+    # end_rerun(); close it here so it still counts.
+    if current() is not None:
+        end_rerun(outcome="interrupted")
+    _local.rerun = Rerun(session)
+    return _local.rerun
+
+
+def tag(**fields):
+    r = current()
+    if r is not None:
+        for k, v in fields.items():
+            setattr(r, k, v)
+
+
+def end_rerun(outcome="ok"):
+    r = current()
+    if r is None:
+        return
+    _local.rerun = None
+    total = time.perf_counter() - r.t0
+    metrics.observe(f"page.{r.page}", total)
+    _emit({"type": "rerun", "ts": time.time(), "page": r.page, "role": r.role, "session": r.session,
+           "outcome": outcome, "ms": round(total * 1000, 2), "mongo_calls": r.mongo_calls,
+           "mongo_ms": round(r.mongo_ms, 2), "pool_wait_ms": round(r.pool_wait_ms, 2),
+           "sections": {k: round(v * 1000, 2) for k, v in r.sections.items()}})
+    maybe_flush()
+
+
+@contextmanager
+def section(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        metrics.observe(f"section.{name}", dt)
+        r = current()
+        if r is not None:
+            r.sections[name] = r.sections.get(name, 0.0) + dt
+
+
+def maybe_flush(force=False):
+    global _last_flush
+    if not CONFIG["enabled"]:
+        return
+    now = time.time()
+    with _flush_lock:
+        if not force and now - _last_flush < CONFIG["flush_seconds"]:
+            return
+        _last_flush = now
+    path = os.path.join(CONFIG["dir"], "metrics.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"generated_at": now, "pid": os.getpid(), "metrics": metrics.summary(), "cache": cache.stats()}, f, indent=1)
+    os.replace(tmp, path)
+
+
+# ----------------------------
+# Mongo command listener
+# ----------------------------
+_FILTER_KEYS = {
+    "find": lambda c: c.get("filter"),
+    "aggregate": lambda c: c.get("pipeline"),
+    "count": lambda c: c.get("query"),
+    "distinct": lambda c: c.get("query"),
+    "findAndModify": lambda c: c.get("query"),
+    "update": lambda c: [u.get("q") for u in c.get("updates", [])[:1]],
+    "delete": lambda c: [d.get("q") for d in c.get("deletes", [])[:1]],
+}
+
+
+def shape(value):
+    # Query with literals replaced by "?" so slow-log lines group by shape
+    if isinstance(value, dict):
+        return {k: shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [shape(v) for v in value[:3]]
+    return "?"
+
+
+class MongoListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        cmd = event.command
+        get_filter = _FILTER_KEYS.get(event.command_name)
+        info = (event.command_name, cmd.get(event.command_name), shape(get_filter(cmd)) if get_filter else None)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = info
+
+    def _finish(self, event, failed):
+        with self._lock:
+            info = self._pending.pop((event.connection_id, event.request_id), None)
+        if info is None:
+            return
+        name, collection, filter_shape = info
+        ms = event.duration_micros / 1000
+        metrics.observe(f"mongo.{name}", ms / 1000)
+        r = current()
+        if r is not None:
+            r.mongo_calls += 1
+            r.mongo_ms += ms
+        if ms >= CONFIG["slow_ms"] or failed:
+            _emit({"type": "slow_command" if not failed else "failed_command", "ts": time.time(),
+                   "command": name, "collection": collection, "filter": filter_shape, "ms": round(ms, 2),
+                   "page": getattr(r, "page", None), "session": getattr(r, "session", None)})
+
+    def succeeded(self, event): self._finish(event, False)
+
+    def failed(self, event): self._finish(event, True)
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    # Time spent waiting to check a connection out of the pool; grows when
+    # maxPoolSize is too small for the number of concurrent sessions.
+    def __init__(self):
+        self._started = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._started.t0 = time.perf_counter()
+
+    def _done(self):
+        t0 = getattr(self._started, "t0", None)
+        if t0 is None:
+            return
+        self._started.t0 = None
+        wait = time.perf_counter() - t0
+        metrics.observe("mongo.pool_wait", wait)
+        r = current()
+        if r is not None:
+            r.pool_wait_ms += wait * 1000
+
+    def connection_checked_out(self, event): self._done()
+
+    def connection_check_out_failed(self, event):
+        self._done()
+        metrics.observe("mongo.pool_checkout_failed", 0.0)
+
+    def connection_checked_in(self, event): pass
+
+    def pool_created(self, event): pass
+
+    def pool_ready(self, event): pass
+
+    def pool_cleared(self, event): pass
+
+    def pool_closed(self, event): pass
+
+    def connection_created(self, event): pass
+
+    def connection_ready(self, event): pass
+
+    def connection_closed(self, event): pass
@@ -0,0 +1,156 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from pymongo import DESCENDING, UpdateOne
+
+from .indexes import INDEXES
+
+# ----------------------------
+# Leaderboard collection
+# ----------------------------
+# One document per (board, username) in `leaderboard`:
+#   {board: "all" | "week:2026-W07", username, name, xp}
+# Kept up to date with $inc on every completion, so reading a board never
+# touches `challenges`.
+
+ALL_TIME = "all"
+BATCH_SIZE = 500
+WEEKS_KEPT = 12
+
+
+def week_board(date: str):
+    year, week, _ = datetime.strptime(date, "%Y-%m-%d").isocalendar()
+    return f"week:{year}-W{week:02d}"
+
+
+def record_xp(db, username: str, xp: int, date: str, name: str = None):
+    now = datetime.utcnow()
+    update = {"$inc": {"xp": xp}, "$set": {"updated_at": now}}
+    if name:
+        update["$set"]["name"] = name
+    db["leaderboard"].bulk_write([
+        UpdateOne({"board": ALL_TIME, "username": username}, update, upsert=True),
+        UpdateOne({"board": week_board(date), "username": username}, update, upsert=True),
+    ], ordered=False)
+
+
+def board_xp(db, board: str, username: str):
+    doc = db["leaderboard"].find_one({"board": board, "username": username}, {"xp": 1})
+    return doc["xp"] if doc else 0
+
+
+def rename_user(db, username: str, name: str):
+    db["leaderboard"].update_many({"username": username}, {"$set": {"name": name}})
+
+
+def _totals(db, match):
+    totals = {}
+    for r in db["challenges"].aggregate([
+        {"$match": {"completed": True, **match}},
+        {"$group": {"_id": {"u": "$username", "d": "$date"}, "xp": {"$sum": "$xp"}}},
+    ], allowDiskUse=True):
+        u, d = r["_id"]["u"], r["_id"]["d"]
+        for board in (ALL_TIME, week_board(d)):
+            totals[(board, u)] = totals.get((board, u), 0) + r["xp"]
+    return totals
+
+
+def _write(col, totals, update):
+    ops = []
+    for (board, u), xp in totals.items():
+        ops.append(UpdateOne({"board": board, "username": u}, update(xp, u), upsert=True))
+        if len(ops) >= BATCH_SIZE:
+            col.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        col.bulk_write(ops, ordered=False)
+
+
+def rebuild_leaderboard(db):
+    # Backfill/repair from challenges. The boards are built in leaderboard_rebuild
+    # and renamed over `leaderboard`, so readers never see a half-empty board.
+    # Completions made while it ran (completed_at >= start) went to the old
+    # collection; they are re-applied to the new one after the swap (one whose
+    # $inc lands in the instant of the swap itself can still be counted twice).
+    names = {u["username"]: u.get("name", u["username"])
+             for u in db["users"].find({}, {"username": 1, "name": 1, "_id": 0})}
+    start = datetime.utcnow()
+    totals = _totals(db, {"$or": [{"completed_at": {"$lt": start}}, {"completed_at": {"$exists": False}}]})
+
+    tmp = db["leaderboard_rebuild"]
+    tmp.drop()
+    tmp.create_indexes(INDEXES["leaderboard"])
+    now = datetime.utcnow()
+    _write(tmp, totals, lambda xp, u: {"$set": {"xp": xp, "name": names.get(u, u), "updated_at": now}})
+    swapped = datetime.utcnow()
+    tmp.rename("leaderboard", dropTarget=True)
+
+    late = _totals(db, {"completed_at": {"$gte": start, "$lt": swapped}})
+    _write(db["leaderboard"], late,
+           lambda xp, u: {"$inc": {"xp": xp}, "$set": {"name": names.get(u, u), "updated_at": now}})
+    prune_weeks(db)
+    return len(set(totals) | set(late))
+
+
+def prune_weeks(db, keep: int = WEEKS_KEPT):
+    # Weekly boards older than `keep` weeks are never shown again
+    cutoff = week_board((datetime.utcnow() - timedelta(weeks=keep)).strftime("%Y-%m-%d"))
+    return db["leaderboard"].delete_many({"board": {"$gte": "week:", "$lt": cutoff}}).deleted_count
+
+
+# ----------------------------
+# In-memory ranked snapshot
+# ----------------------------
+class RankedBoard:
+    # Sorted by (-xp, username); ranks and neighbours are found by bisection.
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda r: (-r["xp"], r["username"]))
+        self._keys = [(-r["xp"], r["username"]) for r in self.rows]
+        self._own = {r["username"]: k for r, k in zip(self.rows, self._keys)}
+        self.loaded_at = datetime.utcnow()
+
+    def __len__(self): return len(self.rows)
+
+    def page(self, page: int, size: int = 10):
+        start = page * size
+        return [(start + i + 1, r) for i, r in enumerate(self.rows[start:start + size])]
+
+    def _position(self, username: str, xp: int):
+        # Index the user would take with their *current* xp, so the answer stays
+        # right when the snapshot is a little behind their latest completion.
+        key = (-xp, username)
+        pos = bisect_left(self._keys, key)
+        stale = self._own.get(username)
+        if stale is not None and stale < key:
+            pos -= 1
+        return pos
+
+    def rank_for(self, username: str, xp: int):
+        return self._position(username, xp) + 1
+
+    def around(self, username: str, xp: int, k: int = 2):
+        # Up to k players directly above and below, as (rank, row) pairs
+        pos = self._position(username, xp)
+        key = (-xp, username)
+        above, below = [], []
+        i = bisect_left(self._keys, key) - 1
+        while i >= 0 and len(above) < k:
+            if self.rows[i]["username"] != username:
+                above.append(self.rows[i])
+            i -= 1
+        i = bisect_left(self._keys, key)
+        while i < len(self.rows) and len(below) < k:
+            if self.rows[i]["username"] != username:
+                below.append(self.rows[i])
+            i += 1
+        above.reverse()
+        return ([(pos - len(above) + n + 1, r) for n, r in enumerate(above)],
+                [(pos + n + 2, r) for n, r in enumerate(below)])
+
+
+def load_board(db, board: str = ALL_TIME):
+    rows = list(db["leaderboard"].find(
+        {"board": board, "xp": {"$gt": 0}}, {"_id": 0, "username": 1, "name": 1, "xp": 1}
+    ).sort([("xp", DESCENDING), ("username", 1)]))
+    return RankedBoard(rows)
@@ -0,0 +1,33 @@
+import threading
+from collections import defaultdict, deque
+
+# ----------------------------
+# In-process latency samples
+# ----------------------------
+# Rolling window of the most recent samples per name (seconds).
+
+WINDOW = 1000
+
+_samples = defaultdict(lambda: deque(maxlen=WINDOW))
+_lock = threading.Lock()
+
+
+def observe(name: str, seconds: float):
+    with _lock:
+        _samples[name].append(seconds)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summary():
+    with _lock:
+        snap = {k: list(v) for k, v in _samples.items()}
+    return {
+        name: {"count": len(v), "p50": percentile(v, 50), "p95": percentile(v, 95), "p99": percentile(v, 99)}
+        for name, v in sorted(snap.items())
+    }
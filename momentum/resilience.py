@@ -0,0 +1,299 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pymongo
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError, WTimeoutError
+
+from . import cache, metrics
+from .writebehind import claim_spill_files
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Bounded, tolerant Mongo access
+# ----------------------------
+# Every guarded call runs under a time budget (pymongo.timeout, so all the
+# operations inside share it) and through a circuit breaker: after `failures`
+# outage errors (timeouts, no reachable server) within reset_seconds the
+# breaker opens and calls fail fast for reset_seconds; then one call at a time
+# is let through to probe, and the first success closes it. (Successes while
+# closed prove little: most reads are cache hits.) Student-facing calls use
+# `breaker`; the admin analytics reads use `analytics` with their own, longer
+# budget, so slow dashboard queries cannot push students into degraded mode.
+#
+# read(key, fn) keeps the last value fn() returned in a last-known-good store
+# of its own (lkg_max_entries, so cache churn cannot evict it; a file next to
+# the cache's with the sqlite backend) and serves it, or the regular cache
+# entry whatever its age, while Mongo is out; stale_since(name) tells the
+# page to say so.
+# write(db, kind, **args) runs a registered handler; when Mongo is out the
+# write is appended to CONFIG["spill_dir"]/writes-<pid>.jsonl and a background
+# thread replays it once the breaker lets calls through. Handlers must be safe
+# to run twice (a timed-out write may still have been applied).
+
+CONFIG = {"read_budget_ms": 1500, "write_budget_ms": 3000, "analytics_budget_ms": 8000, "failures": 3,
+          "reset_seconds": 15, "remember_seconds": 30, "lkg_max_entries": 2048, "spill_dir": ".spill",
+          "replay_seconds": 5}
+
+QUEUED = "queued"
+_MISSING = object()
+
+
+class Unavailable(PyMongoError):
+    # Mongo timed out, is unreachable, or the breaker is open
+    pass
+
+
+def configure(**settings):
+    global _lkg
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+    with _lkg_lock:
+        _lkg = None
+
+
+def _outage(e):
+    # A duplicate key or validation error is an answer, not an outage
+    return isinstance(e, (Unavailable, ConnectionFailure, ExecutionTimeout, WTimeoutError)) or e.timeout
+
+
+class Breaker:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._failures = deque()
+        self._opened_at = None
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self._opened_at < CONFIG["reset_seconds"] else "half_open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < CONFIG["reset_seconds"]:
+                return False
+            # Half open: one probe per reset window
+            self._opened_at = time.monotonic()
+            return True
+
+    def success(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            log.info("Mongo reachable again; %s circuit closed", self.name)
+            self._failures.clear()
+            self._opened_at = None
+
+    def failure(self):
+        now = time.monotonic()
+        with self._lock:
+            self._failures.append(now)
+            while self._failures[0] < now - CONFIG["reset_seconds"]:
+                self._failures.popleft()
+            if len(self._failures) >= CONFIG["failures"]:
+                if self._opened_at is None:
+                    log.warning("Mongo failing (%s errors in %ss); %s circuit open",
+                                len(self._failures), CONFIG["reset_seconds"], self.name)
+                self._opened_at = now
+
+
+breaker = Breaker("mongo")
+analytics = Breaker("analytics")
+
+
+def call(fn, budget_ms=None, circuit=None):
+    # fn() under a breaker (default `breaker`) and a time budget; outages raise Unavailable
+    circuit = circuit or breaker
+    if not circuit.allow():
+        raise Unavailable(f"{circuit.name} circuit open")
+    try:
+        with pymongo.timeout((budget_ms or CONFIG["read_budget_ms"]) / 1000):
+            value = fn()
+    except PyMongoError as e:
+        if not _outage(e):
+            circuit.success()
+            raise
+        circuit.failure()
+        if isinstance(e, Unavailable):
+            raise
+        raise Unavailable(str(e)) from e
+    circuit.success()
+    return value
+
+
+# ----------------------------
+# Reads with a last-known-good fallback
+# ----------------------------
+_local = threading.local()
+_remembered = {}
+_lkg = None
+_lkg_lock = threading.Lock()
+
+
+def lkg_store():
+    global _lkg
+    if _lkg is None:
+        with _lkg_lock:
+            if _lkg is None:
+                if cache.CONFIG["backend"] == "sqlite":
+                    root, ext = os.path.splitext(cache.CONFIG["path"])
+                    _lkg = cache.SQLiteBackend(f"{root}-lkg{ext}", CONFIG["lkg_max_entries"])
+                else:
+                    _lkg = cache.MemoryBackend(CONFIG["lkg_max_entries"])
+    return _lkg
+
+
+def _marks():
+    if not hasattr(_local, "marks"):
+        _local.marks = {}
+    return _local.marks
+
+
+def _remember(key, value):
+    # At most once per remember_seconds per key (forget() forces the next one)
+    now = time.monotonic()
+    if now - _remembered.get(key, -CONFIG["remember_seconds"]) < CONFIG["remember_seconds"]:
+        return
+    if len(_remembered) > CONFIG["lkg_max_entries"]:
+        _remembered.clear()
+    _remembered[key] = now
+    lkg_store().set(key, value)
+
+
+def forget(key):
+    # The value behind key just changed; save the next read right away
+    _remembered.pop(key, None)
+
+
+def read(key, fn, default=_MISSING, budget_ms=None, circuit=None):
+    # fn() within the read budget. During an outage: the cache entry for key
+    # (any age) or the last value read() returned, else default, else Unavailable.
+    name = key.split(":", 1)[0]
+    try:
+        value = call(fn, budget_ms, circuit)
+    except Unavailable:
+        metrics.observe(f"degraded.{name}", 0.0)
+        hit = cache.backend().get(key) or lkg_store().get(key)
+        if hit is None:
+            if default is _MISSING:
+                raise
+            _marks()[name] = 0
+            return default
+        _marks()[name] = hit[1]
+        return hit[0]
+    _marks().pop(name, None)
+    _remember(key, value)
+    return value
+
+
+def stale_since(name):
+    # For the last read() of key name on this thread: None if it was live,
+    # else when the value shown was saved (0: nothing saved, default shown)
+    return _marks().get(name)
+
+
+# ----------------------------
+# Writes queued for replay
+# ----------------------------
+_handlers = {}
+_spill_lock = threading.Lock()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def register(kind, handler):
+    # handler(db, **args) -> result; args must be JSON-serialisable
+    _handlers[kind] = handler
+
+
+def _spill(op):
+    os.makedirs(CONFIG["spill_dir"], exist_ok=True)
+    with _spill_lock, open(os.path.join(CONFIG["spill_dir"], f"writes-{os.getpid()}.jsonl"), "a") as f:
+        f.write(json.dumps(op) + "\n")
+
+
+def write(db, kind, **args):
+    # -> the handler's result, or QUEUED when Mongo is out
+    try:
+        return call(lambda: _handlers[kind](db, **args), CONFIG["write_budget_ms"])
+    except Unavailable as e:
+        log.warning("%s deferred (%s); queued for replay", kind, e)
+        _spill({"kind": kind, "args": args, "queued_at": datetime.utcnow().isoformat()})
+        metrics.observe(f"queued.{kind}", 0.0)
+        return QUEUED
+
+
+def _spill_files():
+    # Including files claimed by a replay in progress (or one that died)
+    return glob.glob(os.path.join(CONFIG["spill_dir"], "writes-*.jsonl*"))
+
+
+def pending():
+    # Queued writes on this host (every worker's spill file)
+    n = 0
+    for path in _spill_files():
+        try:
+            with open(path) as f:
+                n += sum(1 for line in f if line.strip())
+        except OSError:
+            pass
+    return n
+
+
+def replay(db):
+    # -> writes applied. After the first outage the rest are queued again.
+    # A claimed file is only removed once each of its writes is applied or
+    # re-queued; files left claimed by a process that died are taken over.
+    applied, down = 0, False
+    for claimed in claim_spill_files(CONFIG["spill_dir"], "writes-*.jsonl"):
+        with open(claimed) as f:
+            ops = [json.loads(line) for line in f if line.strip()]
+        for op in ops:
+            if down:
+                _spill(op)
+                continue
+            try:
+                call(lambda: _handlers[op["kind"]](db, **op["args"]), CONFIG["write_budget_ms"])
+            except Unavailable:
+                down = True
+                _spill(op)
+            except Exception:
+                log.exception("Dropping queued %s write %s", op["kind"], op["args"])
+            else:
+                applied += 1
+        os.remove(claimed)
+        log.info("Replayed %s queued writes from %s", len(ops), claimed)
+    return applied
+
+
+def _replay_loop(db):
+    while True:
+        time.sleep(CONFIG["replay_seconds"])
+        if breaker.state == "open" or not _spill_files():
+            continue
+        try:
+            replay(db)
+        except Exception:
+            log.exception("Write replay crashed")
+
+
+def start_replayer(db):
+    # One per process; also picks up writes a previous process queued
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_replay_loop, args=(db,), name="write-replay", daemon=True)
+            _thread.start()
+
+
+def status():
+    return {"breaker": breaker.state, "analytics_breaker": analytics.state, "queued_writes": pending()}
@@ -0,0 +1,177 @@
+import time
+from datetime import datetime
+
+import streamlit as st
+
+from . import activity, auth, cache, catalog, deletion, export, instrument, resilience, sessions
+from .activity import day_rollup, get_rollups, start_writer, total_events, window_start
+from .challenges import complete_challenge
+from .bootstrap import bootstrap_async, setup_logging
+from .db import connect, for_workload
+from .leaderboard import ALL_TIME, RankedBoard, load_board, week_board
+from .stats import get_user_stats
+from .startup import PROCESS_STARTED_AT, lazy_import, mark, write_report
+
+# ----------------------------
+# Process-level resources
+# ----------------------------
+# Shared by app.py and the HTTP routes in server.py: st.cache_resource keys on
+# the function, so both hit the same cached objects in one process.
+
+ROLLUP_WINDOWS = (30, 90, 365)
+
+_bootstrap = None
+_last_warm_up = None
+
+
+@st.cache_resource
+def get_db():
+    return connect(st.secrets["mongo"], event_listeners=[instrument.MongoListener(), instrument.PoolListener()])
+
+
+@st.cache_resource
+def init_app(_db):
+    # Once per process, never retried: settings (incl. the session secret) are
+    # applied here. Indexes, migrations and (optionally) demo accounts run in
+    # the background, retried until they succeed -- see app_ready().
+    global _bootstrap
+    app_conf = st.secrets.get("app", {})
+    setup_logging(app_conf.get("log_level", "INFO"))
+    instrument.configure(**st.secrets.get("metrics", {}))
+    auth.configure(**st.secrets.get("auth", {}))
+    sessions.configure(**st.secrets.get("auth", {}))
+    catalog.configure(**st.secrets.get("catalog", {}))
+    activity.configure(**st.secrets.get("activity", {}))
+    cache.configure(**st.secrets.get("cache", {}))
+    start_writer(_db, **st.secrets.get("activity_writer", {}))
+    deletion.configure(**st.secrets.get("deletion", {}))
+    export.configure(**st.secrets.get("export", {}))
+    resilience.configure(**st.secrets.get("resilience", {}))
+    resilience.register("complete_challenge", complete_challenge)
+    # Finishes user deletions a previous process was killed in the middle of
+    deletion.start_worker(_db)
+    # ...and replays writes queued while Mongo was unreachable
+    resilience.start_replayer(_db)
+    _bootstrap = bootstrap_async(_db, seed_demo=app_conf.get("seed_demo_users", False))
+    return _bootstrap
+
+
+def app_ready(timeout: float = 0):
+    # -> "ready", "starting" or "retrying" after waiting up to timeout seconds.
+    # Never raises: pages that need the schema say so and degrade until ready.
+    status = init_app(get_db()).wait(timeout)
+    if status == "ready" and mark("bootstrap_done"):
+        write_report(instrument.CONFIG["dir"], {"bootstrap": _bootstrap.result["timings"]})
+    return status
+
+
+def _bootstrapped():
+    status = app_ready(timeout=60)
+    if status != "ready":
+        raise RuntimeError(f"bootstrap {status}: {_bootstrap.error}")
+
+
+# ----------------------------
+# Cached reads (momentum/cache.py)
+# ----------------------------
+# Shared by every session in the process (and every worker on the host with
+# the sqlite backend). Write paths drop the per-user keys they affect; shared
+# views just refresh on their TTL, served stale meanwhile. Each read is bounded
+# by momentum/resilience.py and falls back to the last value seen (or an empty
+# one) while Mongo is out; pages show resilience.stale_since(<key name>).
+def _cached(k, compute, ttl, stale=0, default=None, analytics=False):
+    # Admin analytics reads get their own budget and breaker (see resilience.py)
+    budget, circuit = (resilience.CONFIG["analytics_budget_ms"], resilience.analytics) if analytics else (None, None)
+    return resilience.read(k, lambda: cache.get_or_compute(k, compute, ttl, stale), default, budget, circuit)
+
+
+def get_leaderboard(board):
+    return _cached(cache.key("leaderboard", board),
+                   lambda: load_board(for_workload(get_db(), "leaderboard"), board), ttl=60, stale=600,
+                   default=RankedBoard([]))
+
+
+def get_rollup_window(start: str, end: str):
+    return _cached(cache.key("rollups", start, end),
+                   lambda: get_rollups(for_workload(get_db(), "analytics"), start, end), ttl=60, stale=600, default=[],
+                   analytics=True)
+
+
+def get_admin_counts(date: str):
+    def compute():
+        adb = for_workload(get_db(), "analytics")
+        return {
+            "students": adb["users"].count_documents({"role": "student"}),
+            "admins": adb["users"].count_documents({"role": "admin"}),
+            "active_today": day_rollup(adb, date).get("active_users", 0),
+            "actions": total_events(adb),
+        }
+    return _cached(cache.key("admin_counts", date), compute, ttl=30, stale=300,
+                   default={"students": 0, "admins": 0, "active_today": 0, "actions": 0}, analytics=True)
+
+
+def user_stats(username: str):
+    # Dropped by complete_challenge, so the TTL only bounds memory use
+    return _cached(cache.key("stats", username), lambda: get_user_stats(get_db(), username), ttl=600, default={})
+
+
+def score_history(username: str):
+    return _cached(cache.key("scores", username),
+                   lambda: list(get_db()["scores"].find({"username": username}, {"_id": 0})), ttl=3600, default=[])
+
+
+# ----------------------------
+# Warm-up / health
+# ----------------------------
+def _today(): return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def _warm_rollups():
+    for days in ROLLUP_WINDOWS:
+        get_rollup_window(window_start(_today(), days), _today())
+
+
+WARM_UP_STEPS = [
+    ("mongo_pool", lambda: get_db().command("ping")),
+    ("bootstrap", _bootstrapped),
+    ("leaderboard", lambda: (get_leaderboard(ALL_TIME), get_leaderboard(week_board(_today())))),
+    ("admin_rollups", _warm_rollups),
+    ("catalog", lambda: catalog.current(get_db())),
+    ("cohort_scores", lambda: lazy_import("momentum.cohort").engine(for_workload(get_db(), "analytics"))),
+]
+
+
+def warm_up():
+    # Primes every process-level cache a first visitor would otherwise fill.
+    # Each step is cached itself, so repeating this is cheap.
+    global _last_warm_up
+    timings, errors = {}, {}
+    t0 = time.perf_counter()
+    for name, step in WARM_UP_STEPS:
+        t = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            errors[name] = repr(e)
+        timings[name] = round((time.perf_counter() - t) * 1000, 1)
+    report = {"ready": not errors, "total_ms": round((time.perf_counter() - t0) * 1000, 1),
+              "steps_ms": timings, "errors": errors, "at": time.time()}
+    _last_warm_up = report
+    if mark("warm"): write_report(instrument.CONFIG["dir"], {"warm_up": report})
+    return report
+
+
+def health():
+    # Cheap: no database calls, only what this process already knows
+    bootstrap = _bootstrap.status if _bootstrap else "not_started"
+    return {
+        "status": "ok",
+        "ready": bootstrap == "ready",
+        "bootstrap": bootstrap,
+        "bootstrap_attempts": _bootstrap.attempts if _bootstrap else 0,
+        "bootstrap_error": _bootstrap.error if _bootstrap else None,
+        "uptime_s": round(time.time() - PROCESS_STARTED_AT, 1),
+        "last_warm_up": _last_warm_up,
+        "cache": cache.stats(),
+        "mongo": resilience.status(),
+    }
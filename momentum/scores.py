@@ -0,0 +1,168 @@
+import logging
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Mock test scores
+# ----------------------------
+# scores: one document per (username, date)
+#   {username, date: "YYYY-MM-DD", Listening, Reading, Writing, Speaking, Overall, updated_at}
+# Bulk imports parse the file in chunks, validate and band a whole chunk at
+# once with NumPy and upsert it with one bulk_write. numpy/pandas are imported
+# inside the functions so the login path does not pay for them.
+
+SKILLS = ["Listening", "Reading", "Writing", "Speaking"]
+CHUNK_SIZE = 1000
+DUPLICATE_KEY = 11000
+
+
+def overall_bands(skills):
+    # IELTS rounding of the four-skill mean: .25 rounds up to .5, .75 up to
+    # the next whole band. `skills` is an (n, 4) array; returns n bands.
+    import numpy as np
+    avg = np.asarray(skills, dtype=float).mean(axis=1)
+    whole = np.floor(avg)
+    frac = avg - whole
+    return whole + np.where(frac < 0.25, 0.0, np.where(frac < 0.75, 0.5, 1.0))
+
+
+def overall_band(l, r, w, s):
+    return float(overall_bands([[l, r, w, s]])[0])
+
+
+def save_score(db, username: str, date: str, skills):
+    # One score per test date; saving again for the same date replaces it
+    doc = dict(zip(SKILLS, map(float, skills)), Overall=overall_band(*skills), updated_at=datetime.utcnow())
+    db["scores"].update_one({"username": username, "date": date}, {"$set": doc}, upsert=True)
+    return doc["Overall"]
+
+
+# ----------------------------
+# Bulk import
+# ----------------------------
+def read_chunks(source, filename: str, chunk_size: int = CHUNK_SIZE):
+    # DataFrames of at most chunk_size rows from a CSV or Excel file (path or file object)
+    import pandas as pd
+    if filename.lower().endswith((".xlsx", ".xls")):
+        # Excel has no streaming reader in pandas; slice after loading
+        df = pd.read_excel(source, dtype=str)
+        for i in range(0, len(df), chunk_size):
+            yield df.iloc[i:i + chunk_size]
+    else:
+        yield from pd.read_csv(source, dtype=str, chunksize=chunk_size, skipinitialspace=True)
+
+
+def _normalize_columns(df):
+    names = {c: c.strip().lower() for c in df.columns}
+    df = df.rename(columns=names)
+    missing = [c for c in ["username", "date"] + [s.lower() for s in SKILLS] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return df
+
+
+def validate_chunk(db, df, first_row: int):
+    # -> (accepted score docs, rejected [{row, username, reason}]); both carry
+    # `row`, the 1-based file line counting the header
+    import numpy as np
+    import pandas as pd
+    df = _normalize_columns(df)
+    rows = np.arange(first_row, first_row + len(df))
+    usernames = df["username"].fillna("").str.strip().to_numpy()
+    dates = pd.to_datetime(df["date"].str.strip(), errors="coerce", format="ISO8601")
+    skills = df[[s.lower() for s in SKILLS]].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    known = {u["username"] for u in db["users"].find({"username": {"$in": list(set(usernames))}}, {"username": 1, "_id": 0})}
+    reasons = np.full(len(df), "", dtype=object)
+    checks = [
+        (usernames == "", "missing username"),
+        (~np.isin(usernames, list(known)) & (usernames != ""), "unknown username"),
+        (dates.isna().to_numpy(), "invalid date (expected YYYY-MM-DD)"),
+        (np.isnan(skills).any(axis=1), "missing or non-numeric band"),
+        (((skills < 0) | (skills > 9)).any(axis=1), "band outside 0-9"),
+        ((skills * 2 % 1 != 0).any(axis=1), "band not a multiple of 0.5"),
+    ]
+    for mask, reason in checks:
+        reasons[mask & (reasons == "")] = reason
+
+    ok = reasons == ""
+    bands = overall_bands(skills[ok])
+    day = dates[ok].dt.strftime("%Y-%m-%d").to_numpy()
+    accepted = [
+        {"row": int(r), "username": u, "date": d, **dict(zip(SKILLS, map(float, sk))), "Overall": float(b)}
+        for r, u, d, sk, b in zip(rows[ok], usernames[ok], day, skills[ok], bands)
+    ]
+    rejected = [{"row": int(r), "username": u, "reason": why} for r, u, why in zip(rows[~ok], usernames[~ok], reasons[~ok])]
+    return accepted, rejected
+
+
+def import_scores(db, chunks, ordered: bool = False, source: str = None):
+    # Upserts every valid row keyed on (username, date). With ordered=True a
+    # chunk stops at its first write error (later chunks still run).
+    # Returns {"rows", "upserted", "updated", "rejected", "usernames"}.
+    report = {"rows": 0, "upserted": 0, "updated": 0, "rejected": [], "usernames": set()}
+    first_row = 2
+    for df in chunks:
+        report["rows"] += len(df)
+        accepted, rejected = validate_chunk(db, df, first_row)
+        first_row += len(df)
+        report["rejected"].extend(rejected)
+        if not accepted:
+            continue
+        # Stamped per chunk: cohort refreshes fetch by updated_at, and a long
+        # import must not write times older than a refresh that already ran
+        now = datetime.utcnow()
+        ops = [UpdateOne({"username": d["username"], "date": d["date"]},
+                         {"$set": {**{k: v for k, v in d.items() if k != "row"}, "imported_at": now, "updated_at": now, "source": source}},
+                         upsert=True) for d in accepted]
+        try:
+            res = db["scores"].bulk_write(ops, ordered=ordered)
+            report["upserted"] += res.upserted_count
+            report["updated"] += res.matched_count
+        except BulkWriteError as e:
+            report["upserted"] += e.details.get("nUpserted", 0)
+            report["updated"] += e.details.get("nMatched", 0)
+            failed = {err["index"] for err in e.details["writeErrors"]}
+            if ordered:
+                # Everything after the first error was not attempted
+                failed |= set(range(min(failed), len(ops)))
+            report["rejected"].extend({"row": accepted[i]["row"], "username": accepted[i]["username"], "reason": "write failed"}
+                                      for i in sorted(failed))
+        report["usernames"].update(d["username"] for d in accepted)
+    log.info("Score import %s: %s rows, %s new, %s updated, %s rejected", source, report["rows"],
+             report["upserted"], report["updated"], len(report["rejected"]))
+    return report
+
+
+def dedupe_scores(db):
+    # Migration: keep the latest score per (username, date) (by updated_at,
+    # then insertion order) and drop the old non-unique index so the unique one
+    # can replace it. The other copies are moved to archive_scores first, so an
+    # admin can restore one that should have won.
+    col = db["scores"]
+    removed = 0
+    for g in col.aggregate([
+        {"$sort": {"updated_at": -1, "_id": -1}},
+        {"$group": {"_id": {"u": "$username", "d": "$date"}, "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True):
+        dupes = list(col.find({"_id": {"$in": g["ids"][1:]}}))
+        now = datetime.utcnow()
+        try:
+            db["archive_scores"].insert_many([{**d, "archived_at": now, "kept": g["ids"][0]} for d in dupes], ordered=False)
+        except BulkWriteError as e:
+            # Archived already by a run that died before deleting them
+            if any(err["code"] != DUPLICATE_KEY for err in e.details["writeErrors"]):
+                raise
+        removed += col.delete_many({"_id": {"$in": [d["_id"] for d in dupes]}}).deleted_count
+    try:
+        col.drop_index("user_date")
+    except OperationFailure:
+        pass
+    if removed:
+        log.info("Moved %s duplicate mock scores to archive_scores", removed)
+    return removed
@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Signed session tokens
+# ----------------------------
+# token = b64(payload) + "." + b64(HMAC-SHA256(secret, payload))
+# payload = {"u": username, "r": role, "sv": session_version, "pv": profile_version, "exp": epoch}
+#
+# A valid signature is enough to trust the claims; the only lookup left is the
+# per-user version check below, served from a small in-process cache.
+
+CONFIG = {"session_secret": None, "session_days": 7, "version_ttl": 60}
+_secret = None
+
+
+def configure(**settings):
+    global _secret
+    CONFIG.update({k: v for k, v in settings.items() if k in CONFIG})
+    if CONFIG["session_secret"]:
+        _secret = CONFIG["session_secret"].encode("utf-8")
+    else:
+        # Tokens will not survive a restart or work across replicas
+        log.warning("[auth] session_secret not set; using a per-process random key")
+        _secret = secrets.token_bytes(32)
+    invalidate()
+
+
+def _b64(b): return base64.urlsafe_b64encode(b).rstrip(b"=").decode("ascii")
+
+
+def _unb64(s): return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def _sign(payload: bytes):
+    if _secret is None:
+        configure()
+    return hmac.new(_secret, payload, hashlib.sha256).digest()
+
+
+def issue(user):
+    payload = json.dumps({
+        "u": user["username"], "r": user.get("role", "student"),
+        "sv": user.get("session_version", 0), "pv": user.get("profile_version", 0),
+        "exp": int(time.time() + CONFIG["session_days"] * 86400),
+    }, separators=(",", ":")).encode("utf-8")
+    return f"{_b64(payload)}.{_b64(_sign(payload))}"
+
+
+def verify(token):
+    # Claims dict for a well-formed, correctly signed, unexpired token; else None
+    try:
+        body, sig = token.split(".")
+        payload = _unb64(body)
+        if not hmac.compare_digest(_unb64(sig), _sign(payload)):
+            return None
+        claims = json.loads(payload)
+    except (AttributeError, ValueError):
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+# ----------------------------
+# Version cache (revocation + profile freshness)
+# ----------------------------
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def user_versions(db, username: str):
+    # {"sv", "pv", "role"} for username, or None if the user no longer exists
+    now = time.monotonic()
+    with _versions_lock:
+        hit = _versions.get(username)
+        if hit and now - hit[0] < CONFIG["version_ttl"]:
+            return hit[1]
+    doc = db["users"].find_one({"username": username},
+                               {"_id": 0, "role": 1, "session_version": 1, "profile_version": 1})
+    v = None if doc is None else {
+        "sv": doc.get("session_version", 0), "pv": doc.get("profile_version", 0), "role": doc.get("role", "student"),
+    }
+    with _versions_lock:
+        _versions[username] = (now, v)
+    return v
+
+
+def invalidate(username: str = None):
+    with _versions_lock:
+        if username is None:
+            _versions.clear()
+        else:
+            _versions.pop(username, None)
+
+
+def is_current(db, claims):
+    if not claims:
+        return False
+    v = user_versions(db, claims["u"])
+    return v is not None and claims.get("sv", 0) >= v["sv"]
+
+
+def revoke(db, username: str):
+    # Ends every session for the user (role change, deletion, password reset)
+    db["users"].update_one({"username": username}, {"$inc": {"session_version": 1}})
+    invalidate(username)
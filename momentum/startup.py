@@ -0,0 +1,95 @@
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ----------------------------
+# Cold-start accounting
+# ----------------------------
+# Heavy libraries (pandas, plotly) are imported on first use through
+# lazy_import(), which records how long each took. mark() records the first
+# time a milestone is reached, measured from process start, e.g.
+# "first_login_form" = cold start until the login form was rendered.
+
+_IMPORTED_AT = time.time()
+_imports = {}
+_marks = {}
+_lock = threading.Lock()
+
+
+def process_started_at():
+    # Linux: real process start from /proc, so Streamlit's own boot is included
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return btime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _IMPORTED_AT
+
+
+PROCESS_STARTED_AT = process_started_at()
+
+
+def lazy_import(name: str):
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    t0 = time.perf_counter()
+    mod = importlib.import_module(name)
+    dt = time.perf_counter() - t0
+    with _lock:
+        _imports.setdefault(name, dt)
+    log.info("Imported %s in %.0f ms", name, dt * 1000)
+    return mod
+
+
+def mark(milestone: str):
+    # True the first time a milestone is reached in this process
+    with _lock:
+        if milestone in _marks:
+            return False
+        _marks[milestone] = time.time() - PROCESS_STARTED_AT
+    log.info("Startup milestone %s at %.2fs", milestone, _marks[milestone])
+    return True
+
+
+def report():
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "process_started_at": PROCESS_STARTED_AT,
+            "milestones_s": dict(_marks),
+            "lazy_imports_ms": {k: round(v * 1000, 1) for k, v in _imports.items()},
+        }
+
+
+def write_report(directory: str, extra=None):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "startup.json")
+    with open(path, "w") as f:
+        json.dump({**report(), **(extra or {})}, f, indent=1, default=str)
+    return path
+
+
+def import_times(modules, top=15):
+    # Per-module cumulative import time in a fresh interpreter (python -X importtime)
+    import subprocess
+    code = "; ".join(f"import {m}" for m in modules)
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        parts = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((parts[2].strip(), int(parts[1]) / 1000))
+    wanted = {m: ms for m, ms in rows if m in modules}
+    slowest = sorted(rows, key=lambda r: -r[1])[:top]
+    return wanted, slowest
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne, ReturnDocument
+
+# ----------------------------
+# Materialized per-user stats
+# ----------------------------
+# One document per user in `user_stats`, keyed by username:
+#   {_id, xp, completed, level, last_active, current_streak, longest_streak, updated_at}
+
+BATCH_SIZE = 500
+
+
+def get_level(xp): return int(1 + (xp / 100))
+
+
+def _day(s): return datetime.strptime(s, "%Y-%m-%d").date()
+
+
+def _prev_day(s): return (_day(s) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def record_completion(db, username: str, xp: int, date: str):
+    col = db["user_stats"]
+    doc = col.find_one_and_update(
+        {"_id": username},
+        {"$inc": {"xp": xp, "completed": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True, return_document=ReturnDocument.AFTER,
+    )
+
+    # Level follows XP on every completion, whatever the streak guard below does
+    level = get_level(doc["xp"])
+    if doc.get("level", 0) < level:
+        col.update_one({"_id": username}, {"$max": {"level": level}})
+
+    # Streak moves at most once per day. The update is guarded on the last_active
+    # value we read, so concurrent completions cannot double count a day.
+    last = doc.get("last_active")
+    if last is not None and last >= date:
+        return
+    if last == _prev_day(date):
+        streak = doc.get("current_streak", 0) + 1
+        update = {"$inc": {"current_streak": 1}, "$set": {"last_active": date}}
+    else:
+        streak = 1
+        update = {"$set": {"last_active": date, "current_streak": 1}}
+    update["$max"] = {"longest_streak": streak}
+    col.update_one({"_id": username, "last_active": last}, update)
+
+
+def streaks_from_dates(dates):
+    # dates: iterable of "YYYY-MM-DD"; returns (current_streak, longest_streak, last_active)
+    days = sorted({_day(d) for d in dates})
+    if not days:
+        return 0, 0, None
+    current = longest = 1
+    for prev, day in zip(days, days[1:]):
+        current = current + 1 if day - prev == timedelta(days=1) else 1
+        longest = max(longest, current)
+    return current, longest, days[-1].strftime("%Y-%m-%d")
+
+
+def display_streak(stats, today: str):
+    # A streak is only alive if the user was active today or yesterday
+    last = stats.get("last_active")
+    if last in (today, _prev_day(today)):
+        return stats.get("current_streak", 0)
+    return 0
+
+
+def empty_stats(username):
+    return {"_id": username, "xp": 0, "completed": 0, "level": get_level(0),
+            "last_active": None, "current_streak": 0, "longest_streak": 0}
+
+
+def get_user_stats(db, username: str):
+    stats = db["user_stats"].find_one({"_id": username})
+    if stats is None:
+        # Users created before the backfill ran; rebuild just this one
+        rebuild_user_stats(db, username)
+        stats = db["user_stats"].find_one({"_id": username}) or empty_stats(username)
+    return stats
+
+
+def rebuild_user_stats(db, username: str = None):
+    # Recomputes user_stats from challenges + the per-day active markers (which,
+    # unlike raw activity, survive retention). Safe to rerun.
+    match = {"completed": True}
+    act_match = {}
+    if username:
+        match["username"] = username
+        act_match["username"] = username
+
+    xp = {r["_id"]: r for r in db["challenges"].aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$username", "xp": {"$sum": "$xp"}, "completed": {"$sum": 1}}},
+    ])}
+    dates = {r["_id"]: r["dates"] for r in db["daily_active_users"].aggregate([
+        {"$match": act_match},
+        {"$group": {"_id": "$username", "dates": {"$addToSet": "$date"}}},
+    ])}
+
+    users = set(xp) | set(dates)
+    if username:
+        users.add(username)
+
+    now = datetime.utcnow()
+    ops = []
+    for u in users:
+        total = xp.get(u, {}).get("xp", 0)
+        current, longest, last = streaks_from_dates(dates.get(u, []))
+        ops.append(ReplaceOne({"_id": u}, {
+            "xp": total, "completed": xp.get(u, {}).get("completed", 0), "level": get_level(total),
+            "last_active": last, "current_streak": current, "longest_streak": longest,
+            "updated_at": now,
+        }, upsert=True))
+        if len(ops) >= BATCH_SIZE:
+            db["user_stats"].bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        db["user_stats"].bulk_write(ops, ordered=False)
+    return len(users)
@@ -0,0 +1,77 @@
+import re
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .auth import AuthBusy, hash_password
+from .deletion import pending as deletion_pending
+
+# Columns shown in the admin User Manager
+LIST_FIELDS = {"_id": 0, "username": 1, "name": 1, "role": 1, "target_score": 1, "created_at": 1}
+BATCH_SIZE = 1000
+
+
+def create_user(db, username, password, name, role="student"):
+    users_col = db["users"]
+    if users_col.find_one({"username": username}, {"_id": 1}):
+        return False, "Username already exists"
+    if deletion_pending(db, username):
+        # The old account's data is still being removed
+        return False, "Username is not available yet, please try again in a few minutes"
+
+    try:
+        password_hash = hash_password(password)
+    except AuthBusy:
+        return False, "Server busy, please try again in a moment."
+
+    try:
+        users_col.insert_one({
+            "username": username,
+            "username_lc": username.lower(),
+            "password_hash": password_hash,
+            "name": name,
+            "role": role,
+            "target_score": 7.5,
+            "created_at": datetime.utcnow(),
+            "settings": {"learning_time": "Evening", "difficulty": "Medium"}
+        })
+    except DuplicateKeyError:
+        # Lost a race with another signup; the unique index has the final say
+        return False, "Username already exists"
+    return True, "User created successfully"
+
+
+def list_users(db, search: str = "", after=None, limit: int = 25):
+    # Keyset page ordered by (username_lc, username). `after` is the last row's
+    # (username_lc, username) from the previous page; returns (rows, next_after).
+    # The search is an anchored prefix on username_lc, so it walks the index.
+    query = {}
+    if search:
+        query["username_lc"] = {"$regex": "^" + re.escape(search.strip().lower())}
+    if after:
+        lc, u = after
+        keyset = {"$or": [{"username_lc": {"$gt": lc}}, {"username_lc": lc, "username": {"$gt": u}}]}
+        query = {"$and": [query, keyset]} if query else keyset
+
+    rows = list(db["users"].find(query, LIST_FIELDS)
+                .sort([("username_lc", ASCENDING), ("username", ASCENDING)])
+                .limit(limit + 1))
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1]["username"].lower(), rows[-1]["username"])
+    return rows, next_after
+
+
+def backfill_username_lc(db):
+    col = db["users"]
+    ops, n = [], 0
+    for u in col.find({"username_lc": {"$exists": False}}, {"username": 1}):
+        ops.append(UpdateOne({"_id": u["_id"]}, {"$set": {"username_lc": u["username"].lower()}}))
+        if len(ops) >= BATCH_SIZE:
+            n += col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        n += col.bulk_write(ops, ordered=False).modified_count
+    return n
@@ -0,0 +1,163 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+
+def _encode(doc):
+    out = dict(doc)
+    out["_id"] = str(doc["_id"])
+    out["ts"] = doc["ts"].isoformat()
+    return json.dumps(out)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def claim_spill_files(spill_dir, pattern):
+    # Renames each file matching pattern to <name>.replay-<pid> so no other
+    # process on this host replays it too, and takes over files still claimed
+    # by a process that died mid-replay. -> claimed paths; the caller removes
+    # each one once its contents are written (or spilled again).
+    me = os.getpid()
+    claimed = []
+    paths = glob.glob(os.path.join(spill_dir, pattern)) + glob.glob(os.path.join(spill_dir, pattern + ".replay-*"))
+    for path in paths:
+        name, _, owner = path.partition(".replay-")
+        if owner and (int(owner) == me or _alive(int(owner))):
+            continue
+        target = f"{name}.replay-{me}"
+        try:
+            os.rename(path, target)
+        except OSError:
+            continue
+        claimed.append(target)
+    return claimed
+
+
+def _decode(line):
+    doc = json.loads(line)
+    doc["_id"] = ObjectId(doc["_id"])
+    doc["ts"] = datetime.fromisoformat(doc["ts"])
+    return doc
+
+
+class EventWriter:
+    # Write-behind buffer for activity events. Callers only enqueue; a daemon
+    # thread flushes with one batch write when `batch_size` events are waiting
+    # or `flush_interval` seconds have passed. If Mongo is unreachable the
+    # batch is appended to a local spill file and replayed on a later flush.
+    # When the buffer is full, submit() writes synchronously (backpressure).
+
+    def __init__(self, write_batch, batch_size=500, flush_interval=2.0, max_buffer=10000,
+                 spill_dir=".spill"):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._lock = threading.Lock()  # one flush at a time
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, doc):
+        try:
+            self._queue.put_nowait(doc)
+        except queue.Full:
+            metrics.observe("writebehind.overflow", 0.0)
+            self._write([doc])
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._stop.is_set():
+            self._stop.wait(0.2)
+            due = time.monotonic() - last >= self.flush_interval
+            if due or self._queue.qsize() >= self.batch_size:
+                try:
+                    self.flush()
+                except Exception:
+                    log.exception("Activity writer flush crashed")
+                last = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._replay_spill()
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                self._write(batch)
+
+    def _write(self, batch):
+        t0 = time.perf_counter()
+        try:
+            self.write_batch(batch)
+        except PyMongoError as e:
+            log.warning("Activity flush failed (%s); spilling %s events to disk", e, len(batch))
+            self._spill(batch)
+            return
+        metrics.observe("writebehind.flush", time.perf_counter() - t0)
+
+    # ----------------------------
+    # Spill to disk
+    # ----------------------------
+    def _spill_path(self):
+        return os.path.join(self.spill_dir, f"activity-{os.getpid()}.jsonl")
+
+    def _spill(self, batch):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with open(self._spill_path(), "a") as f:
+            for doc in batch:
+                f.write(_encode(doc) + "\n")
+
+    def _replay_spill(self):
+        for claimed in claim_spill_files(self.spill_dir, "activity-*.jsonl"):
+            with open(claimed) as f:
+                docs = [_decode(line) for line in f if line.strip()]
+            # Batches that fail again go to this process's spill file; the
+            # claimed file is only dropped once every batch is stored or re-spilled
+            for i in range(0, len(docs), self.batch_size):
+                self._write(docs[i:i + self.batch_size])
+            os.remove(claimed)
+            log.info("Replayed %s spilled activity events from %s", len(docs), claimed)
+
+    def close(self):
+        # Flush whatever is buffered; called at interpreter exit
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
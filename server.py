@@ -0,0 +1,47 @@
+# Entry point that serves app.py plus plain HTTP routes:
+#   GET /api/health       - readiness without touching the database
+#   GET /api/warmup       - primes the Mongo pool, indexes, leaderboard, admin rollups and challenge catalog
+#   GET /api/exports/<id> - a file written by the admin Data Export page (admin session cookie required)
+# Run with `streamlit run server.py` (or `uvicorn server:app`).
+import os
+
+import streamlit as st
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, JSONResponse
+from starlette.routing import Route
+
+from momentum import export, resources, sessions
+
+
+async def health(request):
+    return JSONResponse(resources.health())
+
+
+async def warmup(request):
+    # Warm-up blocks on Mongo, keep it off the event loop
+    report = await run_in_threadpool(resources.warm_up)
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+def _is_admin(token):
+    # Same check as the app: signed, unexpired, not revoked, admin role
+    resources.init_app(resources.get_db())  # session secret is set here
+    claims = sessions.verify(token) if token else None
+    return bool(claims) and claims.get("r") == "admin" and sessions.is_current(resources.get_db(), claims)
+
+
+async def download_export(request):
+    if not await run_in_threadpool(_is_admin, request.cookies.get("session_token")):
+        return JSONResponse({"error": "admin session required"}, status_code=403)
+    path = export.path_for(request.path_params["export_id"])
+    if path is None:
+        return JSONResponse({"error": "export not found or expired"}, status_code=404)
+    # Sent from disk in chunks
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+app = st.App("app.py", routes=[
+    Route("/api/health", health),
+    Route("/api/warmup", warmup),
+    Route("/api/exports/{export_id}", download_export),
+])
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from momentum import activity
+from momentum.deletion import _subtract_rollups
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class Crash(Exception):
+    pass
+
+
+def crash(*args, **kwargs):
+    raise Crash()
+
+
+def _events(*spec):
+    return [{"_id": ObjectId(), "username": u, "date": d, "event": e, "ts": datetime(2026, 3, 10)}
+            for u, d, e in spec]
+
+
+def _day(db, date):
+    doc = activity.day_rollup(db, date)
+    return doc["total"], doc["active_users"], doc["events"]
+
+
+@pytest.fixture(params=["events", "buckets"])
+def db(request, monkeypatch):
+    monkeypatch.setitem(activity.CONFIG, "storage", request.param)
+    return mongomock.MongoClient().db
+
+
+BATCH = [("ana", "2026-03-10", "login"), ("ana", "2026-03-10", "challenge_done"),
+         ("ben", "2026-03-10", "login"), ("ana", "2026-03-11", "login")]
+
+
+def test_write_events_rolls_up_each_event_once(db):
+    docs = _events(*BATCH)
+    assert activity.write_events(db, docs) == 4
+    assert activity.write_events(db, docs) == 0
+    assert _day(db, "2026-03-10") == (3, 2, {"login": 2, "challenge_done": 1})
+    assert _day(db, "2026-03-11") == (1, 1, {"login": 1})
+    assert db["daily_active_users"].find_one({"_id": "2026-03-10:ana"})["total"] == 2
+
+
+@pytest.mark.parametrize("crash_in", ["before", "after"])
+def test_retry_after_crash_before_rollups_finish(db, monkeypatch, crash_in):
+    docs, real = _events(*BATCH), activity._sync_rollups
+    if crash_in == "before":
+        # Events and markers stored, daily rollups never touched
+        monkeypatch.setattr(activity, "_sync_rollups", crash)
+    else:
+        # Daily rollups applied, then the process dies before the batch is done
+        def sync_then_crash(*a, **k):
+            real(*a, **k)
+            crash()
+        monkeypatch.setattr(activity, "_sync_rollups", sync_then_crash)
+    with pytest.raises(Crash):
+        activity.write_events(db, docs)
+    monkeypatch.setattr(activity, "_sync_rollups", real)
+
+    activity.write_events(db, docs)
+    activity.write_events(db, docs + _events(("ben", "2026-03-10", "challenge_done")))
+    assert _day(db, "2026-03-10") == (4, 2, {"login": 2, "challenge_done": 2})
+    assert _day(db, "2026-03-11") == (1, 1, {"login": 1})
+
+
+def test_rollup_catches_up_on_markers_it_has_not_seen(db):
+    # Another writer bumped the marker but died before the rollup
+    first, second = _events(("ana", "2026-03-10", "login"), ("ana", "2026-03-10", "challenge_done"))
+    activity.write_events(db, [first])
+    activity._apply_once(db["daily_active_users"], activity._marker_ops, [second])
+    activity.write_events(db, _events(("ana", "2026-03-10", "login")))
+    assert _day(db, "2026-03-10") == (3, 1, {"login": 2, "challenge_done": 1})
+
+
+def test_rebuild_then_new_events_are_added_on_top(db):
+    activity.write_events(db, _events(*BATCH))
+    activity.rebuild_rollups(db)
+    activity.write_events(db, _events(("ana", "2026-03-10", "login")))
+    assert _day(db, "2026-03-10") == (4, 2, {"login": 3, "challenge_done": 1})
+
+
+def test_purged_user_counted_again_as_new(db):
+    activity.write_events(db, _events(*BATCH))
+    _subtract_rollups(db, "ben", list(db["daily_active_users"].find({"username": "ben"})))
+    db["daily_active_users"].delete_many({"username": "ben"})
+    activity.write_events(db, _events(("ben", "2026-03-10", "login")))
+    assert _day(db, "2026-03-10") == (3, 2, {"login": 2, "challenge_done": 1})
@@ -0,0 +1,32 @@
+from pymongo.errors import ServerSelectionTimeoutError
+
+from momentum import bootstrap as boot
+
+
+def test_background_bootstrap_retries_until_it_succeeds(monkeypatch):
+    calls = []
+
+    def flaky(db, seed_demo):
+        calls.append(db)
+        if len(calls) < 3:
+            raise ServerSelectionTimeoutError("no servers")
+        return {"timings": {}}
+    monkeypatch.setattr(boot, "bootstrap", flaky)
+    handle = boot.BackgroundBootstrap("db", backoff=(0.01, 0.02))
+    assert handle.wait(5) == "ready"
+    assert handle.attempts == 3 and handle.error is None and handle.result == {"timings": {}}
+
+
+def test_background_bootstrap_wait_does_not_raise_while_failing(monkeypatch):
+    up = []
+
+    def down(db, seed_demo):
+        if not up:
+            raise ServerSelectionTimeoutError("no servers")
+        return {"timings": {}}
+    monkeypatch.setattr(boot, "bootstrap", down)
+    handle = boot.BackgroundBootstrap("db", backoff=(0.01, 0.02))
+    assert handle.wait(0.1) == "retrying"
+    assert "no servers" in handle.error
+    up.append(True)
+    assert handle.wait(5) == "ready"
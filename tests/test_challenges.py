@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+from pymongo import ASCENDING
+
+from momentum import challenges
+from momentum.challenges import backfill_slots, bulk_upsert, daily_set, get_or_create_today_challenges, upsert_ops
+from momentum.indexes import ensure_indexes
+
+mongomock = pytest.importorskip("mongomock")
+
+DAY = "2026-03-10"
+OLD = [{"id": 1, "type": "Reading", "xp": 20}, {"id": 2, "type": "Writing", "xp": 30}, {"id": 3, "type": "Listening", "xp": 20}]
+NEW = [{"id": 4, "type": "Reading", "xp": 20}, {"id": 2, "type": "Writing", "xp": 30}, {"id": 5, "type": "Speaking", "xp": 40}]
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    ensure_indexes(db)
+    return db
+
+
+def test_second_set_for_the_same_day_is_not_stored(db):
+    bulk_upsert(db["challenges"], upsert_ops(daily_set("ana", DAY, OLD)))
+    assert bulk_upsert(db["challenges"], upsert_ops(daily_set("ana", DAY, NEW))) == 0
+    assert sorted(d["id"] for d in db["challenges"].find()) == [1, 2, 3]
+
+
+def test_first_load_returns_the_set_another_tab_stored(db, monkeypatch):
+    # The other tab stores its set (from the catalog before a change) between
+    # this load's empty find and its upsert
+    def other_tab_first(col, usernames, date):
+        bulk_upsert(col, upsert_ops(daily_set("ana", date, OLD)))
+        return {u: set() for u in usernames}
+    monkeypatch.setattr(challenges, "recent_ids", other_tab_first)
+    monkeypatch.setattr(challenges.catalog, "current", lambda db: None)
+    monkeypatch.setattr(challenges, "schedule", lambda *args: NEW)
+    docs = get_or_create_today_challenges(db, "ana", DAY)
+    assert [d["id"] for d in docs] == [1, 2, 3]
+    assert db["challenges"].count_documents({}) == 3
+
+
+def test_backfill_slots_keeps_one_set_and_completed_work():
+    db = mongomock.MongoClient().db
+    col = db["challenges"]
+    col.create_index([("username", ASCENDING), ("date", ASCENDING), ("id", ASCENDING)],
+                     name="user_date_id_unique", unique=True)
+    legacy = [{**c, "username": "ana", "date": DAY, "completed": False, "created_at": datetime(2026, 3, 10, h)}
+              for h, c in enumerate(OLD)]
+    legacy += [{**c, "username": "ana", "date": DAY, "completed": c["id"] == 5, "created_at": datetime(2026, 3, 10, 9)}
+               for c in NEW if c["id"] != 2]
+    legacy += [{**c, "username": "ben", "date": DAY, "completed": False} for c in OLD]
+    col.insert_many(legacy)
+
+    assert backfill_slots(db) == (6, 2)
+    assert "user_date_id_unique" not in col.index_information()
+    kept = {(d["id"], d["slot"]) for d in col.find({"username": "ana"})}
+    assert kept == {(5, 0), (1, 1), (2, 2)}
+    assert sorted(d["slot"] for d in col.find({"username": "ben"})) == [0, 1, 2]
+    assert ensure_indexes(db) == []
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from momentum import cohort
+from momentum.scores import import_scores
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def _import(db, *rows):
+    df = pd.DataFrame([{"username": u, "date": d, "listening": b, "reading": b, "writing": b, "speaking": b}
+                       for u, d, b in rows])
+    import_scores(db, [df])
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    db["users"].insert_many([{"username": u, "target_score": 7.0} for u in ("ana", "ben", "cai")])
+    _import(db, ("ana", "2026-01-01", "5.5"), ("ana", "2026-02-01", "6"), ("ben", "2026-01-15", "6.5"),
+            ("cai", "2026-01-10", "7"), ("cai", "2026-03-10", "7.5"))
+    return db
+
+
+def _refresh(eng, db):
+    eng.refreshed_at = 0
+    return eng.refresh(db)
+
+
+def test_incremental_refresh_matches_a_full_load(db):
+    eng = cohort.CohortEngine().refresh(db, force=True)
+    _import(db, ("ben", "2026-02-15", "7"), ("dan", "2026-02-20", "5"), ("ana", "2026-02-01", "6.5"))
+    _refresh(eng, db)
+    full = cohort.CohortEngine().refresh(db, force=True)
+    pd.testing.assert_frame_equal(eng.students, full.students)
+    assert eng.students.loc["ben", "tests"] == 2 and eng.students.loc["ana", "last"] == 6.5
+
+
+def test_incremental_refresh_only_recomputes_changed_students(db, monkeypatch):
+    # Otherwise the fixture's own scores are fetched again as "changed"
+    monkeypatch.setitem(cohort.CONFIG, "watermark_lag_seconds", 0)
+    eng = cohort.CohortEngine().refresh(db, force=True)
+    db["users"].update_many({}, {"$set": {"target_score": 8.0}})
+    _import(db, ("ana", "2026-03-01", "6.5"))
+    _refresh(eng, db)
+    assert eng.students.loc["ana", "target"] == 8.0
+    # Picked up by the next full load
+    assert eng.students.loc["ben", "target"] == 7.0
+    assert cohort.CohortEngine().refresh(db, force=True).students.loc["ben", "target"] == 8.0
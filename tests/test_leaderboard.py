@@ -0,0 +1,32 @@
+from momentum.leaderboard import RankedBoard
+
+ROWS = [{"username": u, "xp": xp} for u, xp in
+        [("cat", 300), ("ann", 500), ("bob", 300), ("dan", 100), ("eve", 50)]]
+
+
+def test_rows_sorted_by_xp_then_username():
+    board = RankedBoard(ROWS)
+    assert [r["username"] for r in board.rows] == ["ann", "bob", "cat", "dan", "eve"]
+    assert board.page(0, 2) == [(1, board.rows[0]), (2, board.rows[1])]
+    assert board.page(2, 2) == [(5, board.rows[4])]
+
+
+def test_rank_for_listed_user():
+    board = RankedBoard(ROWS)
+    assert board.rank_for("ann", 500) == 1
+    assert board.rank_for("cat", 300) == 3
+    assert board.rank_for("eve", 50) == 5
+
+
+def test_rank_uses_current_xp_when_snapshot_is_behind():
+    board = RankedBoard(ROWS)
+    # dan has since earned enough to pass both 300s
+    assert board.rank_for("dan", 400) == 2
+    assert board.rank_for("zed", 0) == 6   # not on the board yet
+
+
+def test_around_skips_self_and_numbers_neighbours():
+    board = RankedBoard(ROWS)
+    above, below = board.around("dan", 400, k=2)
+    assert [(rank, r["username"]) for rank, r in above] == [(1, "ann")]
+    assert [(rank, r["username"]) for rank, r in below] == [(3, "bob"), (4, "cat")]
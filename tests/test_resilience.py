@@ -0,0 +1,43 @@
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+from momentum import cache, resilience
+
+
+@pytest.fixture(autouse=True)
+def small_caches(monkeypatch):
+    monkeypatch.setitem(cache.CONFIG, "max_entries", 4)
+    monkeypatch.setitem(resilience.CONFIG, "lkg_max_entries", 8)
+    monkeypatch.setattr(cache, "_backend", None)
+    monkeypatch.setattr(resilience, "_lkg", None)
+    monkeypatch.setattr(resilience, "_remembered", {})
+
+
+def down():
+    raise ServerSelectionTimeoutError("no servers")
+
+
+def _read(key, fn):
+    return resilience.read(key, lambda: cache.get_or_compute(key, fn, ttl=60), circuit=resilience.Breaker("test"))
+
+
+def test_fallback_survives_cache_churn():
+    assert _read("stats:ana", lambda: {"xp": 120}) == {"xp": 120}
+    for i in range(20):
+        cache.get_or_compute(f"leaderboard:{i}", lambda: i, ttl=60)
+    assert cache.backend().get("stats:ana") is None
+    assert _read("stats:ana", down) == {"xp": 120}
+    assert resilience.stale_since("stats") > 0
+
+
+def test_saved_values_do_not_take_cache_capacity():
+    for i in range(4):
+        _read(f"scores:{i}", lambda: [i])
+    assert len(cache.backend()) == 4 and len(resilience.lkg_store()) == 4
+
+
+def test_nothing_saved_falls_back_to_default_or_raises():
+    assert resilience.read("stats:ben", down, default={}, circuit=resilience.Breaker("test")) == {}
+    assert resilience.stale_since("stats") == 0
+    with pytest.raises(resilience.Unavailable):
+        resilience.read("stats:ben", down, circuit=resilience.Breaker("test"))
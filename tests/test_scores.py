@@ -0,0 +1,33 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from momentum.scores import overall_band, overall_bands  # noqa: E402
+
+
+def _reference(l, r, w, s):
+    # IELTS rule written out: .25 rounds up to .5, .75 up to the next band
+    avg = (l + r + w + s) / 4
+    whole = int(avg)
+    frac = avg - whole
+    return whole + (0.0 if frac < 0.25 else 0.5 if frac < 0.75 else 1.0)
+
+
+@pytest.mark.parametrize("skills, band", [
+    ((6.5, 6.5, 5.0, 7.0), 6.5),   # 6.25 -> 6.5
+    ((4.0, 3.5, 4.0, 4.0), 4.0),   # 3.875 -> 4.0
+    ((6.5, 6.5, 6.0, 6.0), 6.5),   # 6.25 -> 6.5
+    ((7.0, 7.5, 7.0, 7.0), 7.0),   # 7.125 -> 7.0
+    ((9.0, 9.0, 9.0, 9.0), 9.0),
+    ((0.0, 0.0, 0.0, 0.0), 0.0),
+])
+def test_overall_band_known_cases(skills, band):
+    assert overall_band(*skills) == band
+
+
+def test_overall_bands_matches_scalar_rule_on_every_half_band_combination():
+    halves = np.arange(0, 9.5, 0.5)
+    grid = np.array(np.meshgrid(halves, halves, halves, halves)).reshape(4, -1).T
+    got = overall_bands(grid)
+    want = np.array([_reference(*row) for row in grid])
+    assert np.array_equal(got, want)
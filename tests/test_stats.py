@@ -0,0 +1,54 @@
+import pytest
+
+from momentum.stats import display_streak, get_level, record_completion, streaks_from_dates
+
+
+def test_streaks_from_dates_empty():
+    assert streaks_from_dates([]) == (0, 0, None)
+
+
+def test_streaks_from_dates_counts_runs_and_ignores_duplicates():
+    dates = ["2026-03-01", "2026-03-02", "2026-03-02", "2026-03-03", "2026-03-05", "2026-03-06"]
+    assert streaks_from_dates(dates) == (2, 3, "2026-03-06")
+
+
+def test_streaks_from_dates_unsorted_and_across_month_end():
+    assert streaks_from_dates(["2026-03-01", "2026-02-27", "2026-02-28"]) == (3, 3, "2026-03-01")
+
+
+@pytest.mark.parametrize("last, expected", [("2026-03-10", 4), ("2026-03-09", 4), ("2026-03-08", 0), (None, 0)])
+def test_display_streak_only_alive_today_or_yesterday(last, expected):
+    assert display_streak({"last_active": last, "current_streak": 4}, "2026-03-10") == expected
+
+
+def test_record_completion_keeps_level_in_step_with_xp_on_the_same_day():
+    mongomock = pytest.importorskip("mongomock")
+    db = mongomock.MongoClient().db
+    for _ in range(3):
+        record_completion(db, "ana", 60, "2026-03-10")
+    record_completion(db, "ana", 60, "2026-03-11")
+    doc = db["user_stats"].find_one({"_id": "ana"})
+    assert doc["xp"] == 240 and doc["completed"] == 4
+    assert doc["level"] == get_level(240) == 3
+    assert (doc["current_streak"], doc["longest_streak"], doc["last_active"]) == (2, 2, "2026-03-11")
+
+
+def test_record_completion_level_survives_a_lost_streak_race():
+    mongomock = pytest.importorskip("mongomock")
+    col = mongomock.MongoClient().db["user_stats"]
+    col.insert_one({"_id": "ana", "xp": 90, "completed": 1, "level": 1, "last_active": "2026-03-09", "current_streak": 1})
+
+    class Racing:
+        # Another completion for the same day lands between our read and the guarded update
+        def __getattr__(self, name):
+            return getattr(col, name)
+
+        def find_one_and_update(self, *args, **kwargs):
+            doc = col.find_one_and_update(*args, **kwargs)
+            col.update_one({"_id": "ana"}, {"$set": {"last_active": "2026-03-10", "current_streak": 2}})
+            return doc
+
+    record_completion({"user_stats": Racing()}, "ana", 20, "2026-03-10")
+    doc = col.find_one({"_id": "ana"})
+    assert doc["xp"] == 110 and doc["level"] == 2
+    assert doc["current_streak"] == 2
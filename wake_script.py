@@ -1,58 +1,38 @@
+import json
 import os
+import sys
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import urllib.error
+import urllib.request
 
-def wake_up_app():
+# Keep-alive: one GET to the app's warm-up route. This wakes the process and
+# primes its caches, so the next real visitor doesn't pay for a cold start.
+
+
+def wake_up_app(retries=3, timeout=120):
     app_url = os.environ.get("STREAMLIT_URL")
     if not app_url:
         print("Error: STREAMLIT_URL environment variable is not set.")
-        return
-
-    print(f"Opening {app_url}...")
-
-    # Configure Chrome to run headless (without a visible window)
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()), 
-        options=chrome_options
-    )
+        return 1
 
-    try:
-        driver.get(app_url)
-        # Wait up to 30 seconds for the page to load
-        time.sleep(5) 
-        
-        # Check if the "Yes, get this app back up!" button exists
-        # This button appears when the app is in hibernation
+    url = app_url.rstrip("/") + "/api/warmup"
+    for attempt in range(1, retries + 1):
+        print(f"GET {url} (attempt {attempt})")
         try:
-            wake_button = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable(
-                    (By.XPATH, "//button[contains(text(), 'Yes, get this app back up')]")
-                )
-            )
-            print("Sleep mode detected. Clicking 'Wake Up' button...")
-            wake_button.click()
-            
-            # Wait a bit to ensure the click registered
-            time.sleep(10)
-            print("Wake up signal sent.")
-        except:
-            print("App seems to be running (no wake button found).")
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                report = json.load(resp)
+        except urllib.error.HTTPError as e:
+            # 503 = reachable but a warm-up step failed; the body says which
+            report = json.load(e) if e.headers.get_content_type() == "application/json" else None
+            print(f"HTTP {e.code}: {report or e.reason}")
+        except (urllib.error.URLError, TimeoutError, ValueError) as e:
+            print(f"Request failed: {e}")
+        else:
+            print(json.dumps(report, indent=2))
+            if report.get("ready"): return 0
+        time.sleep(10 * attempt)
+    return 1
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    finally:
-        driver.quit()
 
 if __name__ == "__main__":
-    wake_up_app()
+    sys.exit(wake_up_app())